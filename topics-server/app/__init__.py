@@ -1,10 +1,32 @@
 from __future__ import absolute_import
+import time
 import logging
 import json
 from flask import Flask
+from flask import Response
+from flask import request
 from flask_restful import Api
+from app.config import settings
 from app.utils.es import Search
+from app.utils.es import get_connection_stats
+from app.utils.es import get_documents
+from app.utils.cache import get_search_cache
 from app.topic.analyzer import TopicAnalyzer
+from app.topic.cache import get_model_cache
+from app.topic.model import get_global_model
+from app.topic.jobs import FINISHED_STATUSES
+from app.topic.jobs import QueueFullError
+from app.topic.jobs import get_job_parameters
+from app.topic.jobs import get_job_store
+from app.topic.batch import MODEL_TYPES
+from app.topic.batch import run_batch
+from app.topic.encoding import COMPRESSIONS
+from app.topic.encoding import FORMATS
+from app.topic.encoding import compress
+from app.topic.encoding import encode
+from app.topic.encoding import encode_many
+from app.topic.encoding import get_available_formats
+from app.topic.encoding import iter_ndjson
 
 
 logging.basicConfig(level=logging.INFO)
@@ -13,18 +35,162 @@ topics_app = Flask(__name__)
 api = Api(topics_app)
 
 
+def get_lda_parameters():
+    '''
+    This function reads the optional LDA training parameters of the request
+    ('workers', 'chunksize' and 'passes'); the ones missing or invalid fall
+    back to their settings.
+
+    Returns: dict
+    '''
+    return {
+        'workers': request.args.get('workers', type=int),
+        'chunksize': max(request.args.get('chunksize', 0, type=int), 0) or
+        None,
+        'passes': max(request.args.get('passes', 0, type=int), 0) or None
+    }
+
+
+def get_selection_parameters():
+    '''
+    This function reads the optional pruning parameters of the request:
+    'top_k', the maximum number of entries kept per document, and
+    'min_weight', the minimum magnitude of the weights kept.
+
+    Returns: dict
+    '''
+    return {
+        'top_k': max(request.args.get('top_k', 0, type=int), 0) or None,
+        'min_weight': request.args.get('min_weight', type=float)
+    }
+
+
+def get_response_format(available=None):
+    '''
+    This function negotiates the format of a topics response: the 'format'
+    argument when given, the best match of the Accept header otherwise, and
+    JSON when nothing else is acceptable.
+
+    Params:
+    -------
+    - available (list): The formats the end-point can produce; None for
+    every available format
+
+    Returns: str or None (for an unknown or unavailable format)
+    '''
+    available = available or get_available_formats()
+    response_format = request.args.get('format')
+    if response_format:
+        return response_format if response_format in available else None
+    mimetypes = [FORMATS['json']] + [FORMATS[name] for name in available
+                                     if name != 'json']
+    best_match = request.accept_mimetypes.best_match(mimetypes)
+    for name in available:
+        if FORMATS[name] == best_match:
+            return name
+    return 'json'
+
+
+def get_format_error(available=None, error='Unknown or unavailable format'):
+    '''
+    This function renders the response to a format that cannot be produced.
+
+    Params:
+    -------
+    - available (list): The formats the end-point can produce; None for
+    every available format
+    - error (str): What is wrong with the requested format
+    '''
+    error = '{0}; expected one of {1}'.format(
+        error, ', '.join(available or get_available_formats()))
+    return json.dumps({'error': error}), 406, {
+        'Content-Type': 'application/json'}
+
+
+def get_encoded_response(body, response_format):
+    '''
+    This function returns a topics response body with the media type of its
+    format, compressed with gzip or deflate when the client accepts either
+    and the body is at least RESPONSE_COMPRESSION_MIN_SIZE bytes long.
+    '''
+    headers = {
+        'Content-Type': FORMATS[response_format],
+        'Vary': 'Accept, Accept-Encoding'
+    }
+    if len(body) >= settings.RESPONSE_COMPRESSION_MIN_SIZE:
+        compression = request.accept_encodings.best_match(COMPRESSIONS)
+        if compression:
+            body = compress(body, compression,
+                            settings.RESPONSE_COMPRESSION_LEVEL)
+            headers['Content-Encoding'] = compression
+    return body, 200, headers
+
+
+def get_aggregate_response(topics, model_types, params):
+    '''
+    This function renders the top words or topics of the whole corpus (see
+    TopicAnalyzer.get_aggregate) as JSON, keyed by model name when there
+    are several models.
+    '''
+    aggregates = [topics.get_aggregate(model_type, **params)
+                  for model_type in model_types]
+    if len(aggregates) == 1:
+        body = aggregates[0]
+    else:
+        body = dict((aggregate['model'], aggregate)
+                    for aggregate in aggregates)
+    return get_encoded_response(json.dumps(body), 'json')
+
+
+def get_streamed_response(topics, model_types, params):
+    '''
+    This function streams the output of models as NDJSON (see
+    app.topic.encoding.iter_ndjson). The models are fitted before the
+    response starts, so that a failure still gets an error status; the
+    documents are then transformed and sent one at a time, so that neither
+    the output nor its serialization is ever held in memory as a whole.
+    '''
+    streams = [(model_type, topics.iter_records(model_type, **params))
+               for model_type in model_types]
+
+    def generate():
+        try:
+            for model_type, records in streams:
+                for line in iter_ndjson(records, model_type):
+                    yield line
+        except Exception, error:
+            logging.error('get_streamed_response: Error occurred - '
+                          '{0}'.format(str(error)))
+
+    return Response(generate(), mimetype=FORMATS['ndjson'],
+                    headers={'Vary': 'Accept, Accept-Encoding'})
+
+
 @topics_app.route('/topics/tfidf/<string:term>', methods=['GET'])
 def get_tfidf(term):
     topics = None
     json_data = {}
+    response_format = get_response_format()
+    if response_format is None:
+        return get_format_error()
     try:
         logging.info('Term = {0}'.format(term))
         search = Search()
         if term:
-            data = search.get(term)
-            if data is not None and len(data) > 0:
+            data = get_documents(search, term)
+            if data:
                 topics = TopicAnalyzer(data)
-                json_data = topics.get_tfidf_as_json()
+                params = get_selection_parameters()
+                if settings.is_true(request.args.get('aggregate', 'false')):
+                    return get_aggregate_response(topics, ['tfidf'], params)
+                if response_format == 'ndjson':
+                    return get_streamed_response(topics, ['tfidf'], params)
+                if response_format == 'json':
+                    json_data = topics.get_tfidf_as_json(**params)
+                else:
+                    json_data = encode(topics.get_columns('tfidf', **params),
+                                       response_format)
+                return get_encoded_response(json_data, response_format)
     except Exception, error:
         logging.error('Exception occurred - {0}'.format(str(error)))
     return json_data
@@ -34,14 +200,27 @@ def get_tfidf(term):
 def get_lsi(term):
     topics = None
     json_data = {}
+    response_format = get_response_format()
+    if response_format is None:
+        return get_format_error()
     try:
         logging.info('Term = {0}'.format(term))
         search = Search()
         if term:
-            data = search.get(term)
-            if data is not None and len(data) > 0:
-                topics = TopicAnalyzer(data)
-                json_data = topics.get_lsi()
+            data = get_documents(search, term)
+            if data:
+                topics = TopicAnalyzer(data, get_global_model())
+                params = get_selection_parameters()
+                if settings.is_true(request.args.get('aggregate', 'false')):
+                    return get_aggregate_response(topics, ['lsi'], params)
+                if response_format == 'ndjson':
+                    return get_streamed_response(topics, ['lsi'], params)
+                if response_format == 'json':
+                    json_data = topics.get_lsi(**params)
+                else:
+                    json_data = encode(topics.get_columns('lsi', **params),
+                                       response_format)
+                return get_encoded_response(json_data, response_format)
     except Exception, error:
         logging.error('Exception occurred - {0}'.format(str(error)))
     return json_data
@@ -51,13 +230,65 @@ def get_lsi(term):
 def get_lda(term):
     topics = None
     json_data = {}
+    response_format = get_response_format()
+    if response_format is None:
+        return get_format_error()
     try:
         search = Search()
         if term:
-            data = search.get(term)
-            if data is not None and len(data) > 0:
-                topics = TopicAnalyzer(data)
-                json_data = topics.get_lda()
+            data = get_documents(search, term)
+            if data:
+                topics = TopicAnalyzer(data, get_global_model())
+                params = get_lda_parameters()
+                params.update(get_selection_parameters())
+                if settings.is_true(request.args.get('aggregate', 'false')):
+                    return get_aggregate_response(topics, ['lda'], params)
+                if response_format == 'ndjson':
+                    return get_streamed_response(topics, ['lda'], params)
+                if response_format == 'json':
+                    json_data = topics.get_lda(**params)
+                else:
+                    json_data = encode(topics.get_columns('lda', **params),
+                                       response_format)
+                return get_encoded_response(json_data, response_format)
+    except Exception, error:
+        logging.error('Exception occurred - {0}'.format(str(error)))
+    return json_data
+
+
+@topics_app.route('/topics/all/<string:term>', methods=['GET'])
+def get_all(term):
+    topics = None
+    json_data = {}
+    # A binary payload holds a single set of columns, not the three models
+    available = [name for name in get_available_formats()
+                 if name != 'binary']
+    response_format = get_response_format(available)
+    if response_format is None:
+        if request.args.get('format') == 'binary':
+            return get_format_error(available, 'The binary format cannot '
+                                    'hold the three models of /topics/all')
+        return get_format_error(available)
+    try:
+        logging.info('Term = {0}'.format(term))
+        search = Search()
+        if term:
+            data = get_documents(search, term)
+            if data:
+                topics = TopicAnalyzer(data, get_global_model())
+                params = get_lda_parameters()
+                params.update(get_selection_parameters())
+                if settings.is_true(request.args.get('aggregate', 'false')):
+                    return get_aggregate_response(topics, MODEL_TYPES, params)
+                if response_format == 'ndjson':
+                    return get_streamed_response(topics, MODEL_TYPES, params)
+                if response_format == 'json':
+                    json_data = topics.get_all_as_json(**params)
+                else:
+                    json_data = encode_many(dict(
+                        (model_type, topics.get_columns(model_type, **params))
+                        for model_type in MODEL_TYPES), response_format)
+                return get_encoded_response(json_data, response_format)
     except Exception, error:
         logging.error('Exception occurred - {0}'.format(str(error)))
     return json_data
@@ -74,3 +305,129 @@ def search(term):
     except Exception, error:
         logging.error('Exception occurred - {0}'.format(str(error)))
     return json_data
+
+
+@topics_app.route('/topics/batch', methods=['POST'])
+def get_batch():
+    try:
+        data = request.get_json(force=True, silent=True) or {}
+        terms = data.get('terms')
+        model_types = data.get('models') or ['lda']
+        if not isinstance(terms, list) or not terms or \
+           not all(isinstance(term, basestring) and term for term in terms):
+            return json.dumps({'error': 'A list of terms is required'}), 400
+        if len(terms) > settings.BATCH_MAX_TERMS:
+            return json.dumps({'error': 'At most {0} terms are accepted'
+                               .format(settings.BATCH_MAX_TERMS)}), 400
+        unknown = set(model_types) - set(MODEL_TYPES)
+        if unknown:
+            return json.dumps({'error': 'Unknown model types {0}'.format(
+                               ', '.join(sorted(unknown)))}), 400
+        params = get_job_parameters('lda', data.get('params') or {})
+        return json.dumps(run_batch(terms, model_types, params)), 200, {
+            'Content-Type': 'application/json'}
+    except (ValueError, TypeError, AttributeError), error:
+        return json.dumps({'error': str(error)}), 400
+    except Exception, error:
+        logging.error('Exception occurred - {0}'.format(str(error)))
+    return json.dumps({}), 500
+
+
+def get_job_response(job, status_code=200):
+    '''
+    This function renders the state of a job (and its result, once it is
+    done) as a JSON response.
+    '''
+    body = {
+        'id': job['id'],
+        'status': job['status'],
+        'term': job['term'],
+        'model': job['model_type'],
+        'params': job['params'],
+        'priority': job['priority'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'error': job['error'],
+        'result': json.loads(job['result']) if job['result'] is not None
+        else None
+    }
+    return json.dumps(body), status_code, {
+        'Content-Type': 'application/json'}
+
+
+@topics_app.route('/topics/jobs', methods=['POST'])
+def submit_job():
+    try:
+        data = request.get_json(force=True, silent=True) or \
+            request.form.to_dict()
+        term = data.get('term')
+        if not term:
+            return json.dumps({'error': 'A term is required'}), 400
+        model_type = data.get('model', 'lda')
+        params = get_job_parameters(model_type, data.get('params') or {})
+        store = get_job_store()
+        job_id = store.submit(term, model_type, params,
+                              int(data.get('priority', 0)),
+                              settings.JOBS_QUEUE_SIZE)
+        return get_job_response(store.get(job_id), 202)
+    except QueueFullError, error:
+        return json.dumps({'error': str(error)}), 503
+    except (ValueError, TypeError, AttributeError), error:
+        return json.dumps({'error': str(error)}), 400
+    except Exception, error:
+        logging.error('Exception occurred - {0}'.format(str(error)))
+    return json.dumps({}), 500
+
+
+@topics_app.route('/topics/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        store = get_job_store()
+        job = store.get(job_id)
+        # An optional 'wait' long-polls until the job is finished
+        deadline = time.time() + min(request.args.get('wait', 0, type=float),
+                                     settings.JOBS_MAX_WAIT)
+        while job is not None and job['status'] not in FINISHED_STATUSES \
+                and time.time() < deadline:
+            time.sleep(settings.JOBS_POLL_INTERVAL)
+            job = store.get(job_id)
+        if job is None:
+            return json.dumps({'error': 'Unknown job'}), 404
+        return get_job_response(job)
+    except Exception, error:
+        logging.error('Exception occurred - {0}'.format(str(error)))
+    return json.dumps({}), 500
+
+
+@topics_app.route('/topics/jobs/<string:job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    try:
+        job = get_job_store().cancel(job_id)
+        if job is None:
+            return json.dumps({'error': 'Unknown job'}), 404
+        return get_job_response(job)
+    except Exception, error:
+        logging.error('Exception occurred - {0}'.format(str(error)))
+    return json.dumps({}), 500
+
+
+@topics_app.route('/topics/stats', methods=['GET'])
+def stats():
+    json_data = {}
+    try:
+        cache = get_search_cache()
+        model_cache = get_model_cache()
+        global_model = get_global_model()
+        json_data = json.dumps({
+            'elasticsearch': get_connection_stats(),
+            'search_cache': cache.stats() if cache is not None else None,
+            'model_cache': model_cache.stats() if model_cache is not None
+            else None,
+            'global_model': global_model.stats() if global_model is not None
+            else None,
+            'jobs': get_job_store().stats()
+        })
+    except Exception, error:
+        logging.error('Exception occurred - {0}'.format(str(error)))
+    return json_data
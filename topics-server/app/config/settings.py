@@ -6,7 +6,7 @@ def is_true(value):
 
 
 # Corpus generation engine; options are 'direct' , 'hiddenmarkovmodel',
-# 'simplifiedmarkovchain' , 'cfg'
+# 'simplifiedmarkovchain' , 'compactmarkovchain' , 'cfg'
 CORPUS_ENGINE_TYPE = os.environ.get("CORPUS_ENGINE_TYPE", "hiddenmarkovmodel")
 
 # Reference path type; options are 'nltk-datafile' , 'local-datafile' , 'url'
@@ -62,9 +62,328 @@ ELASTIC_SEARCH_HOSTNAME = os.environ.get("ELASTIC_SEARCH_HOSTNAME",
 # Port number to ElasticSearch instance
 ELASTIC_SEARCH_PORT = int(os.environ.get("ELASTIC_SEARCH_PORT", 9200))
 
+# Maximum number of pooled HTTP connections kept open per Elasticsearch node
+ELASTIC_SEARCH_POOL_MAXSIZE = int(os.environ.get("ELASTIC_SEARCH_POOL_MAXSIZE",
+                                                 10))
+
+# Timeout (in seconds) applied to every Elasticsearch request
+ELASTIC_SEARCH_TIMEOUT = int(os.environ.get("ELASTIC_SEARCH_TIMEOUT", 30))
+
+# Number of times a failed Elasticsearch request is retried
+ELASTIC_SEARCH_MAX_RETRIES = int(os.environ.get("ELASTIC_SEARCH_MAX_RETRIES",
+                                                3))
+
+# Indicates whether timed-out Elasticsearch requests should be retried
+ELASTIC_SEARCH_RETRY_ON_TIMEOUT = is_true(os.environ.get(
+                                    "ELASTIC_SEARCH_RETRY_ON_TIMEOUT", "True"))
+
 # ElasticSearch index name
 ELASTIC_SEARCH_INDEX_NAME = os.environ.get("ELASTIC_SEARCH_INDEX_NAME",
                                            "corpus")
 
 # Indicates whether the ElasticSearch should be dropped upon reindexation
 DROP_INDEX_FLAG = is_true(os.environ.get("DROP_INDEX_FLAG", "True"))
+
+# Search result cache backend; options are 'memory' (per worker process),
+# 'shared' (a sqlite file shared by every worker) or 'none'
+SEARCH_CACHE_BACKEND = os.environ.get("SEARCH_CACHE_BACKEND", "memory")
+
+# Maximum number of search results held in the cache before LRU eviction
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 512))
+
+# Number of seconds a cached search result remains valid
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", 300))
+
+# Directory holding the shared cache file and the reindex generation marker
+SEARCH_CACHE_DIRECTORY = os.environ.get("SEARCH_CACHE_DIRECTORY", ".cache")
+
+# Indicates whether fitted topic models are cached across requests
+TOPIC_MODEL_CACHE_ENABLED = is_true(os.environ.get("TOPIC_MODEL_CACHE_ENABLED",
+                                                   "True"))
+
+# Memory budget (in megabytes) of the topic model cache per worker process
+TOPIC_MODEL_CACHE_MEMORY_MB = int(os.environ.get("TOPIC_MODEL_CACHE_MEMORY_MB",
+                                                 256))
+
+# Indicates whether cached topic models are also persisted to disk
+TOPIC_MODEL_CACHE_PERSIST = is_true(os.environ.get("TOPIC_MODEL_CACHE_PERSIST",
+                                                   "False"))
+
+# Directory in which persisted topic models are saved
+TOPIC_MODEL_CACHE_DIRECTORY = os.environ.get("TOPIC_MODEL_CACHE_DIRECTORY",
+                                             ".cache/models")
+
+# Maximum age (in days) of the persisted topic models, pruned whenever a model
+# is saved; 0 for no maximum
+TOPIC_MODEL_CACHE_MAX_AGE_DAYS = float(os.environ.get(
+                                    "TOPIC_MODEL_CACHE_MAX_AGE_DAYS", 7))
+
+# Maximum number of persisted topic models, the most recent being kept; 0 for
+# no maximum
+TOPIC_MODEL_CACHE_KEEP = int(os.environ.get("TOPIC_MODEL_CACHE_KEEP", 64))
+
+# Search retrieval mode used by the topic end-points; options are 'search'
+# (a single page of results held in memory) or 'scroll' (every match is
+# streamed from Elasticsearch page by page)
+SEARCH_RETRIEVAL_MODE = os.environ.get("SEARCH_RETRIEVAL_MODE", "search")
+
+# Number of hits returned by a single 'search' mode query
+SEARCH_RESULT_SIZE = int(os.environ.get("SEARCH_RESULT_SIZE", 10))
+
+# Number of hits fetched per shard and per page in 'scroll' mode
+SEARCH_SCROLL_PAGE_SIZE = int(os.environ.get("SEARCH_SCROLL_PAGE_SIZE", 500))
+
+# How long Elasticsearch keeps a scroll context alive between pages
+SEARCH_SCROLL_TIMEOUT = os.environ.get("SEARCH_SCROLL_TIMEOUT", "1m")
+
+# Maximum number of documents sent in a single bulk request
+INDEXER_BATCH_DOCUMENTS = int(os.environ.get("INDEXER_BATCH_DOCUMENTS", 1000))
+
+# Maximum size (in bytes) of a single bulk request body
+INDEXER_BATCH_BYTES = int(os.environ.get("INDEXER_BATCH_BYTES",
+                                         5 * 1024 * 1024))
+
+# Number of threads sending bulk requests concurrently
+INDEXER_THREADS = int(os.environ.get("INDEXER_THREADS", 4))
+
+# Maximum number of serialized batches waiting for an indexer thread; this
+# bounds the memory held by in-flight bulk requests
+INDEXER_QUEUE_SIZE = int(os.environ.get("INDEXER_QUEUE_SIZE", 8))
+
+# Number of times documents rejected by a bulk request are retried
+INDEXER_MAX_RETRIES = int(os.environ.get("INDEXER_MAX_RETRIES", 3))
+
+# Initial back-off (in seconds) between bulk retries; doubled every attempt
+INDEXER_RETRY_BACKOFF = float(os.environ.get("INDEXER_RETRY_BACKOFF", 0.5))
+
+# Indicates whether reindexation builds a fresh versioned index (with refresh
+# disabled and no replicas during the load) and then atomically moves the
+# ELASTIC_SEARCH_INDEX_NAME alias onto it; unless DROP_INDEX_FLAG is set, the
+# documents of the previous index are copied into the new one first
+INDEXER_ALIAS_SWAP = is_true(os.environ.get("INDEXER_ALIAS_SWAP", "True"))
+
+# Number of replicas restored on a versioned index once its load completes
+ELASTIC_SEARCH_NUMBER_OF_REPLICAS = int(os.environ.get(
+                                    "ELASTIC_SEARCH_NUMBER_OF_REPLICAS", 0))
+
+# Refresh interval restored on a versioned index once its load completes
+ELASTIC_SEARCH_REFRESH_INTERVAL = os.environ.get(
+                                    "ELASTIC_SEARCH_REFRESH_INTERVAL", "1s")
+
+# Number of segments a freshly loaded index is force-merged (optimized) into
+INDEXER_FORCE_MERGE_SEGMENTS = int(os.environ.get(
+                                    "INDEXER_FORCE_MERGE_SEGMENTS", 1))
+
+# Number of versioned indices kept (the live one included); older versions
+# are deleted once the alias has been moved
+ELASTIC_SEARCH_RETAINED_VERSIONS = int(os.environ.get(
+                                    "ELASTIC_SEARCH_RETAINED_VERSIONS", 2))
+
+# Number of shards the data-file generation is split into; values above 1
+# train the engine once and generate the shards across a process pool
+GENERATOR_SHARDS = int(os.environ.get("GENERATOR_SHARDS", 1))
+
+# Number of worker processes generating shards
+GENERATOR_PROCESSES = int(os.environ.get("GENERATOR_PROCESSES", 4))
+
+# Seed from which the seed of every shard is derived
+GENERATOR_SEED = int(os.environ.get("GENERATOR_SEED", 0))
+
+# Indicates whether shards are left as separate part files rather than being
+# concatenated, in order, into the output data-file
+GENERATOR_KEEP_PART_FILES = is_true(os.environ.get(
+                                    "GENERATOR_KEEP_PART_FILES", "False"))
+
+# Indicates whether the data-file is gzip-compressed (this is also implied by
+# a DATAFILE_OUTPUT_FILE_PATH ending in '.gz')
+DATAFILE_COMPRESS = is_true(os.environ.get("DATAFILE_COMPRESS", "False"))
+
+# Number of bytes of generated records buffered between writes to the
+# data-file
+DATAFILE_WRITE_BUFFER_SIZE = int(os.environ.get("DATAFILE_WRITE_BUFFER_SIZE",
+                                                1024 * 1024))
+
+# Number of generated records between progress log messages (0 disables)
+DATAFILE_PROGRESS_INTERVAL = int(os.environ.get("DATAFILE_PROGRESS_INTERVAL",
+                                                100000))
+
+# Indicates whether trained generator engines are cached on disk and reused
+# by later runs over the same corpus
+GENERATOR_MODEL_CACHE_ENABLED = is_true(os.environ.get(
+                                    "GENERATOR_MODEL_CACHE_ENABLED", "True"))
+
+# Directory in which trained generator engines are cached
+GENERATOR_MODEL_CACHE_DIRECTORY = os.environ.get(
+                                    "GENERATOR_MODEL_CACHE_DIRECTORY",
+                                    ".cache/generator")
+
+# Number of preceding tokens the 'compactmarkovchain' engine conditions the
+# next token on
+GENERATOR_MARKOV_ORDER = int(os.environ.get("GENERATOR_MARKOV_ORDER", 1))
+
+# Number of records whose sentences the 'compactmarkovchain' engine samples
+# in one vectorized batch
+GENERATOR_MARKOV_BATCH_SIZE = int(os.environ.get("GENERATOR_MARKOV_BATCH_SIZE",
+                                                 256))
+
+# Maximum depth of the derivation trees the 'cfg' engine samples
+GENERATOR_CFG_MAX_DEPTH = int(os.environ.get("GENERATOR_CFG_MAX_DEPTH", 10))
+
+# Indicates whether the 'cfg' engine draws the productions of a PCFG according
+# to their probabilities (productions of a plain CFG are drawn uniformly)
+GENERATOR_CFG_WEIGHTED = is_true(os.environ.get("GENERATOR_CFG_WEIGHTED",
+                                                "True"))
+
+# Number of processes POS-tagging the corpus of the 'hiddenmarkovmodel' engine
+GENERATOR_TAGGER_PROCESSES = int(os.environ.get("GENERATOR_TAGGER_PROCESSES",
+                                                4))
+
+# Number of sentences POS-tagged in a single tagger call
+GENERATOR_TAGGER_BATCH_SIZE = int(os.environ.get("GENERATOR_TAGGER_BATCH_SIZE",
+                                                 500))
+
+# Indicates whether POS-tagged corpora are cached on disk, keyed by the hash
+# of the corpus
+TAGGED_CORPUS_CACHE_ENABLED = is_true(os.environ.get(
+                                    "TAGGED_CORPUS_CACHE_ENABLED", "True"))
+
+# Directory in which POS-tagged corpora are cached
+TAGGED_CORPUS_CACHE_DIRECTORY = os.environ.get("TAGGED_CORPUS_CACHE_DIRECTORY",
+                                               ".cache/tagged")
+
+# Number of generator processes feeding the generate-to-index pipeline
+PIPELINE_GENERATOR_PROCESSES = int(os.environ.get(
+                                    "PIPELINE_GENERATOR_PROCESSES", 4))
+
+# Number of record chunks the pipeline queue holds before the generator
+# processes block
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 64))
+
+# Number of records sent through the pipeline queue at a time
+PIPELINE_CHUNK_SIZE = int(os.environ.get("PIPELINE_CHUNK_SIZE", 100))
+
+# Indicates whether the LSI and LDA end-points infer topics from the models
+# trained on the whole index (when they have been trained) rather than
+# fitting new models on every search result
+GLOBAL_TOPIC_MODELS_ENABLED = is_true(os.environ.get(
+                                    "GLOBAL_TOPIC_MODELS_ENABLED", "True"))
+
+# Indicates whether the global topic models are trained once indexing is done
+GLOBAL_TOPIC_MODELS_TRAIN_ON_INDEX = is_true(os.environ.get(
+                                    "GLOBAL_TOPIC_MODELS_TRAIN_ON_INDEX",
+                                    "True"))
+
+# Directory in which the global topic models are saved, one sub-directory per
+# index version
+GLOBAL_TOPIC_MODELS_DIRECTORY = os.environ.get("GLOBAL_TOPIC_MODELS_DIRECTORY",
+                                               ".cache/topic-models")
+
+# Number of topics of the global LSI and LDA models
+GLOBAL_TOPIC_MODELS_NUM_TOPICS = int(os.environ.get(
+                                    "GLOBAL_TOPIC_MODELS_NUM_TOPICS", 5))
+
+# Minimum number of occurrences (exclusive) of the words kept in the global
+# models
+GLOBAL_TOPIC_MODELS_FREQUENCY_FLOOR = int(os.environ.get(
+                                    "GLOBAL_TOPIC_MODELS_FREQUENCY_FLOOR", 1))
+
+# Number of global topic model versions kept (the current one included)
+GLOBAL_TOPIC_MODELS_RETAINED_VERSIONS = int(os.environ.get(
+                                "GLOBAL_TOPIC_MODELS_RETAINED_VERSIONS", 2))
+
+# Indicates whether the global topic models are updated online with the
+# documents of an indexing run, when the run appended to the index they were
+# trained on (or, with INDEXER_ALIAS_SWAP, built a new index upon it, which
+# requires DROP_INDEX_FLAG to be off), instead of being retrained from scratch
+GLOBAL_TOPIC_MODELS_INCREMENTAL = is_true(os.environ.get(
+                                    "GLOBAL_TOPIC_MODELS_INCREMENTAL", "True"))
+
+# Number of online updates after which the global topic models are retrained
+# from scratch anyway (0 for never)
+GLOBAL_TOPIC_MODELS_MAX_UPDATES = int(os.environ.get(
+                                    "GLOBAL_TOPIC_MODELS_MAX_UPDATES", 20))
+
+# Number of newly indexed documents the perplexity of the LDA model is
+# measured on, before and after every online update
+GLOBAL_TOPIC_MODELS_EVALUATION_DOCUMENTS = int(os.environ.get(
+                            "GLOBAL_TOPIC_MODELS_EVALUATION_DOCUMENTS", 500))
+
+# Number of worker processes LDA models are trained with; 0 uses every core
+# but one, and 1 always trains on a single core
+LDA_WORKERS = int(os.environ.get("LDA_WORKERS", 0))
+
+# Number of documents per LDA training chunk (handed to one worker at a time)
+LDA_CHUNK_SIZE = int(os.environ.get("LDA_CHUNK_SIZE", 2000))
+
+# Number of passes over the corpus while training LDA models
+LDA_PASSES = int(os.environ.get("LDA_PASSES", 1))
+
+# Minimum number of documents for which LDA is trained on several cores;
+# smaller corpora are trained on one, the process start-up costing more than
+# it saves
+LDA_MULTICORE_MIN_DOCUMENTS = int(os.environ.get(
+                                    "LDA_MULTICORE_MIN_DOCUMENTS", 1000))
+
+# Path of the sqlite file holding the state of the asynchronous topic jobs;
+# it is shared by the API workers and the job workers of the host
+JOBS_DATABASE_PATH = os.environ.get("JOBS_DATABASE_PATH", ".cache/jobs.db")
+
+# Number of topic jobs run at the same time by 'manage.py run_topic_workers'
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 2))
+
+# Maximum number of queued topic jobs; submissions beyond it are rejected
+JOBS_QUEUE_SIZE = int(os.environ.get("JOBS_QUEUE_SIZE", 100))
+
+# Number of seconds after which a running topic job is killed (0 for never)
+JOBS_TIMEOUT = int(os.environ.get("JOBS_TIMEOUT", 600))
+
+# Maximum number of seconds a status request may long-poll for; it must stay
+# well below the uwsgi harakiri timeout
+JOBS_MAX_WAIT = int(os.environ.get("JOBS_MAX_WAIT", 30))
+
+# Number of seconds between two polls of the job store
+JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", 0.25))
+
+# Number of seconds finished topic jobs (and their results) are kept for
+JOBS_RESULT_TTL = int(os.environ.get("JOBS_RESULT_TTL", 3600))
+
+# Number of threads the analyses of a /topics/batch request are spread over
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 2))
+
+# Maximum number of terms of a /topics/batch request
+BATCH_MAX_TERMS = int(os.environ.get("BATCH_MAX_TERMS", 50))
+
+# Number of seconds after which a /topics/batch request returns whatever it
+# has computed; it must stay below the uwsgi harakiri timeout
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", 45))
+
+# Number of seconds every search of a /topics/batch request may take before
+# Elasticsearch returns the hits collected so far
+BATCH_SEARCH_TIMEOUT = float(os.environ.get("BATCH_SEARCH_TIMEOUT", 5))
+
+# Stopwords dropped by the topic tokenizer; options are 'none', 'default'
+# (for a of the and to in), 'english', or the path of a file of words
+TOKENIZER_STOPWORDS = os.environ.get("TOKENIZER_STOPWORDS", "default")
+
+# Stemmer applied by the topic tokenizer; options are 'none', 'porter',
+# 'snowball', 'lancaster'. The global topic models have to be retrained
+# after changing it (or the stopwords)
+TOKENIZER_STEMMER = os.environ.get("TOKENIZER_STEMMER", "none")
+
+# Minimum size, in bytes, of the topic responses compressed with gzip or
+# deflate (when the client accepts either)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get(
+    "RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+
+# Compression level of the topic responses, from 1 (fastest) to 9 (smallest)
+RESPONSE_COMPRESSION_LEVEL = int(os.environ.get("RESPONSE_COMPRESSION_LEVEL",
+                                                6))
+
+# Number of words (or topics) returned by the aggregate mode of the topic
+# end-points when the request does not set 'top_k'
+TOPICS_AGGREGATE_TOP_K = int(os.environ.get("TOPICS_AGGREGATE_TOP_K", 10))
+
+# Backend computing the TF-IDF output of in-memory corpora; options are
+# 'gensim' (document by document) and 'sparse' (vectorized over the
+# document-term matrix). Both produce the same output
+TFIDF_BACKEND = os.environ.get("TFIDF_BACKEND", "gensim")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import cPickle
+
+logging.basicConfig(level=logging.INFO)
+
+# Bumped whenever the layout of the pickled engine state changes, so that
+# stale entries are never loaded into a newer generator.
+CACHE_FORMAT_VERSION = 2
+
+
+def get_corpus_hash(corpus):
+    '''
+    This function hashes the training corpus, which may be a byte string, a
+    unicode string or a grammar object.
+
+    Params:
+    -------
+    - corpus (object): The training corpus
+
+    Returns: str
+    '''
+    if isinstance(corpus, unicode):
+        corpus = corpus.encode('utf-8')
+    elif not isinstance(corpus, str):
+        corpus = repr(corpus)
+    return hashlib.sha1(corpus).hexdigest()
+
+
+def get_engine_key(corpus_hash, engine_type, parameters):
+    '''
+    This function derives the cache key of a trained engine from the corpus
+    hash, the engine type and the engine parameters.
+
+    Params:
+    -------
+    - corpus_hash (str): The hash of the training corpus
+    - engine_type (str): The engine type specified in settings
+    - parameters (dict): The parameters the engine is trained with
+
+    Returns: str
+    '''
+    return hashlib.sha1(json.dumps([CACHE_FORMAT_VERSION, corpus_hash,
+                                    engine_type,
+                                    sorted(parameters.items())])).hexdigest()
+
+
+class EngineCache(object):
+    '''
+    This class persists trained generator engines (HMM taggers, Markov
+    successor tables, grammars) in a local directory, so that repeated
+    generator runs over the same corpus skip training. Every entry is a
+    pickle of the engine plus a small JSON file describing it.
+    '''
+
+    def __init__(self, directory):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - directory (str): The cache directory
+        '''
+        self._directory = os.path.abspath(directory)
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+    def __get_path(self, key, extension):
+        return os.path.join(self._directory, key + extension)
+
+    def get(self, key):
+        '''
+        This method loads a cached engine.
+
+        Params:
+        -------
+        - key (str): The engine key
+
+        Returns: object or None
+        '''
+        path = self.__get_path(key, '.pickle')
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as engine_file:
+                return cPickle.load(engine_file)
+        except Exception, error:
+            logging.error('EngineCache.get: Error occurred - {0}'.format(
+                          str(error)))
+        return None
+
+    def put(self, key, engine, engine_type, parameters, corpus_hash):
+        '''
+        This method saves a trained engine. The pickle is written to a
+        temporary file first and renamed, so concurrent runs never load a
+        partially written entry.
+
+        Params:
+        -------
+        - key (str): The engine key
+        - engine (object): The trained engine
+        - engine_type (str): The engine type specified in settings
+        - parameters (dict): The parameters the engine was trained with
+        - corpus_hash (str): The hash of the training corpus
+        '''
+        path = self.__get_path(key, '.pickle')
+        temporary_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            with open(temporary_path, 'wb') as engine_file:
+                cPickle.dump(engine, engine_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temporary_path, path)
+            with open(self.__get_path(key, '.json'), 'w') as metadata_file:
+                json.dump({'key': key,
+                           'engine_type': engine_type,
+                           'parameters': parameters,
+                           'corpus_hash': corpus_hash,
+                           'created': time.time(),
+                           'size': os.path.getsize(path)}, metadata_file)
+        except Exception, error:
+            logging.error('EngineCache.put: Error occurred - {0}'.format(
+                          str(error)))
+            if os.path.isfile(temporary_path):
+                os.remove(temporary_path)
+
+    def list(self):
+        '''
+        This method lists the cached engines, most recently created first.
+
+        Returns: list of dict
+        '''
+        entries = []
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self._directory,
+                                       file_name)) as metadata_file:
+                    entries.append(json.load(metadata_file))
+            except Exception, error:
+                logging.error('EngineCache.list: Error occurred - {0}'.format(
+                              str(error)))
+        return sorted(entries, key=lambda entry: entry.get('created', 0),
+                      reverse=True)
+
+    def remove(self, key):
+        for extension in ('.pickle', '.json'):
+            path = self.__get_path(key, extension)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def prune(self, max_age_days=None, keep=None):
+        '''
+        This method removes cached engines older than max_age_days and/or
+        beyond the 'keep' most recent ones.
+
+        Params:
+        -------
+        - max_age_days (float): The maximum age of the entries kept
+        - keep (int): The maximum number of entries kept
+
+        Returns: list of the removed entries
+        '''
+        removed = []
+        now = time.time()
+        for position, entry in enumerate(self.list()):
+            too_old = max_age_days is not None and \
+                now - entry.get('created', 0) > max_age_days * 86400
+            too_many = keep is not None and position >= keep
+            if too_old or too_many:
+                self.remove(entry['key'])
+                removed.append(entry)
+        return removed
+
+
+def _encode(text):
+    return text.encode('utf-8') if isinstance(text, unicode) else text
+
+
+class TaggedCorpusCache(object):
+    '''
+    This class keeps POS-tagged corpora in a local directory, keyed by the
+    corpus hash, so that tagging (the costliest step of training the Hidden
+    Markov Model) runs once per corpus. Entries are gzipped JSON documents
+    holding the tagged sentences, the tag set and the symbols, so that they
+    can be read by other tools as well.
+    '''
+
+    def __init__(self, directory):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - directory (str): The cache directory
+        '''
+        self._directory = os.path.abspath(directory)
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+    def get_path(self, corpus_hash):
+        return os.path.join(self._directory,
+                            '{0}.tagged.json.gz'.format(corpus_hash))
+
+    def get(self, corpus_hash):
+        '''
+        This method loads a tagged corpus. JSON decodes the words and tags
+        as unicode; they are encoded back to the UTF-8 byte strings the
+        tagger produces, so that a warm run writes the same records as a
+        cold one.
+
+        Params:
+        -------
+        - corpus_hash (str): The hash of the corpus
+
+        Returns: tuple (tagged sentences, tag set, symbols) or None
+        '''
+        path = self.get_path(corpus_hash)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with gzip.open(path, 'rb') as tagged_file:
+                entry = json.load(tagged_file)
+            return ([[(_encode(word), _encode(tag)) for word, tag in
+                      sequence] for sequence in entry['sentences']],
+                    [_encode(tag) for tag in entry['tags']],
+                    [_encode(symbol) for symbol in entry['symbols']])
+        except Exception, error:
+            logging.error('TaggedCorpusCache.get: Error occurred - '
+                          '{0}'.format(str(error)))
+        return None
+
+    def put(self, corpus_hash, tagged_sentences, tag_set, symbols):
+        '''
+        This method saves a tagged corpus, writing it to a temporary file
+        first and renaming it.
+
+        Params:
+        -------
+        - corpus_hash (str): The hash of the corpus
+        - tagged_sentences (list): The (word, tag) sequences of the corpus
+        - tag_set (list): The distinct tags
+        - symbols (list): The distinct words
+        '''
+        path = self.get_path(corpus_hash)
+        temporary_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            with gzip.open(temporary_path, 'wb') as tagged_file:
+                json.dump({'corpus_hash': corpus_hash,
+                           'sentences': tagged_sentences,
+                           'tags': tag_set,
+                           'symbols': symbols}, tagged_file)
+            os.rename(temporary_path, path)
+        except Exception, error:
+            logging.error('TaggedCorpusCache.put: Error occurred - '
+                          '{0}'.format(str(error)))
+            if os.path.isfile(temporary_path):
+                os.remove(temporary_path)
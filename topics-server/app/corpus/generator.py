@@ -7,21 +7,117 @@ import csv
 import os
 import re
 import string
+import time
+import shutil
+import hashlib
+import cStringIO
 import urllib2
 import uuid
+import multiprocessing
+import numpy
 from app.config import settings
+from app.corpus.cache import EngineCache
+from app.corpus.cache import TaggedCorpusCache
+from app.corpus.cache import get_corpus_hash
+from app.corpus.cache import get_engine_key
+from app.corpus.grammar import GrammarSampler
+from app.corpus.markov import CompactMarkovChain
+from app.corpus.tagging import tag_corpus
+from app.utils.datafile import is_compressed
+from app.utils.datafile import open_datafile
 from nltk.util import ngrams
 from nltk import word_tokenize
 from nltk.grammar import CFG
 from nltk.grammar import PCFG
-from nltk.parse.chart import ChartParser
-from nltk.grammar import FeatureGrammar
-from nltk.parse.featurechart import FeatureChartParser
-from nltk.parse.pchart import InsideChartParser
-from nltk.parse.generate import generate as generate_text
 
 logging.basicConfig(level=logging.INFO)
 
+ENGINE_TYPES = ('direct', 'hiddenmarkovmodel', 'simplifiedmarkovchain',
+                'compactmarkovchain', 'cfg')
+
+# Smoothing applied by the Lidstone estimator of the Hidden Markov Model
+HMM_LIDSTONE_GAMMA = 0.1
+
+# Size of the n-grams the simplified Markov chain is built from
+MARKOV_CHAIN_ORDER = 2
+
+# Trained engine handed to the shard workers. It is set before the process
+# pool is created, so forked workers inherit it instead of unpickling it.
+_shard_engine = {}
+
+# Probability annotation of a PCFG production, e.g. "[0.25]"
+_PCFG_PROBABILITY = re.compile(r'\[\s*(?:\d+(?:\.\d*)?|\.\d+)\s*\]')
+
+_PUNCTUATION_STOP_SYMBOLS = dict((ord(char), None) for char in
+                                 string.punctuation)
+
+
+def _lidstone_estimator(fd, bins):
+    '''
+    This is the probability estimator used to train the Hidden Markov Model.
+    It is a module-level function (rather than a lambda) so that trained
+    models can be pickled.
+    '''
+    return nltk.probability.LidstoneProbDist(fd, HMM_LIDSTONE_GAMMA, bins)
+
+
+def _strip_punctuation(text):
+    '''
+    This function removes punctuation from both byte and unicode strings,
+    whose translate methods take different arguments.
+    '''
+    if isinstance(text, unicode):
+        return text.translate(_PUNCTUATION_STOP_SYMBOLS)
+    return text.translate(None, string.punctuation)
+
+
+def get_shard_seed(seed, shard):
+    '''
+    This function derives the seed of a shard from the run's seed, so that a
+    given (seed, shard count) pair always produces the same output
+    regardless of which worker process picks up which shard.
+
+    Params:
+    -------
+    - seed (int): The seed of the generation run
+    - shard (int): The index of the shard
+
+    Returns: int
+    '''
+    return int(hashlib.sha1('{0}:{1}'.format(seed, shard)).hexdigest()[:16],
+               16)
+
+
+def get_shard_sizes(number_of_records, number_of_shards):
+    '''
+    This function splits a run into shards of (nearly) equal size.
+
+    Params:
+    -------
+    - number_of_records (int): The number of records of the run
+    - number_of_shards (int): The number of shards
+
+    Returns: list of (shard, offset, number of records) tuples
+    '''
+    shards = []
+    offset = 0
+    for shard in range(number_of_shards):
+        shard_records = number_of_records // number_of_shards + \
+            (1 if shard < number_of_records % number_of_shards else 0)
+        shards.append((shard, offset, shard_records))
+        offset += shard_records
+    return shards
+
+
+def _generate_shard(shard_args):
+    '''
+    This is the process pool entry point; it generates a single shard with
+    the engine inherited from the parent process.
+    '''
+    return TextGenerator().generate_shard(_shard_engine['engine_type'],
+                                          _shard_engine['engine'],
+                                          *shard_args)
+
 
 class TextGenerator(object):
     '''
@@ -34,6 +130,8 @@ class TextGenerator(object):
     lastly;
     4) a simple mechanism that selects words at random from the given corpus of
     text.
+    Every engine is split into a training step and a sampling step, so that a
+    trained engine can be shared by several shards of a generation run.
     '''
 
     def __init__(self):
@@ -42,11 +140,63 @@ class TextGenerator(object):
         '''
         pass
 
+    def __train_simple_markov_chain(self, corpus):
+        '''
+        This method builds the bigram successor table of the simplified
+        Markov chain.
+
+        Params:
+        --------
+        - corpus (str): The training corpus
+
+        Returns: tuple (tokens, successor dict)
+        '''
+        tokens = word_tokenize(corpus)
+        cache = {}
+        bigrams = ngrams(tokens, MARKOV_CHAIN_ORDER)
+        for word1, word2 in bigrams:
+            key = (word1)
+            if key in cache:
+                cache[key].append(word2)
+            else:
+                cache[key] = [word2]
+        return tokens, cache
+
+    def __sample_simple_markov_chain(self, engine,
+                                     number_of_words_in_sentence,
+                                     number_of_sentences_per_record,
+                                     number_of_records, rng):
+        '''
+        This method walks the successor table built above.
+
+        Returns: generator
+        '''
+        tokens, cache = engine
+        try:
+            word_size = len(tokens)
+            seed = rng.randint(0, word_size-2)
+            seed_word, next_word = tokens[seed], tokens[seed + 1]
+            word1, word2 = seed_word, next_word
+            for _ in xrange(number_of_records):
+                sentences = []
+                for _ in range(number_of_sentences_per_record):
+                    sentence = []
+                    for _ in range(number_of_words_in_sentence):
+                        sentence.append(word1)
+                        word1, word2 = word2, rng.choice(cache[(word1)])
+                    sentence.append(word2)
+                    sentences.append(' '.join(sentence))
+                yield ' '.join(sentences).replace('. .', '.')
+        except Exception, error:
+            logging.error('TextGenerator: Error occurred - {0}'.format(
+                str(error)))
+
     def generate_simple_markov_chain_novel_text(self,
                                                 corpus,
                                                 number_of_words_in_sentence,
                                                 number_of_sentences_per_record,
-                                                number_of_records):
+                                                number_of_records,
+                                                rng=None):
         '''
         This method generates a simple, randomized extraction of text based
         upon a Markov model.
@@ -59,39 +209,96 @@ class TextGenerator(object):
         of sentences per record to generate.
         - number_of_records (int): An indicator as to the total number of
         records to generate.
-        Returns: list
+        - rng (random.Random): The random number generator to sample with
+        Returns: generator
         '''
-        tokens = word_tokenize(corpus)
-        cache = {}
-        words = []
         try:
-            bigrams = ngrams(tokens, 2)
-            for word1, word2 in bigrams:
-                key = (word1)
-                if key in cache:
-                    cache[key].append(word2)
-                else:
-                    cache[key] = [word2]
-            word_size = len(tokens)
-            seed = random.randint(0, word_size-2)
-            seed_word, next_word = tokens[seed], tokens[seed + 1]
-            word1, word2 = seed_word, next_word
-            for _ in range(number_of_records):
-                for _ in range(number_of_sentences_per_record):
-                    for _ in range(number_of_words_in_sentence):
-                        words.append(word1)
-                        word1, word2 = word2, random.choice(cache[(word1)])
-                    words.append(word2)
-                [item.replace('. .', '.') for item in words]
+            for record in self.__sample_simple_markov_chain(
+                    self.__train_simple_markov_chain(corpus),
+                    number_of_words_in_sentence,
+                    number_of_sentences_per_record,
+                    number_of_records,
+                    rng or random):
+                yield record
         except Exception, error:
             logging.error('TextGenerator: Error occurred - {0}'.format(
                 str(error)))
-        return words
+
+    def __train_compact_markov_chain(self, corpus):
+        '''
+        This method builds the integer-ID, array-backed Markov chain of order
+        GENERATOR_MARKOV_ORDER.
+
+        Params:
+        --------
+        - corpus (str): The training corpus
+
+        Returns: CompactMarkovChain
+        '''
+        return CompactMarkovChain.train(word_tokenize(corpus),
+                                        settings.GENERATOR_MARKOV_ORDER)
+
+    def __sample_compact_markov_chain(self, chain,
+                                      number_of_words_in_sentence,
+                                      number_of_sentences_per_record,
+                                      number_of_records, rng):
+        '''
+        This method samples the sentences of GENERATOR_MARKOV_BATCH_SIZE
+        records at a time from the chain built above. The NumPy random state
+        is seeded from 'rng', so seeded runs stay reproducible.
+
+        Returns: generator
+        '''
+        random_state = numpy.random.RandomState(rng.randint(0, 2 ** 32 - 1))
+        remaining = number_of_records
+        while remaining > 0:
+            batch_size = min(remaining, settings.GENERATOR_MARKOV_BATCH_SIZE)
+            sentences = chain.decode(chain.sample(
+                batch_size * number_of_sentences_per_record,
+                number_of_words_in_sentence, random_state))
+            for start in xrange(0, len(sentences),
+                                number_of_sentences_per_record):
+                yield ' '.join(sentences[start:start +
+                               number_of_sentences_per_record]).replace(
+                                   '. .', '.')
+            remaining -= batch_size
+
+    def generate_compact_markov_chain_novel_text(
+                                            self,
+                                            corpus,
+                                            number_of_words_in_sentence,
+                                            number_of_sentences_per_record,
+                                            number_of_records,
+                                            rng=None):
+        '''
+        This method generates text from a Markov model like
+        generate_simple_markov_chain_novel_text, but keeps the model in
+        compact NumPy arrays and samples whole batches of sentences at once.
+
+        Params:
+        --------
+        - number_of_words_in_sentence (int): An indicator as to the number of
+        words to generate in each novel sentence.
+        - number_of_sentences_per_record (int): An indicator as to the number
+        of sentences per record to generate.
+        - number_of_records (int): An indicator as to the total number of
+        records to generate.
+        - rng (random.Random): The random number generator to sample with
+        Returns: generator
+        '''
+        return self.__sample_compact_markov_chain(
+                    self.__train_compact_markov_chain(corpus),
+                    number_of_words_in_sentence,
+                    number_of_sentences_per_record,
+                    number_of_records,
+                    rng or random)
 
     def __tag_and_parse_corpus(self, corpus):
         '''
         This is a utility method to aid in the POS tagging a parsing of corpus
-        elements
+        elements. Sentences are tagged in batches (GENERATOR_TAGGER_BATCH_SIZE)
+        across GENERATOR_TAGGER_PROCESSES processes, and the result is kept in
+        the tagged corpus cache when it is enabled.
 
         Params:
         --------
@@ -100,33 +307,71 @@ class TextGenerator(object):
 
         Returns: tuple
         '''
-        tag_re = re.compile(r'[*]|--|[^+*-]+')
-        tag_set = set()
-        symbols = set()
-        cleaned_sentences = []
+        cache = None
         try:
-            sent_tokens = nltk.sent_tokenize(corpus)
-            word_tokens = [nltk.word_tokenize(sentence.replace('\'', ''))
-                           for sentence in sent_tokens]
-            tagged_tokens = [nltk.pos_tag(tokens) for tokens in word_tokens]
-            for sequence in tagged_tokens:
-                for i in range(len(sequence)):
-                    word, tag = sequence[i]
-                    symbols.add(word)
-                    tag = tag_re.match(tag).group()
-                    tag_set.add(tag)
-                    sequence[i] = (word, tag)
-                cleaned_sentences.append(sequence)
+            if settings.TAGGED_CORPUS_CACHE_ENABLED:
+                cache = TaggedCorpusCache(
+                    settings.TAGGED_CORPUS_CACHE_DIRECTORY)
+                corpus_hash = get_corpus_hash(corpus)
+                tagged_corpus = cache.get(corpus_hash)
+                if tagged_corpus is not None:
+                    logging.info('Loaded tagged corpus {0}'.format(
+                                 corpus_hash))
+                    return tagged_corpus
+            tagged_corpus = tag_corpus(corpus,
+                                       settings.GENERATOR_TAGGER_PROCESSES,
+                                       settings.GENERATOR_TAGGER_BATCH_SIZE)
+            if cache is not None:
+                cache.put(corpus_hash, *tagged_corpus)
+            return tagged_corpus
         except Exception, error:
             logging.error('TextGenerator.__tag_and_parse_corpus: Error '
                           'occurred - {0}'.format(str(error)))
-        return cleaned_sentences, list(tag_set), list(symbols)
+        return [], [], []
+
+    def __train_hmm(self, corpus):
+        '''
+        This method trains NLTK's HiddenMarkovModelTrainer on the POS-tagged
+        corpus.
+
+        Params:
+        --------
+        - corpus (str): The training corpus
+
+        Returns: nltk.tag.hmm.HiddenMarkovModelTagger
+        '''
+        labelled_sequence, tag_set, symbols = self.__tag_and_parse_corpus(
+                                                            corpus)
+        trainer = nltk.tag.hmm.HiddenMarkovModelTrainer(tag_set, symbols)
+        return trainer.train_supervised(labelled_sequence,
+                                        estimator=_lidstone_estimator)
+
+    def __sample_hmm(self, hmm, number_of_words_in_sentence,
+                     number_of_sentences_per_record, number_of_records, rng):
+        '''
+        This method samples novel records from a trained Hidden Markov Model.
+
+        Returns: generator
+        '''
+        punct_selector = ['. ', '! ', '? ']
+        for _ in xrange(number_of_records):
+            novel_sentence = []
+            for _ in range(number_of_sentences_per_record):
+                sentence = ' '.join(word[0] for word in
+                                    hmm.random_sample(rng,
+                                    number_of_words_in_sentence))
+                sentence = _strip_punctuation(sentence) + \
+                    rng.choice(punct_selector)
+                sentence = sentence[0:].capitalize()
+                novel_sentence.append(sentence)
+            yield ''.join(novel_sentence)
 
     def generate_hmm_novel_text(self,
                                 corpus,
                                 number_of_words_in_sentence,
                                 number_of_sentences_per_record,
-                                number_of_records):
+                                number_of_records,
+                                rng=None):
         '''
         This is a method that generates novel text using NLTK's
         HiddenMarkovModelTrainer object
@@ -139,44 +384,77 @@ class TextGenerator(object):
         of sentences per record to generate.
         - number_of_records (int): An indicator as to the total number of
         records to generate.
+        - rng (random.Random): The random number generator to sample with;
+        defaults to one seeded with the length of the corpus
 
-        Returns: list
+        Returns: generator
         '''
-        words = []
-        punct_selector = ['. ', '! ', '? ']
-        punctuation_stop_symbols = dict((ord(char), None) for char in
-                                        string.punctuation)
         try:
-            labelled_sequence, tag_set, symbols = self.__tag_and_parse_corpus(
-                                                                corpus)
-            trainer = nltk.tag.hmm.HiddenMarkovModelTrainer(tag_set, symbols)
-            hmm = trainer.train_supervised(labelled_sequence,
-                                           estimator=lambda fd, bins:
-                                           nltk.probability.LidstoneProbDist(
-                                            fd, 0.1, bins))
-            rng = random.Random(len(corpus))
-            for _ in range(number_of_records):
-                novel_sentence = []
-                for _ in range(number_of_sentences_per_record):
-                    sentence = ' '.join(word[0] for word in
-                                        hmm.random_sample(rng,
-                                        number_of_words_in_sentence))
-                    sentence = sentence.translate(punctuation_stop_symbols) + \
-                        random.choice(punct_selector)
-                    sentence = sentence[0:].capitalize()
-                    novel_sentence.append(sentence)
-                words.append(''.join(novel_sentence))
+            for record in self.__sample_hmm(self.__train_hmm(corpus),
+                                            number_of_words_in_sentence,
+                                            number_of_sentences_per_record,
+                                            number_of_records,
+                                            rng or random.Random(len(corpus))):
+                yield record
         except Exception, error:
             logging.error('TextGenerator.generate_hmm_novel_text: Error '
                           'occurred - {0}'.format(str(error)))
-        return words
+
+    def __train_cfg(self, corpus):
+        '''
+        This method resolves the grammar used by the cfg engine, parsing it
+        from a string when the corpus is not already a grammar object, and
+        compiles it for random sampling. Grammars whose productions carry
+        probabilities (e.g. "NP -> Det N [0.7]") are read as PCFGs.
+
+        Params:
+        --------
+        - corpus (str or grammar): The grammar
+
+        Returns: GrammarSampler
+        '''
+        if isinstance(corpus, CFG):
+            grammar = corpus
+        elif _PCFG_PROBABILITY.search(corpus):
+            grammar = PCFG.fromstring(corpus)
+        else:
+            grammar = CFG.fromstring(corpus)
+        return GrammarSampler(grammar)
+
+    def __sample_cfg(self, sampler, number_of_words_in_sentence,
+                     number_of_sentences_per_record, number_of_records, rng):
+        '''
+        This method generates novel records from the grammar. Every sentence
+        is made of random derivations (at most GENERATOR_CFG_MAX_DEPTH deep)
+        drawn until it holds number_of_words_in_sentence words.
+
+        Returns: generator
+        '''
+        punct_selector = ['. ', '! ', '? ']
+        for _ in xrange(number_of_records):
+            novel_sentence = []
+            for _ in range(number_of_sentences_per_record):
+                words = []
+                while len(words) < number_of_words_in_sentence:
+                    derivation = sampler.sample(
+                        settings.GENERATOR_CFG_MAX_DEPTH, rng,
+                        settings.GENERATOR_CFG_WEIGHTED)
+                    if not derivation:
+                        break
+                    words.extend(derivation)
+                sentence = _strip_punctuation(' '.join(words)) + rng.choice(
+                    punct_selector)
+                sentence = sentence[0:].capitalize()
+                novel_sentence.append(sentence)
+            yield ''.join(novel_sentence)
 
     def generate_context_free_grammar_novel_text(
                                             self,
                                             corpus,
                                             number_of_words_in_sentence,
                                             number_of_sentences_per_record,
-                                            number_of_records):
+                                            number_of_records,
+                                            rng=None):
         '''
         This method utilizes NLTK's Context Free Grammar parser objects to
         parse an available .*cfg file and generate novel text from it.
@@ -189,55 +467,36 @@ class TextGenerator(object):
         of sentences per record to generate.
         - number_of_records (int): An indicator as to the total number of
         records to generate.
+        - rng (random.Random): The random number generator to sample with
 
-        Returns: str
+        Returns: generator
         '''
-        words = []
-        punct_selector = ['. ', '! ', '? ']
-        punctuation_stop_symbols = dict((ord(char), None) for char in
-                                        string.punctuation)
-        parser = None
-        grammar = None
         try:
-            if isinstance(corpus, CFG):
-                _grammar = corpus
-                if _grammar is not None:
-                    parser = ChartParser(_grammar)
-                    grammar = parser.grammar
-            elif isinstance(corpus, FeatureGrammar):
-                _grammar = corpus
-                if _grammar is not None:
-                    parser = FeatureChartParser(_grammar)
-                    grammar = parser.grammar()
-            elif isinstance(corpus, PCFG):
-                _grammar = corpus
-                if _grammar is not None:
-                    parser = InsideChartParser(_grammar)
-                    grammar = parser.grammar()
-            else:
-                grammar = CFG.fromstring(corpus)
-            if grammar is not None:
-                for _ in range(number_of_records):
-                    novel_sentence = []
-                    for _ in range(number_of_sentences_per_record):
-                        sentence = ' '.join([sent for _, sent in enumerate(
-                            generate_text(grammar, depth=2,
-                                          n=number_of_words_in_sentence))])
-                        sentence = sentence.translate(
-                            punctuation_stop_symbols) + random.choice(
-                            punct_selector)
-                        sentence = sentence[0:].capitalize()
-                        novel_sentence.append(sentence)
-                    words.append(''.join(novel_sentence))
+            for record in self.__sample_cfg(self.__train_cfg(corpus),
+                                            number_of_words_in_sentence,
+                                            number_of_sentences_per_record,
+                                            number_of_records,
+                                            rng or random):
+                yield record
         except Exception, error:
             logging.error('TextGenerator: Error occurred - {0}'.format(
                           str(error)))
-        return '. '.join(words)
+
+    def __train_direct(self, corpus):
+        return nltk.sent_tokenize(corpus)
+
+    def __sample_direct(self, sentence_tokens, number_of_sentences,
+                        number_of_records, rng):
+        # Every sampled sentence is a record of its own, i.e. there are
+        # number_of_sentences * number_of_records of them
+        for _ in xrange(number_of_sentences * number_of_records):
+            yield rng.choice(sentence_tokens)
 
     def generate_direct_text(self,
                              corpus,
                              number_of_sentences,
-                             number_of_records):
+                             number_of_records,
+                             rng=None):
         '''
         This method generates data by randomly selecting words from the corpus
         and assembling them into data records.
@@ -248,32 +507,190 @@ class TextGenerator(object):
         per record to generate.
         - number_of_records (int): An indicator as to the total number of
         records to generate.
+        - rng (random.Random): The random number generator to sample with
 
-        Returns: list
+        Returns: generator
+        '''
+        return self.__sample_direct(self.__train_direct(corpus),
+                                    number_of_sentences,
+                                    number_of_records,
+                                    rng or random)
+
+    def train_engine(self, engine_type, corpus):
+        '''
+        This method runs the training step of the selected engine once, so
+        that its result can be sampled from repeatedly (e.g. by several
+        shards).
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - corpus (str): This is the training corpus
+
+        Returns: object
         '''
-        words = []
-        sentence_tokens = nltk.sent_tokenize(corpus)
-        words = [random.choice(sentence_tokens) for _ in range(
-                number_of_sentences) for _ in range(number_of_records)]
-        return words
+        if engine_type == 'direct':
+            return self.__train_direct(corpus)
+        elif engine_type == 'hiddenmarkovmodel':
+            return self.__train_hmm(corpus)
+        elif engine_type == 'simplifiedmarkovchain':
+            return self.__train_simple_markov_chain(corpus)
+        elif engine_type == 'compactmarkovchain':
+            return self.__train_compact_markov_chain(corpus)
+        elif engine_type == 'cfg':
+            return self.__train_cfg(corpus)
+        raise ValueError('Unknown engine type: {0}'.format(engine_type))
+
+    def get_engine_parameters(self, engine_type):
+        '''
+        This method returns the parameters baked into the trained state of an
+        engine; they are part of the engine cache key.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+
+        Returns: dict
+        '''
+        if engine_type == 'hiddenmarkovmodel':
+            return {'estimator': 'lidstone', 'gamma': HMM_LIDSTONE_GAMMA}
+        elif engine_type == 'simplifiedmarkovchain':
+            return {'order': MARKOV_CHAIN_ORDER}
+        elif engine_type == 'compactmarkovchain':
+            return {'order': settings.GENERATOR_MARKOV_ORDER}
+        return {}
+
+    def load_engine(self, engine_type, corpus):
+        '''
+        This method returns the trained engine for the corpus, loading it
+        from the engine cache when the same corpus, engine type and
+        parameters have been trained before, and training (then caching) it
+        otherwise.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - corpus (str): This is the training corpus
+
+        Returns: object
+        '''
+        if not settings.GENERATOR_MODEL_CACHE_ENABLED:
+            return self.train_engine(engine_type, corpus)
+        cache = EngineCache(settings.GENERATOR_MODEL_CACHE_DIRECTORY)
+        corpus_hash = get_corpus_hash(corpus)
+        parameters = self.get_engine_parameters(engine_type)
+        key = get_engine_key(corpus_hash, engine_type, parameters)
+        engine = cache.get(key)
+        if engine is not None:
+            logging.info('Loaded cached {0} engine {1}'.format(engine_type,
+                                                                key))
+            return engine
+        engine = self.train_engine(engine_type, corpus)
+        cache.put(key, engine, engine_type, parameters, corpus_hash)
+        logging.info('Cached {0} engine {1}'.format(engine_type, key))
+        return engine
+
+    def sample_engine(self, engine_type, engine,
+                      number_of_words_per_sentence,
+                      number_of_sentences_per_record,
+                      number_of_records, rng):
+        '''
+        This method samples records from an engine trained by train_engine.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - engine (object): The trained engine
+        - number_of_words_per_sentence (int): An indicator as to the number of
+        words to generate in each novel sentence.
+        - number_of_sentences_per_record (int): An indicator as to the number
+        of sentences per record to generate.
+        - number_of_records (int): An indicator as to the total number of
+        records  to generate.
+        - rng (random.Random): The random number generator to sample with
 
-    def generate_csv(self, data, output_file_name, delimiter):
+        Returns: generator
+        '''
+        if engine_type == 'direct':
+            return self.__sample_direct(engine,
+                                        number_of_sentences_per_record,
+                                        number_of_records, rng)
+        elif engine_type == 'hiddenmarkovmodel':
+            return self.__sample_hmm(engine,
+                                     number_of_words_per_sentence,
+                                     number_of_sentences_per_record,
+                                     number_of_records, rng)
+        elif engine_type == 'simplifiedmarkovchain':
+            return self.__sample_simple_markov_chain(
+                                     engine,
+                                     number_of_words_per_sentence,
+                                     number_of_sentences_per_record,
+                                     number_of_records, rng)
+        elif engine_type == 'compactmarkovchain':
+            return self.__sample_compact_markov_chain(
+                                     engine,
+                                     number_of_words_per_sentence,
+                                     number_of_sentences_per_record,
+                                     number_of_records, rng)
+        elif engine_type == 'cfg':
+            return self.__sample_cfg(engine,
+                                     number_of_words_per_sentence,
+                                     number_of_sentences_per_record,
+                                     number_of_records, rng)
+        raise ValueError('Unknown engine type: {0}'.format(engine_type))
+
+    def generate_csv(self, data, output_file_name, delimiter,
+                     compress=False, buffer_size=1024 * 1024,
+                     progress_interval=0):
         '''
         This method generates CSV files from the resulting novel text that is
-        created by one of the methods above.
+        created by one of the methods above. Records are consumed one at a
+        time and written through an in-memory buffer that is flushed once it
+        exceeds buffer_size bytes, so memory use does not depend on the
+        number of records.
 
         Params:
         -------
-        - data (list): The records themselves stored in a list of strings
+        - data (iterable): The (id, text) records, e.g. a generator
         - output_file_name (str): The name of the output file
         - delimiter (str): The delimiter used in the csv file
+        - compress (bool): Whether the file is written gzip-compressed
+        - buffer_size (int): The number of bytes buffered between writes
+        - progress_interval (int): The number of records between progress
+        log messages; 0 disables progress reporting
+
+        Returns: int (the number of records written)
         '''
+        count = 0
+        written = 0
+        start = time.time()
         try:
-            if len(data) > 0:
-                abs_path = os.path.abspath(output_file_name)
-                with open(abs_path, 'wb') as csv_file:
-                    csv_writer = csv.writer(csv_file, delimiter=delimiter)
-                    csv_writer.writerows(data)
+            abs_path = os.path.abspath(output_file_name)
+            with open_datafile(abs_path, 'wb', compress) as csv_file:
+                csv_buffer = cStringIO.StringIO()
+                csv_writer = csv.writer(csv_buffer, delimiter=delimiter)
+                for record in data:
+                    csv_writer.writerow(record)
+                    count += 1
+                    if csv_buffer.tell() >= buffer_size:
+                        written += csv_buffer.tell()
+                        csv_file.write(csv_buffer.getvalue())
+                        csv_buffer.seek(0)
+                        csv_buffer.truncate()
+                    if progress_interval and count % progress_interval == 0:
+                        logging.info('Generated {0} records ({1:.1f} '
+                                     'records/sec)'.format(
+                                        count, count / max(
+                                            time.time() - start, 1e-9)))
+                written += csv_buffer.tell()
+                csv_file.write(csv_buffer.getvalue())
+            if count > 0:
+                elapsed = max(time.time() - start, 1e-9)
+                logging.info('Wrote {0} records ({1} bytes) to {2} in '
+                             '{3:.1f}s: {4:.1f} records/sec, {5:.1f} '
+                             'bytes/sec'.format(count, written, abs_path,
+                                                elapsed, count / elapsed,
+                                                written / elapsed))
             else:
                 logging.error('There was an error retrieving the data as an '
                               'array. Its length was zero.')
@@ -283,6 +700,51 @@ class TextGenerator(object):
         except Exception, error:
             logging.error('TextGenerator.generate_csv: Error occurred - '
                           '{0}'.format(str(error)))
+        return count
+
+    def generate_records(self,
+                         engine_type,
+                         bGenerateUuids,
+                         corpus,
+                         number_of_words_per_sentence,
+                         number_of_sentences_per_record,
+                         number_of_records,
+                         seed=None):
+        '''
+        This method is a utility method that is charged with invoking the
+        different novel text generators above (based upon various 'engines'
+        contained in settings) and lazily yielding the resulting records.
+        The records are those of a sharded run of a single shard (see
+        generate_shard_records), so a given seed always yields the same
+        records.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - bGenerateUuids (bool): Parameter that indicates whether GUIDs are to
+        be created per record
+        - corpus (str): This is the training corpus
+        - number_of_words_in_sentence (int): An indicator as to the number of
+        words to generate in each novel sentence.
+        - number_of_sentences_per_record (int): An indicator as to the number
+        of sentences per record to generate.
+        - number_of_records (int): An indicator as to the total number of
+        records  to generate.
+        - seed (int): The seed of the generation run; None for GENERATOR_SEED
+
+        Returns: generator of (id, text) tuples
+        '''
+        try:
+            engine = self.load_engine(engine_type, corpus)
+            for record in self.generate_shard_records(
+                    engine_type, engine, 0, 0, number_of_records,
+                    settings.GENERATOR_SEED if seed is None else seed,
+                    bGenerateUuids, number_of_words_per_sentence,
+                    number_of_sentences_per_record):
+                yield record
+        except Exception, error:
+            logging.error('TextGenerator.generate_records: Error occurred - '
+                          '{0}'.format(str(error)))
 
     def generate_array_of_records(self,
                                   engine_type,
@@ -290,15 +752,13 @@ class TextGenerator(object):
                                   corpus,
                                   number_of_words_per_sentence,
                                   number_of_sentences_per_record,
-                                  number_of_records):
+                                  number_of_records,
+                                  seed=None):
         '''
-        This method is a utility method that is charged with invoking the
-        different novel text generators above (based upon various 'engines'
-        contained in settings).
+        This method materializes the records yielded by generate_records.
 
         Params:
         --------
-        - text_generator (obj): The text generator object.
         - engine_type (str): The engine type specified in settings.
         - bGenerateUuids (bool): Parameter that indicates whether GUIDs are to
         be created per record
@@ -309,40 +769,175 @@ class TextGenerator(object):
         of sentences per record to generate.
         - number_of_records (int): An indicator as to the total number of
         records  to generate.
+        - seed (int): The seed of the generation run; None for GENERATOR_SEED
 
         Returns: list
         '''
-        data_obj = []
-        if engine_type == 'direct':
-            data_obj = self.generate_direct_text(
-                            corpus,
-                            number_of_sentences_per_record,
-                            number_of_records)
-        elif engine_type == 'hiddenmarkovmodel':
-            data_obj = self.generate_hmm_novel_text(
-                                            corpus,
-                                            number_of_words_per_sentence,
-                                            number_of_sentences_per_record,
-                                            number_of_records)
-        elif engine_type == 'simplifiedmarkovchain':
-            data_obj = self.generate_simple_markov_chain_novel_text(
-                            corpus,
-                            number_of_words_per_sentence,
-                            number_of_sentences_per_record,
-                            number_of_records)
-        elif engine_type == 'cfg':
-            data_obj = self.generate_context_free_grammar_novel_text(
-                                            corpus,
-                                            number_of_words_per_sentence,
-                                            number_of_sentences_per_record,
-                                            number_of_records)
+        return list(self.generate_records(engine_type,
+                                          bGenerateUuids,
+                                          corpus,
+                                          number_of_words_per_sentence,
+                                          number_of_sentences_per_record,
+                                          number_of_records,
+                                          seed))
+
+    def generate_shard(self, engine_type, engine, shard, offset,
+                       number_of_records, seed, bGenerateUuids,
+                       number_of_words_per_sentence,
+                       number_of_sentences_per_record,
+                       part_file_name, delimiter, compress=False):
+        '''
+        This method generates one shard of a sharded run into its own part
+        file. The shard samples with a random number generator seeded from
+        the run's seed and the shard index, and record ids are drawn from the
+        same generator (or numbered from the shard's offset), so the output
+        is reproducible.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - engine (object): The trained engine
+        - shard (int): The index of the shard
+        - offset (int): The index of the shard's first record in the run
+        - number_of_records (int): The number of records in the shard
+        - seed (int): The seed of the generation run
+        - bGenerateUuids (bool): Parameter that indicates whether GUIDs are to
+        be created per record
+        - number_of_words_per_sentence (int): An indicator as to the number of
+        words to generate in each novel sentence.
+        - number_of_sentences_per_record (int): An indicator as to the number
+        of sentences per record to generate.
+        - part_file_name (str): The name of the shard's part file
+        - delimiter (str): The delimiter used in the csv file
+        - compress (bool): Whether the part file is gzip-compressed
+
+        Returns: tuple (part file name, number of records)
+        '''
+        records = self.generate_shard_records(engine_type, engine, shard,
+                                              offset, number_of_records, seed,
+                                              bGenerateUuids,
+                                              number_of_words_per_sentence,
+                                              number_of_sentences_per_record)
+        count = self.generate_csv(records, part_file_name, delimiter,
+                                  compress=compress)
+        return part_file_name, count
+
+    def generate_shard_records(self, engine_type, engine, shard, offset,
+                               number_of_records, seed, bGenerateUuids,
+                               number_of_words_per_sentence,
+                               number_of_sentences_per_record):
+        '''
+        This method generates the (id, text) records of one shard, sampling
+        with a random number generator seeded from the run's seed and the
+        shard index.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - engine (object): The trained engine
+        - shard (int): The index of the shard
+        - offset (int): The index of the shard's first record in the run
+        - number_of_records (int): The number of records in the shard
+        - seed (int): The seed of the generation run
+        - bGenerateUuids (bool): Parameter that indicates whether GUIDs are to
+        be created per record
+        - number_of_words_per_sentence (int): An indicator as to the number of
+        words to generate in each novel sentence.
+        - number_of_sentences_per_record (int): An indicator as to the number
+        of sentences per record to generate.
+
+        Returns: generator of (id, text) tuples
+        '''
+        rng = random.Random(get_shard_seed(seed, shard))
+        records = self.sample_engine(engine_type, engine,
+                                     number_of_words_per_sentence,
+                                     number_of_sentences_per_record,
+                                     number_of_records, rng)
         if bGenerateUuids:
-            data_obj = [(str(uuid.uuid1()), novel_text) for novel_text in
-                        data_obj]
-        else:
-            data_obj = [(i, novel_text) for i, novel_text in enumerate(
-                                                                    data_obj)]
-        return data_obj
+            return ((str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                     novel_text) for novel_text in records)
+        if engine_type == 'direct':
+            # The 'direct' engine yields a record per sentence
+            offset *= number_of_sentences_per_record
+        return ((offset + i, novel_text) for i, novel_text in
+                enumerate(records))
+
+    def generate_sharded_csv(self,
+                             engine_type,
+                             bGenerateUuids,
+                             corpus,
+                             number_of_words_per_sentence,
+                             number_of_sentences_per_record,
+                             number_of_records,
+                             output_file_name,
+                             delimiter,
+                             number_of_shards,
+                             number_of_processes,
+                             seed,
+                             keep_part_files=False,
+                             compress=False):
+        '''
+        This method trains the engine once and then generates the records in
+        shards spread over a process pool. Each shard is written to a part
+        file named '<output_file_name>.part-<shard>'; unless the part files
+        are kept, they are concatenated into the output file in shard order
+        and removed.
+
+        Params:
+        --------
+        - engine_type (str): The engine type specified in settings.
+        - bGenerateUuids (bool): Parameter that indicates whether GUIDs are to
+        be created per record
+        - corpus (str): This is the training corpus
+        - number_of_words_per_sentence (int): An indicator as to the number of
+        words to generate in each novel sentence.
+        - number_of_sentences_per_record (int): An indicator as to the number
+        of sentences per record to generate.
+        - number_of_records (int): An indicator as to the total number of
+        records  to generate.
+        - output_file_name (str): The name of the output file
+        - delimiter (str): The delimiter used in the csv file
+        - number_of_shards (int): The number of shards to split the run into
+        - number_of_processes (int): The size of the process pool
+        - seed (int): The seed from which every shard's seed is derived
+        - keep_part_files (bool): Whether the part files are kept instead of
+        being merged into the output file
+        - compress (bool): Whether the files are gzip-compressed; compressed
+        parts are merged by concatenation, which yields a valid multi-member
+        gzip file
+
+        Returns: list of part file names (or of the output file name)
+        '''
+        abs_path = os.path.abspath(output_file_name)
+        engine = self.load_engine(engine_type, corpus)
+        shards = [(shard, offset, shard_records, seed, bGenerateUuids,
+                   number_of_words_per_sentence,
+                   number_of_sentences_per_record,
+                   '{0}.part-{1:05d}'.format(abs_path, shard), delimiter,
+                   compress)
+                  for shard, offset, shard_records in get_shard_sizes(
+                      number_of_records, number_of_shards)]
+        _shard_engine['engine_type'] = engine_type
+        _shard_engine['engine'] = engine
+        pool = multiprocessing.Pool(processes=number_of_processes)
+        try:
+            part_files = []
+            for part_file_name, count in pool.imap(_generate_shard, shards):
+                logging.info('Generated {0} records into {1}'.format(
+                             count, part_file_name))
+                part_files.append(part_file_name)
+        finally:
+            pool.close()
+            pool.join()
+            _shard_engine.clear()
+        if keep_part_files:
+            return part_files
+        with open(abs_path, 'wb') as output_file:
+            for part_file_name in part_files:
+                with open(part_file_name, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, output_file)
+                os.remove(part_file_name)
+        return [abs_path]
 
     def load_nltk_data(self, file_path, prefix):
         '''
@@ -406,46 +1001,86 @@ class TextGenerator(object):
         return data
 
 
+def load_corpus(generator):
+    '''
+    This function loads the training corpus from the reference path set in
+    settings.
+
+    Params:
+    -------
+    - generator (TextGenerator): The generator loading the corpus
+
+    Returns: str
+    '''
+    raw_data = None
+    logging.info('Reference path type = {}'.format(
+        settings.CORPORA_REFERENCE_PATH_TYPE))
+    if settings.CORPORA_REFERENCE_PATH_TYPE == 'nltk-datafile' and \
+       settings.CORPORA_REFERENCE_PATH.startswith('nltk://'):
+        if settings.CORPUS_ENGINE_TYPE == 'cfg':
+            logging.info('Loading Chomsky-normalized Context Free '
+                         'Grammars...')
+            raw_data = generator.load_nltk_data_as_string(
+                        settings.CORPORA_REFERENCE_PATH, 'nltk://')
+        else:
+            logging.info('Loading data directly from the NLTK corpora '
+                         'stored on the file system...')
+            raw_data = generator.load_nltk_data(
+                settings.CORPORA_REFERENCE_PATH, 'nltk://')
+    elif settings.CORPORA_REFERENCE_PATH_TYPE == 'local-datafile':
+        logging.info('Loading data directly from the file system...')
+        raw_data = generator.load_local_file(
+                                        settings.CORPORA_REFERENCE_PATH)
+    elif settings.CORPORA_REFERENCE_PATH_TYPE == 'url':
+        logging.info('Loading data from URLs...')
+        raw_data = generator.load_url_data(settings.CORPORA_REFERENCE_PATH)
+    return raw_data
+
+
 def generate():
     try:
         logging.info('Running generator')
         generator = TextGenerator()
-        logging.info('Reference path type = {}'.format(
-            settings.CORPORA_REFERENCE_PATH_TYPE))
-        if settings.CORPORA_REFERENCE_PATH_TYPE == 'nltk-datafile' and \
-           settings.CORPORA_REFERENCE_PATH.startswith('nltk://'):
-            if settings.CORPUS_ENGINE_TYPE == 'cfg':
-                logging.info('Loading Chomsky-normalized Context Free '
-                             'Grammars...')
-                raw_data = generator.load_nltk_data_as_string(
-                            settings.CORPORA_REFERENCE_PATH, 'nltk://')
-            else:
-                logging.info('Loading data directly from the NLTK corpora '
-                             'stored on the file system...')
-                raw_data = generator.load_nltk_data(
-                    settings.CORPORA_REFERENCE_PATH, 'nltk://')
-        elif settings.CORPORA_REFERENCE_PATH_TYPE == 'local-datafile':
-            logging.info('Loading data directly from the file system...')
-            raw_data = generator.load_local_file(
-                                            settings.CORPORA_REFERENCE_PATH)
-        elif settings.CORPORA_REFERENCE_PATH_TYPE == 'url':
-            logging.info('Loading data from URLs...')
-            raw_data = generator.load_url_data(settings.CORPORA_REFERENCE_PATH)
-        if settings.OPERATION_GENERATE_DATA_FILE:
+        raw_data = load_corpus(generator)
+        compress = is_compressed(settings.DATAFILE_OUTPUT_FILE_PATH)
+        if settings.OPERATION_GENERATE_DATA_FILE and \
+           settings.GENERATOR_SHARDS > 1:
+            logging.info('Data-file will be generated in {0} shards '
+                         'utilizing the selected engine type: {1}..'.format(
+                            settings.GENERATOR_SHARDS,
+                            settings.CORPUS_ENGINE_TYPE))
+            generator.generate_sharded_csv(
+                engine_type=settings.CORPUS_ENGINE_TYPE,
+                bGenerateUuids=settings.DATAFILE_GENERATE_UUID,
+                corpus=raw_data,
+                number_of_words_per_sentence=settings.DATAFILE_WORDS_PER_RECORD,
+                number_of_sentences_per_record=settings.DATAFILE_SENTENCES_PER_RECORD,
+                number_of_records=settings.DATAFILE_RECORD_NUMBER,
+                output_file_name=settings.DATAFILE_OUTPUT_FILE_PATH,
+                delimiter=settings.DATAFILE_DELIMITER,
+                number_of_shards=settings.GENERATOR_SHARDS,
+                number_of_processes=settings.GENERATOR_PROCESSES,
+                seed=settings.GENERATOR_SEED,
+                keep_part_files=settings.GENERATOR_KEEP_PART_FILES,
+                compress=compress)
+        elif settings.OPERATION_GENERATE_DATA_FILE:
             logging.info('Data-file will be generated utilizing the selected '
                          'engine type: {0}..'.format(
                             settings.CORPUS_ENGINE_TYPE))
-            data_obj = generator.generate_array_of_records(
+            data_obj = generator.generate_records(
                 engine_type=settings.CORPUS_ENGINE_TYPE,
                 bGenerateUuids=settings.DATAFILE_GENERATE_UUID,
                 corpus=raw_data,
                 number_of_words_per_sentence=settings.DATAFILE_WORDS_PER_RECORD,
                 number_of_sentences_per_record=settings.DATAFILE_SENTENCES_PER_RECORD,
                 number_of_records=settings.DATAFILE_RECORD_NUMBER)
-        if data_obj:
             logging.info('Generating CSV files...')
-            generator.generate_csv(data_obj,
-                                   settings.DATAFILE_OUTPUT_FILE_PATH,
-                                   settings.DATAFILE_DELIMITER)
+            generator.generate_csv(
+                data_obj,
+                settings.DATAFILE_OUTPUT_FILE_PATH,
+                settings.DATAFILE_DELIMITER,
+                compress=compress,
+                buffer_size=settings.DATAFILE_WRITE_BUFFER_SIZE,
+                progress_interval=settings.DATAFILE_PROGRESS_INTERVAL)
     except Exception, error:
         logging.error(str(error))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import bisect
+import logging
+from nltk.featstruct import TYPE
+from nltk.grammar import FeatStructNonterminal
+from nltk.grammar import Nonterminal
+
+logging.basicConfig(level=logging.INFO)
+
+# Minimum derivation depth of a nonterminal that can never terminate
+_UNREACHABLE = float('inf')
+
+
+def _get_symbol(nonterminal):
+    '''
+    This is a utility function that returns the lookup key of a
+    nonterminal. Feature-based nonterminals are keyed by their type only,
+    so feature agreement is not enforced while sampling.
+
+    Returns: object
+    '''
+    if isinstance(nonterminal, FeatStructNonterminal):
+        return nonterminal.get(TYPE, repr(nonterminal))
+    return nonterminal.symbol()
+
+
+class GrammarSampler(object):
+    '''
+    This class draws random derivations from a context free grammar, top
+    down. The productions are compiled once into tables indexed by
+    nonterminal, and the productions that can still terminate within the
+    remaining depth are worked out once per (nonterminal, depth) pair, so
+    the cost of a sentence depends on its length rather than on the size of
+    the grammar. Productions of a PCFG are drawn according to their
+    probabilities; those of a plain CFG are drawn uniformly.
+    '''
+
+    def __init__(self, grammar):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - grammar (CFG, PCFG or FeatureGrammar): The grammar to sample from
+        '''
+        self._index = {}
+        self._rules = []
+        self._weights = []
+        productions = grammar.productions()
+        for production in productions:
+            self.__get_index(production.lhs())
+        for production in productions:
+            nonterminal = self.__get_index(production.lhs())
+            self._rules[nonterminal].append(tuple(
+                self.__get_index(symbol) if isinstance(symbol, Nonterminal)
+                else symbol for symbol in production.rhs()))
+            self._weights[nonterminal].append(
+                production.prob() if hasattr(production, 'prob') else 1.0)
+        self._start = self.__get_index(grammar.start())
+        self._min_depths = self.__get_min_depths()
+        self._max_rule_depth = max([
+            self.__get_rule_depth(rule, self._min_depths)
+            for rules in self._rules for rule in rules] or [0])
+        self._tables = {}
+
+    def __get_index(self, nonterminal):
+        symbol = _get_symbol(nonterminal)
+        if symbol not in self._index:
+            self._index[symbol] = len(self._rules)
+            self._rules.append([])
+            self._weights.append([])
+        return self._index[symbol]
+
+    def __get_rule_depth(self, rule, min_depths):
+        return 1 + max([min_depths[symbol] for symbol in rule
+                        if isinstance(symbol, int)] or [0])
+
+    def __get_min_depths(self):
+        '''
+        This method computes the smallest depth within which every
+        nonterminal can be fully rewritten into terminals, iterating until
+        no estimate improves.
+
+        Returns: list
+        '''
+        min_depths = [_UNREACHABLE] * len(self._rules)
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, rules in enumerate(self._rules):
+                for rule in rules:
+                    depth = self.__get_rule_depth(rule, min_depths)
+                    if depth < min_depths[nonterminal]:
+                        min_depths[nonterminal] = depth
+                        changed = True
+        return min_depths
+
+    def __get_table(self, nonterminal, depth):
+        '''
+        This method returns the productions of a nonterminal that terminate
+        within 'depth', together with their cumulative weights. The tables
+        are memoized; every depth beyond the deepest production shares the
+        same table.
+
+        Returns: tuple (list of rules, list of cumulative weights)
+        '''
+        key = (nonterminal, min(depth, self._max_rule_depth))
+        table = self._tables.get(key)
+        if table is None:
+            rules = []
+            cumulative_weights = []
+            total = 0.0
+            for rule, weight in zip(self._rules[nonterminal],
+                                    self._weights[nonterminal]):
+                if self.__get_rule_depth(rule, self._min_depths) <= depth:
+                    total += weight
+                    rules.append(rule)
+                    cumulative_weights.append(total)
+            table = self._tables[key] = (rules, cumulative_weights)
+        return table
+
+    def sample(self, max_depth, rng, weighted=True):
+        '''
+        This method draws one derivation from the start symbol.
+
+        Params:
+        -------
+        - max_depth (int): The maximum depth of the derivation tree
+        - rng (random.Random): The random number generator to sample with
+        - weighted (bool): Indicates whether productions are drawn according
+        to their probabilities rather than uniformly
+
+        Returns: list of str
+        '''
+        if self._min_depths[self._start] > max_depth:
+            raise ValueError('The grammar cannot terminate within a depth of '
+                             '{0}'.format(max_depth))
+        tokens = []
+        stack = [(self._start, max_depth)]
+        while stack:
+            symbol, depth = stack.pop()
+            if not isinstance(symbol, int):
+                tokens.append(symbol)
+                continue
+            rules, cumulative_weights = self.__get_table(symbol, depth)
+            if weighted:
+                # The product may round up to the total weight, past the
+                # last rule.
+                rule = rules[min(bisect.bisect_right(
+                    cumulative_weights,
+                    rng.random() * cumulative_weights[-1]), len(rules) - 1)]
+            else:
+                rule = rules[rng.randrange(len(rules))]
+            stack.extend((child, depth - 1) for child in reversed(rule))
+        return tokens
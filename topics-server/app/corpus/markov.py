@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import logging
+import numpy
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _rank(keys):
+    '''
+    This is a utility function that replaces every key by the rank of its
+    value among the distinct keys, keeping combined state keys small.
+
+    Returns: numpy.ndarray
+    '''
+    return numpy.unique(keys, return_inverse=True)[1].astype(numpy.int64)
+
+
+def _build_alias_tables(offsets, counts):
+    '''
+    This is a utility function that builds the alias tables (Vose's method)
+    of every state, so that a successor is drawn in constant time from two
+    uniform numbers: slot 'k' of a state is kept with probability
+    probabilities[k] and replaced by aliases[k] otherwise.
+
+    Returns: tuple (numpy.ndarray of probabilities, numpy.ndarray of aliases)
+    '''
+    probabilities = numpy.ones(len(counts), dtype=numpy.float32)
+    aliases = numpy.arange(len(counts), dtype=numpy.int32)
+    for state in numpy.flatnonzero(numpy.diff(offsets) > 1):
+        lower, upper = offsets[state], offsets[state + 1]
+        weights = counts[lower:upper]
+        scaled = (weights * float(len(weights)) / weights.sum()).tolist()
+        state_probabilities = [1.0] * len(scaled)
+        state_aliases = range(lower, upper)
+        small = [slot for slot, weight in enumerate(scaled) if weight < 1.0]
+        large = [slot for slot, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            slot, donor = small.pop(), large.pop()
+            state_probabilities[slot] = scaled[slot]
+            state_aliases[slot] = lower + donor
+            scaled[donor] -= 1.0 - scaled[slot]
+            if scaled[donor] < 1.0:
+                small.append(donor)
+            else:
+                large.append(donor)
+        probabilities[lower:upper] = state_probabilities
+        aliases[lower:upper] = state_aliases
+    return probabilities, aliases
+
+
+class CompactMarkovChain(object):
+    '''
+    This class is a Markov chain of arbitrary order stored as flat NumPy
+    arrays. Tokens are interned to integer IDs and the transitions of every
+    state are laid out contiguously (CSR-style): the successors of state 's'
+    are the entries offsets[s]:offsets[s + 1] of 'targets'. Successors are
+    drawn through per-state alias tables for many chains at once, so whole
+    batches of sentences are generated without a Python call per word.
+    '''
+
+    def __init__(self, vocabulary, offsets, targets, probabilities, aliases,
+                 successors, state_weights, order):
+        '''
+        Constructor; use CompactMarkovChain.train to build a chain.
+
+        Params:
+        -------
+        - vocabulary (list): The distinct tokens, indexed by token ID
+        - offsets (numpy.ndarray): The first transition of every state, plus
+        the total number of transitions
+        - targets (numpy.ndarray): The token ID emitted by every transition
+        - probabilities (numpy.ndarray): The alias table probabilities
+        - aliases (numpy.ndarray): The alias table aliases
+        - successors (numpy.ndarray): The state reached by every transition,
+        or -1 when the transition leaves the training corpus
+        - state_weights (numpy.ndarray): The number of times every state
+        occurs in the training corpus
+        - order (int): The number of preceding tokens a state is made of
+        '''
+        self.vocabulary = numpy.array(vocabulary, dtype=object)
+        self.offsets = offsets
+        self.targets = targets
+        self.probabilities = probabilities
+        self.aliases = aliases
+        self.successors = successors
+        self.order = order
+        self._degrees = numpy.diff(offsets)
+        self._state_cumulative = numpy.cumsum(state_weights)
+
+    @classmethod
+    def train(cls, tokens, order=1):
+        '''
+        This method builds a chain from a sequence of tokens.
+
+        Params:
+        -------
+        - tokens (list): The tokenized training corpus
+        - order (int): The number of preceding tokens the next token is
+        conditioned on
+
+        Returns: CompactMarkovChain
+        '''
+        if order < 1:
+            raise ValueError('The order of the chain must be at least 1')
+        if len(tokens) <= order:
+            raise ValueError('The corpus must contain more than {0} '
+                             'tokens'.format(order))
+        # Interning goes through a fixed-width array rather than a dict, so
+        # that no Python object is created per token.
+        vocabulary, token_ids = numpy.unique(numpy.array(tokens),
+                                             return_inverse=True)
+        vocabulary = vocabulary.tolist()
+        token_ids = token_ids.astype(numpy.int64)
+        vocabulary_size = len(vocabulary)
+        number_of_windows = len(token_ids) - order + 1
+        # Every window of 'order' tokens is a state; its key is folded in one
+        # token at a time and re-ranked, so it never overflows 64 bits.
+        state_keys = token_ids[:number_of_windows]
+        for position in xrange(1, order):
+            state_keys = _rank(
+                state_keys * vocabulary_size +
+                token_ids[position:position + number_of_windows])
+        # Only windows followed by a token become states; the final window of
+        # the corpus would have no transitions.
+        states = _rank(state_keys[:-1])
+        number_of_states = states.max() + 1
+        next_tokens = token_ids[order:]
+        next_states = numpy.append(states[1:], -1)
+        # A transition is a (state, next token) pair; its weight is the number
+        # of times the pair occurs in the corpus.
+        transition_keys = states * vocabulary_size + next_tokens
+        sort_order = numpy.argsort(transition_keys, kind='mergesort')
+        transition_keys = transition_keys[sort_order]
+        next_states = next_states[sort_order]
+        boundaries = numpy.flatnonzero(numpy.diff(transition_keys)) + 1
+        first = numpy.concatenate(([0], boundaries))
+        counts = numpy.diff(numpy.append(first, len(transition_keys)))
+        transition_keys = transition_keys[first]
+        offsets = numpy.searchsorted(transition_keys // vocabulary_size,
+                                     numpy.arange(number_of_states + 1))
+        probabilities, aliases = _build_alias_tables(offsets, counts)
+        return cls(vocabulary,
+                   offsets.astype(numpy.int64),
+                   (transition_keys % vocabulary_size).astype(numpy.int32),
+                   probabilities,
+                   aliases,
+                   next_states[first].astype(numpy.int32),
+                   numpy.bincount(states, minlength=number_of_states),
+                   order)
+
+    def __sample_states(self, number_of_chains, random_state):
+        '''
+        This method draws starting states in proportion to how often they
+        occur in the training corpus.
+
+        Returns: numpy.ndarray
+        '''
+        draws = random_state.randint(0, self._state_cumulative[-1],
+                                     size=number_of_chains)
+        return numpy.searchsorted(self._state_cumulative, draws, side='right')
+
+    def sample(self, number_of_chains, length, random_state):
+        '''
+        This method walks 'number_of_chains' independent chains for 'length'
+        steps. A chain that runs off the end of the training corpus restarts
+        from a freshly drawn state.
+
+        Params:
+        -------
+        - number_of_chains (int): The number of sentences sampled at once
+        - length (int): The number of tokens of every sentence
+        - random_state (numpy.random.RandomState): The random number generator
+        to sample with
+
+        Returns: numpy.ndarray of token IDs, one row per chain
+        '''
+        states = self.__sample_states(number_of_chains, random_state)
+        output = numpy.empty((number_of_chains, length), dtype=numpy.int32)
+        for step in xrange(length):
+            slots = self.offsets[states] + \
+                (random_state.random_sample(number_of_chains) *
+                 self._degrees[states]).astype(numpy.int64)
+            transitions = numpy.where(
+                random_state.random_sample(number_of_chains) <
+                self.probabilities[slots], slots, self.aliases[slots])
+            output[:, step] = self.targets[transitions]
+            states = self.successors[transitions]
+            dead_ends = numpy.flatnonzero(states < 0)
+            if len(dead_ends):
+                states[dead_ends] = self.__sample_states(len(dead_ends),
+                                                         random_state)
+        return output
+
+    def decode(self, token_ids):
+        '''
+        This method joins rows of token IDs back into sentences.
+
+        Returns: list of str
+        '''
+        return [' '.join(row) for row in self.vocabulary[token_ids]]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import re
+import logging
+import multiprocessing
+import nltk
+
+logging.basicConfig(level=logging.INFO)
+
+# Strips the suffixes of compound Brown/Treebank tags (e.g. 'NN-TL' -> 'NN')
+_TAG_RE = re.compile(r'[*]|--|[^+*-]+')
+
+
+def _tag_batch(sentences):
+    '''
+    This function tokenizes and POS-tags a batch of sentences in a single
+    tagger call, returning (word, cleaned tag) sequences.
+
+    Params:
+    -------
+    - sentences (list): The sentences of the batch
+
+    Returns: list of lists of (str, str) tuples
+    '''
+    word_tokens = [nltk.word_tokenize(sentence.replace('\'', ''))
+                   for sentence in sentences]
+    return [[(word, _TAG_RE.match(tag).group()) for word, tag in sequence]
+            for sequence in nltk.pos_tag_sents(word_tokens)]
+
+
+def tag_corpus(corpus, number_of_processes=1, batch_size=500):
+    '''
+    This function splits the corpus into sentences and POS-tags them in
+    batches, spread over a process pool when more than one process is
+    requested. The sentences keep their order.
+
+    Params:
+    -------
+    - corpus (str): The corpus of text as a single string
+    - number_of_processes (int): The number of tagging processes
+    - batch_size (int): The number of sentences per tagger call
+
+    Returns: tuple (tagged sentences, tag set, symbols)
+    '''
+    sentences = nltk.sent_tokenize(corpus)
+    batches = [sentences[start:start + batch_size]
+               for start in xrange(0, len(sentences), batch_size)]
+    if number_of_processes > 1 and len(batches) > 1:
+        pool = multiprocessing.Pool(min(number_of_processes, len(batches)))
+        try:
+            tagged_batches = pool.map(_tag_batch, batches, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        tagged_batches = [_tag_batch(batch) for batch in batches]
+    tagged_sentences = []
+    tag_set = set()
+    symbols = set()
+    for tagged_batch in tagged_batches:
+        for sequence in tagged_batch:
+            for word, tag in sequence:
+                symbols.add(word)
+                tag_set.add(tag)
+            tagged_sentences.append(sequence)
+    logging.info('Tagged {0} sentences in {1} batches'.format(
+                 len(tagged_sentences), len(batches)))
+    return tagged_sentences, list(tag_set), list(symbols)
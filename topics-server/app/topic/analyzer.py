@@ -1,13 +1,104 @@
 #!/usr/bin/env python
 import json
+import math
 import logging
+import multiprocessing
 from gensim import models
 from gensim import corpora
 from collections import defaultdict
+from app.config import settings
+from app.topic.cache import get_model_cache
+from app.topic.cache import get_corpus_fingerprint
+from app.topic.stream import StreamedCorpus
+from app.topic.stream import StreamedBowCorpus
+from app.topic.encoding import get_columns
+from app.topic.selection import get_aggregate
+from app.topic.selection import iter_selected
+from app.topic.tfidf import SparseTfidfModel
+from app.topic.tfidf import get_columns as get_tfidf_columns
+from app.topic.tfidf import get_json as get_tfidf_json
+from app.topic.tokenizer import get_bow_from_matrix
+from app.topic.tokenizer import get_tokenizer
 
 logging.basicConfig(level=logging.INFO)
 
 
+def get_lda_workers(number_of_documents, workers=None, chunksize=None):
+    '''
+    This function works out how many processes an LDA model is worth being
+    trained with. Every worker is handed whole chunks, so there is no point
+    in more workers than chunks (or cores), and corpora smaller than
+    LDA_MULTICORE_MIN_DOCUMENTS are trained on a single core.
+
+    @param number_of_documents: The size of the training corpus
+    @type number_of_documents: int
+    @param workers: The requested number of workers; 0 for every core but
+    one, None for LDA_WORKERS
+    @type workers: int
+    @param chunksize: The number of documents per chunk, None for
+    LDA_CHUNK_SIZE
+    @type chunksize: int
+    @return: int
+    '''
+    workers = settings.LDA_WORKERS if workers is None else workers
+    chunksize = chunksize or settings.LDA_CHUNK_SIZE
+    if workers <= 0:
+        workers = max(multiprocessing.cpu_count() - 1, 1)
+    workers = min(workers, multiprocessing.cpu_count())
+    if number_of_documents < settings.LDA_MULTICORE_MIN_DOCUMENTS:
+        return 1
+    return max(min(workers, int(math.ceil(
+        float(number_of_documents) / chunksize))), 1)
+
+
+def train_lda_model(bow, dictionary, num_topics, number_of_documents,
+                    eval_every=5, workers=None, chunksize=None, passes=None):
+    '''
+    This function trains an LDA model, with gensim's LdaMulticore when more
+    than one worker is worth using (see get_lda_workers) and with the single
+    core LdaModel otherwise. LdaMulticore cannot learn an asymmetric alpha,
+    so its prior is symmetric whereas the single core model learns it from
+    the corpus ('auto').
+
+    @param bow: The bag-of-words corpus
+    @type bow: list or StreamedBowCorpus
+    @param dictionary: The dictionary of the corpus
+    @type dictionary: corpora.Dictionary
+    @param num_topics: The number of topics to extract from the corpus
+    @type num_topics: int
+    @param number_of_documents: The size of the corpus
+    @type number_of_documents: int
+    @param eval_every: The number of updates between perplexity estimates
+    @type eval_every: int
+    @param workers: The requested number of workers (see get_lda_workers)
+    @type workers: int
+    @param chunksize: The number of documents per chunk, None for
+    LDA_CHUNK_SIZE
+    @type chunksize: int
+    @param passes: The number of passes over the corpus, None for LDA_PASSES
+    @type passes: int
+    @return: models.LdaModel
+    '''
+    chunksize = chunksize or settings.LDA_CHUNK_SIZE
+    passes = passes or settings.LDA_PASSES
+    workers = get_lda_workers(number_of_documents, workers, chunksize)
+    if workers > 1:
+        return models.LdaMulticore(bow,
+                                   id2word=dictionary,
+                                   num_topics=num_topics,
+                                   workers=workers,
+                                   chunksize=chunksize,
+                                   passes=passes,
+                                   eval_every=eval_every)
+    return models.LdaModel(bow,
+                           id2word=dictionary,
+                           num_topics=num_topics,
+                           alpha='auto',
+                           chunksize=chunksize,
+                           passes=passes,
+                           eval_every=eval_every)
+
+
 class TopicAnalyzer(object):
     '''
     This class is the main topic extraction module of this project.
@@ -15,129 +106,250 @@ class TopicAnalyzer(object):
     1) TF-IDF, 2) Latent Semantic Indexing and; 3) Latent Dirichlet Allocation
     '''
 
-    def __init__(self, corpus_text):
+    def __init__(self, corpus_text, global_model=None, token_cache=None,
+                 tfidf_backend=None):
         '''
         Constructor
 
         Params:
         -------
-        - corpus_text (list): The search results from Elasticsearch
+        - corpus_text (list or StreamedCorpus): The search results from
+        Elasticsearch, either in memory or streamed from a scroll
+        - global_model (GlobalTopicModel): The models trained on the whole
+        index; when passed, LSI and LDA topics are inferred from them instead
+        of being fitted on the search results
+        - token_cache (dict): The token IDs of documents already tokenized,
+        keyed by document; shared between analyzers whose corpora overlap
+        - tfidf_backend (str): 'gensim' to weight the documents one by one
+        with gensim's TfidfModel, or 'sparse' to weight the document-term
+        matrix at once (see app.topic.tfidf); None for TFIDF_BACKEND. Both
+        produce the same output; streamed corpora always use 'gensim'
         '''
         self._corpus = corpus_text
-        self._stoplist = set('for a of the and to in'.split())
+        self._global_model = global_model
+        self._token_cache = token_cache
+        self._global_bow = None
+        self._tokenizer = get_tokenizer()
+        self._logger = logging.getLogger(__name__)
+        self._tfidf_backend = tfidf_backend or settings.TFIDF_BACKEND
+        self._encoded_corpus = None
+        self._matrices = {}
+        self._preprocessed = {}
+        self._tfidf_models = {}
+        self._model_cache = get_model_cache()
 
-    def __tokenize_words_in_corpus(self):
+    def __encode_document(self, document):
         '''
-        This method provides a not-NLTK-based tokenization mechanism and
-        also filters out stop-words contained
-        in the self._stoplist set above in the constructor.
+        This method tokenizes a single document of the corpus into the token
+        IDs of the shared vocabulary (see app.topic.tokenizer).
 
-        Returns: Two-dimensional list
+        Returns: numpy.ndarray
         '''
-        return [[word for word in document.lower() if word not in
-                self._stoplist] for document in self._corpus]
+        if self._token_cache is not None and document in self._token_cache:
+            return self._token_cache[document]
+        token_ids = self._tokenizer.encode(document)
+        if self._token_cache is not None:
+            self._token_cache[document] = token_ids
+        return token_ids
 
-    def __get_word_frequency_from_tokenized_corpus(self,
-                                                   tokenized_corpus=[[]]):
+    def __tokenize_document(self, document):
         '''
-        This method provides a non-NLTK-based mechanism to simply count the
-        frequency of words in a given corpus.
+        This method tokenizes a single document of the corpus into words.
 
-        Params:
-        ----------
-        - tokenized_corpus (2d list): This is a tokenized representation of the
-        corpus that is being processed/analyzed.
+        Returns: list
+        '''
+        return self._tokenizer.decode(self.__encode_document(document))
 
-        Returns: dict
+    def fill_token_cache(self):
+        '''
+        This method tokenizes every document of the corpus into the token
+        cache up front, so that the analyzers sharing the cache (including
+        those of processes forked afterwards) never tokenize them again.
         '''
-        freq = defaultdict(int)
-        for text in tokenized_corpus:
-            for token in text:
-                freq[token] += 1
-        return freq
+        for document in self._corpus:
+            self.__encode_document(document)
 
-    def __transform_corpus_by_word_freq(self, tokenized_corpus=[[]],
-                                        frequency_dict={},
-                                        word_frequency_floor=1):
+    def __get_tfidf_from_bow(self, bow_corpus=[]):
         '''
-        This method extracts the words from the tokenized corpus that have a
-        frequency greater than the specified floor value.
+        This method creates a gensim models.TfidfModel object from the
+        'bag-of-words' list created through methods above.
 
-        Params:
-        --------
-        - tokenized_corpus (2d list): The tokenized version of the 'cleansed'
-        corpus (stop-words have been filtered out)
-        - frequency_dict (dict): A dictionary that contains the frequency of
-        every word in the corpus (sans those in the stop-word list)
-        - word_frequency_floor (int): An indicator of the minimum number of
+        @param bow_corpus: The 'bag-of-words' list created above
+        @type bow_corpus: list
+        @return: gensim models.TfidfModel object
+        '''
+        tfidf = models.TfidfModel(bow_corpus)
+        return tfidf
+
+    def __preprocess(self, frequency_floor=1):
+        '''
+        This method runs the preprocessing pipeline (tokenize, frequency
+        count, floor filter, Dictionary, bag-of-words) once per frequency
+        floor and memoizes the result, so that the TF-IDF, LSI and LDA models
+        built from the same analyzer share a single pass over the corpus.
+        The documents themselves are only tokenized once, whatever the floor.
+
+        @param frequency_floor: An indicator of the minimum number of
         occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @return: tuple (bow list, corpora.Dictionary, bow list)
+        '''
+        if frequency_floor not in self._preprocessed and \
+           isinstance(self._corpus, StreamedCorpus):
+            self._preprocessed[frequency_floor] = self.__preprocess_stream(
+                                                    frequency_floor)
+        elif frequency_floor not in self._preprocessed:
+            (dictionary, matrix) = self.__get_matrix(frequency_floor)
+            bow = get_bow_from_matrix(matrix)
+            self._preprocessed[frequency_floor] = (bow, dictionary, bow)
+        return self._preprocessed[frequency_floor]
 
-        Returns: Two-dimensional list
+    def __get_matrix(self, frequency_floor=1):
         '''
-        text = [[token for token in text if frequency_dict[token] >
-                word_frequency_floor] for text in tokenized_corpus]
-        return text
+        This method builds the Dictionary and the document-term matrix of an
+        in-memory corpus once per frequency floor (see
+        app.topic.tokenizer.Tokenizer.get_matrix); the bag-of-words corpus
+        is derived from it.
 
-    def __get_corpora_dictionary_from_transformed_corpus(self, corpus=[[]]):
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @return: tuple (corpora.Dictionary, scipy.sparse.csr_matrix)
         '''
-        This method converts a two-dimensional list into the gensim-based
-        corpora. Dictionary object for processing
+        if isinstance(self._corpus, StreamedCorpus):
+            raise ValueError('A streamed corpus has no document-term matrix')
+        if frequency_floor not in self._matrices:
+            if self._encoded_corpus is None:
+                self._encoded_corpus = [self.__encode_document(document)
+                                        for document in self._corpus]
+            self._matrices[frequency_floor] = self._tokenizer.get_matrix(
+                self._encoded_corpus, frequency_floor)
+        return self._matrices[frequency_floor]
 
-        @param corpus: This is a two-dimensional list that has been filtered by
-        stop-words and word frequency floors.
-        @type corpus: two-dimensional list
-        @return: corpora.Dictionary
+    def __uses_tfidf_matrix(self):
         '''
-        return corpora.Dictionary(corpus)
+        This method tells whether TF-IDF is computed on the document-term
+        matrix (the 'sparse' backend, for in-memory corpora only).
 
-    def __get_bag_of_words_count_from_dictionary(self,
-                                                 dictionary={},
-                                                 corpus=[[]]):
+        @return: bool
         '''
-        This method converts the tokens in the 'cleansed' corpus into a
-        'bag-of-words' ('bow') distribution created through
-        gensim's corpora.Dictionary object.
+        return self._tfidf_backend == 'sparse' and \
+            not isinstance(self._corpus, StreamedCorpus)
 
-        @param dictionary: dict representation of the gensim corpora.
-        Dictionary object
-        @type dictionary: dict
-        @param corpus: The corpus that will be iterated over
-        @type corpus: two-dimensional list
-        @return: list
+    def __preprocess_stream(self, frequency_floor=1):
         '''
-        return [dictionary.doc2bow(text) for text in corpus]
+        This method is the streamed counterpart of the preprocessing pipeline.
+        A single pass over the corpus counts word frequencies and fills the
+        Dictionary; words at or below the floor are then dropped from the
+        Dictionary, and the bag-of-words corpus is produced lazily from the
+        stream, so the documents are never held in memory.
 
-    def __get_tfidf_from_bow(self, bow_corpus=[]):
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @return: tuple (bow corpus, corpora.Dictionary, bow corpus)
         '''
-        This method creates a gensim models.TfidfModel object from the
-        'bag-of-words' list created through methods above.
+        dictionary = corpora.Dictionary()
+        word_freq = defaultdict(int)
+        for document in self._corpus:
+            tokens = self.__tokenize_document(document)
+            for token in tokens:
+                word_freq[token] += 1
+            dictionary.doc2bow(tokens, allow_update=True)
+        dictionary.filter_tokens(bad_ids=[
+            dictionary.token2id[token] for token, freq in
+            word_freq.iteritems() if freq <= frequency_floor])
+        bow = StreamedBowCorpus(self._corpus, self.__tokenize_document,
+                                dictionary)
+        return bow, dictionary, bow
 
-        @param bow_corpus: The 'bag-of-words' list created above
-        @type bow_corpus: list
-        @return: gensim models.TfidfModel object
+    def __get_global_bow(self):
         '''
-        tfidf = models.TfidfModel(bow_corpus)
-        return tfidf
+        This method maps the corpus onto the dictionary of the global models,
+        dropping the words they were not trained on.
+
+        @return: list or StreamedBowCorpus
+        '''
+        if self._global_bow is None:
+            dictionary = self._global_model.dictionary
+            if isinstance(self._corpus, StreamedCorpus):
+                self._global_bow = StreamedBowCorpus(
+                    self._corpus, self.__tokenize_document, dictionary)
+            else:
+                self._global_bow = [
+                    dictionary.doc2bow(self.__tokenize_document(document))
+                    for document in self._corpus]
+        return self._global_bow
 
-    def __get_transformed_corpus(self, frequency_floor=1):
+    def get_dictionary(self, frequency_floor=1):
         '''
-        This is a utility method to retrieve a cleansed-version of the corpus
-        (i.e. to remove stop-words) and the word-frequency distribution
-        created above.
+        This method returns the gensim corpora.Dictionary built from the
+        corpus for the given frequency floor.
 
         @param frequency_floor: An indicator of the minimum number of
         occurrences that any word in the corpus can have.
         @type frequency_floor: int
-        @return: two-dimensional list
+        @return: corpora.Dictionary
         '''
-        tokenized_corpus = self.__tokenize_words_in_corpus()
-        word_freq = self.__get_word_frequency_from_tokenized_corpus(
-                        tokenized_corpus)
-        transformed_corpus = self.__transform_corpus_by_word_freq(
-                                tokenized_corpus, word_freq, frequency_floor)
-        return transformed_corpus
+        return self.__preprocess(frequency_floor)[1]
 
-    def __json_transform(self, model=None, bag_of_words=None):
+    def get_bow(self, frequency_floor=1):
+        '''
+        This method returns the bag-of-words corpus built from the corpus for
+        the given frequency floor, expressed in the ids of the dictionary
+        returned by get_dictionary.
+
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @return: list or StreamedBowCorpus
+        '''
+        return self.__preprocess(frequency_floor)[2]
+
+    def get_matrix(self, frequency_floor=1):
+        '''
+        This method returns the document-term matrix (of word counts) of an
+        in-memory corpus for the given frequency floor, whose columns are
+        the ids of the dictionary returned by get_dictionary.
+
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @return: scipy.sparse.csr_matrix
+        '''
+        return self.__get_matrix(frequency_floor)[1]
+
+    def __apply(self, model=None, bag_of_words=None, dictionary=None,
+                top_k=None, min_weight=None):
+        '''
+        This method applies the passed gensim model to the bag-of-words
+        distribution, keeping only the strongest entries of every document
+        when 'top_k' or 'min_weight' is set (see
+        app.topic.selection.select_top). The ids of the entries kept are
+        then resolved to their words when a dictionary is passed.
+
+        @param model: the gensim model that is to be applied
+        @type model: gensim model object
+        @param bag_of_words: The bag-of-words distribution used to index model
+        data
+        @type bag_of_words: object
+        @param dictionary: The dictionary of the word ids, for TF-IDF
+        @type dictionary: corpora.Dictionary
+        @param top_k: The maximum number of entries kept per document
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept
+        @type min_weight: float
+        @return: iterable
+        '''
+        if model is None or bag_of_words is None:
+            return []
+        records = model[bag_of_words]
+        if top_k is None and min_weight is None:
+            return records
+        return iter_selected(records, top_k, min_weight, dictionary)
+
+    def __json_transform(self, model=None, bag_of_words=None,
+                         dictionary=None, top_k=None, min_weight=None):
         '''
         This method converts any of the passed gensim model objects into JSON
 
@@ -146,17 +358,192 @@ class TopicAnalyzer(object):
         @param bag_of_words: The bag-of-words distribution used to index model
         data
         @type bag_of_words: object
+        @param dictionary: The dictionary of the word ids, for TF-IDF
+        @type dictionary: corpora.Dictionary
+        @param top_k: The maximum number of entries kept per document
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept
+        @type min_weight: float
         @return: str
         '''
+        return json.dumps(self.__transform_records(model, bag_of_words,
+                                                   dictionary, top_k,
+                                                   min_weight))
+
+    def __transform_records(self, model=None, bag_of_words=None,
+                            dictionary=None, top_k=None, min_weight=None):
+        '''
+        This method applies the passed gensim model to the bag-of-words
+        distribution and flattens the result into a list of dicts. The
+        entries of pruned TF-IDF output also hold their word.
+
+        @param model: the gensim model that is to be applied
+        @type model: gensim model object
+        @param bag_of_words: The bag-of-words distribution used to index model
+        data
+        @type bag_of_words: object
+        @param dictionary: The dictionary of the word ids, for TF-IDF
+        @type dictionary: corpora.Dictionary
+        @param top_k: The maximum number of entries kept per document
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept
+        @type min_weight: float
+        @return: list
+        '''
         _json_array = []
-        if model is not None and bag_of_words is not None:
-            for record in model[bag_of_words]:
-                for elem in record:
-                    json_elem = {}
-                    json_elem['id'] = elem[0]
-                    json_elem['value'] = elem[1]
-                    _json_array.append(json_elem)        
-        return json.dumps(_json_array)
+        for record in self.__apply(model, bag_of_words, dictionary, top_k,
+                                   min_weight):
+            for elem in record:
+                json_elem = {}
+                json_elem['id'] = elem[0]
+                json_elem['value'] = elem[1]
+                if len(elem) > 2:
+                    json_elem['word'] = elem[2]
+                _json_array.append(json_elem)
+        return _json_array
+
+    def __transform_columns(self, model=None, bag_of_words=None,
+                            dictionary=None, top_k=None, min_weight=None):
+        '''
+        This method applies the passed gensim model to the bag-of-words
+        distribution and lays the result out as columns.
+
+        @param model: the gensim model that is to be applied
+        @type model: gensim model object
+        @param bag_of_words: The bag-of-words distribution used to index model
+        data
+        @type bag_of_words: object
+        @param dictionary: The dictionary of the word ids, for TF-IDF
+        @type dictionary: corpora.Dictionary
+        @param top_k: The maximum number of entries kept per document
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept
+        @type min_weight: float
+        @return: dict
+        '''
+        if top_k is None and min_weight is None:
+            return get_columns(self.__apply(model, bag_of_words), dictionary)
+        return get_columns(self.__apply(model, bag_of_words, dictionary,
+                                        top_k, min_weight))
+
+    def __transform_lazily(self, model=None, bag_of_words=None,
+                           dictionary=None, top_k=None, min_weight=None):
+        '''
+        This method applies the passed gensim model to the bag-of-words
+        distribution lazily, document by document.
+
+        @param model: the gensim model that is to be applied
+        @type model: gensim model object
+        @param bag_of_words: The bag-of-words distribution used to index model
+        data
+        @type bag_of_words: object
+        @param dictionary: The dictionary of the word ids, for TF-IDF
+        @type dictionary: corpora.Dictionary
+        @param top_k: The maximum number of entries kept per document
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept
+        @type min_weight: float
+        @return: iterator
+        '''
+        return iter(self.__apply(model, bag_of_words, dictionary, top_k,
+                                 min_weight))
+
+    def __transform_aggregate(self, model=None, bag_of_words=None,
+                              dictionary=None, top_k=None, min_weight=None):
+        '''
+        This method ranks the words (for TF-IDF) or topics (for LSI and LDA)
+        of the whole corpus by their mean weight across its documents (see
+        app.topic.selection.get_aggregate). Every topic comes with its
+        'top_k' strongest words.
+
+        @param model: the gensim model that is to be applied
+        @type model: gensim model object
+        @param bag_of_words: The bag-of-words distribution used to index model
+        data
+        @type bag_of_words: object
+        @param dictionary: The dictionary of the word ids, for TF-IDF
+        @type dictionary: corpora.Dictionary
+        @param top_k: The number of words or topics returned
+        @type top_k: int
+        @param min_weight: The minimum mean weight of the words or topics
+        returned
+        @type min_weight: float
+        @return: dict
+        '''
+        top_k = top_k or settings.TOPICS_AGGREGATE_TOP_K
+        aggregate = {'documents': 0}
+        if model is None or bag_of_words is None:
+            return aggregate
+        if dictionary is not None:
+            (aggregate['documents'], top) = get_aggregate(
+                model[bag_of_words], len(dictionary), top_k, min_weight)
+            aggregate['terms'] = [
+                {'id': word_id, 'word': dictionary[word_id], 'value': value,
+                 'documents': documents}
+                for (word_id, value, documents) in top]
+            return aggregate
+        (aggregate['documents'], top) = get_aggregate(
+            model[bag_of_words], model.num_topics, top_k, min_weight)
+        aggregate['topics'] = [
+            {'id': topic_id, 'value': value, 'documents': documents,
+             'terms': [{'word': word, 'value': float(weight)} for
+                       (weight, word) in model.show_topic(topic_id, top_k)]}
+            for (topic_id, value, documents) in top]
+        return aggregate
+
+    def __get_cached_output(self, model_type, params, build, transform=None,
+                            json_transform=None, get_input=None):
+        '''
+        This method applies a model from the cross-request model cache (or
+        fitted through the passed callable on a miss) to the bag-of-words
+        distribution. The JSON output is cached along with the model; other
+        outputs are computed from the cached model.
+
+        @param model_type: One of 'tfidf', 'lsi' or 'lda'
+        @type model_type: str
+        @param params: The parameters the model is fitted with
+        @type params: dict
+        @param build: A callable returning the fitted model and its
+        bag-of-words distribution
+        @type build: function
+        @param transform: A callable of the model and the bag-of-words
+        distribution; None for the JSON output
+        @type transform: function
+        @param json_transform: A callable of the model and the bag-of-words
+        distribution returning the JSON output; None for __json_transform
+        @type json_transform: function
+        @param get_input: A callable returning what a cached model applies
+        to (what 'build' returns along with the model); None for the
+        bag-of-words distribution
+        @type get_input: function
+        @return: object
+        '''
+        key = None
+        entry = None
+        model = None
+        if self._model_cache is not None and \
+           not isinstance(self._corpus, StreamedCorpus):
+            key = get_corpus_fingerprint(self._corpus, model_type, params,
+                                         self._tfidf_backend)
+            entry = self._model_cache.get(key)
+            if entry is not None:
+                (model, json_data) = entry
+                if transform is None and json_data is not None:
+                    return json_data
+                bow = get_input() if get_input is not None else \
+                    self.get_bow(params['frequency_floor'])
+        if model is None:
+            (model, bow) = build()
+        if transform is not None:
+            output = transform(model, bow)
+            json_data = None
+        else:
+            output = json_data = (json_transform or self.__json_transform)(
+                model, bow)
+        if key is not None and model is not None and \
+           (entry is None or json_data is not None):
+            self._model_cache.put(key, model_type, model, json_data)
+        return output
 
     def get_tfidf(self, frequency_floor=1):
         '''
@@ -169,41 +556,125 @@ class TopicAnalyzer(object):
         @return: tuple
         '''
         tfidf = None
-        transformed_corpus = [[]]
+        bow = None
         try:
-            transformed_corpus = self.__get_transformed_corpus(frequency_floor)
-            dictionary = self.__get_corpora_dictionary_from_transformed_corpus(
-                            transformed_corpus)
-            bow = self.__get_bag_of_words_count_from_dictionary(
-                                                            dictionary,
-                                                            transformed_corpus)
-            tfidf = models.TfidfModel(bow, id2word=dictionary)
+            (_, dictionary, bow) = self.__preprocess(frequency_floor)
+            if self.__uses_tfidf_matrix():
+                (tfidf, _) = self.get_tfidf_matrix(frequency_floor)
+            else:
+                if frequency_floor not in self._tfidf_models:
+                    self._tfidf_models[frequency_floor] = models.TfidfModel(
+                        bow, id2word=dictionary)
+                tfidf = self._tfidf_models[frequency_floor]
         except Exception, error:
             self._logger.error(
                 "TopicAnalyzer.get_tfidf: Error occurred - {0}".format(
                                                                 str(error)))
         return tfidf, bow
 
-    def get_tfidf_as_json(self, frequency_floor=1):
+    def get_tfidf_matrix(self, frequency_floor=1):
+        '''
+        This method creates an app.topic.tfidf.SparseTfidfModel object from
+        the document-term matrix of an in-memory corpus, and retrieves that
+        matrix; unlike get_tfidf, it does not build the bag-of-words
+        distribution.
+
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @return: tuple
+        '''
+        tfidf = None
+        matrix = None
+        try:
+            (dictionary, matrix) = self.__get_matrix(frequency_floor)
+            tfidf = self._tfidf_models.get(frequency_floor)
+            if not isinstance(tfidf, SparseTfidfModel):
+                tfidf = SparseTfidfModel(matrix, id2word=dictionary)
+                if self.__uses_tfidf_matrix():
+                    self._tfidf_models[frequency_floor] = tfidf
+        except Exception, error:
+            self._logger.error(
+                "TopicAnalyzer.get_tfidf_matrix: Error occurred - {0}".format(
+                                                                str(error)))
+        return tfidf, matrix
+
+    def __get_tfidf_weights(self, model=None, matrix=None):
+        '''
+        This method weights the document-term matrix with the passed TF-IDF
+        model. A gensim models.TfidfModel (e.g. cached by an analyzer of the
+        'gensim' backend) is swapped for a SparseTfidfModel fitted to the
+        same matrix, whose weights are the same.
+
+        @param model: The TF-IDF model
+        @type model: SparseTfidfModel or models.TfidfModel
+        @param matrix: The document-term matrix
+        @type matrix: scipy.sparse.csr_matrix
+        @return: scipy.sparse.csr_matrix
+        '''
+        if not isinstance(model, SparseTfidfModel):
+            model = SparseTfidfModel(matrix)
+        return model.transform(matrix)
+
+    def __get_tfidf_from_matrix(self, frequency_floor=1, transform=None):
+        '''
+        This method serializes the TF-IDF weights of the document-term matrix
+        straight from its arrays, as JSON or, through the passed callable, as
+        another output; the JSON output is cached like that of the 'gensim'
+        backend, under the same key.
+
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @param transform: A callable of the weights; None for the JSON output
+        @type transform: function
+        @return: object
+        '''
+        def transform_weights(model, matrix):
+            return transform(self.__get_tfidf_weights(model, matrix))
+
+        def json_transform(model, matrix):
+            return get_tfidf_json(self.__get_tfidf_weights(model, matrix))
+
+        return self.__get_cached_output(
+            'tfidf', {'frequency_floor': frequency_floor},
+            lambda: self.get_tfidf_matrix(frequency_floor),
+            transform_weights if transform is not None else None,
+            json_transform, lambda: self.get_matrix(frequency_floor))
+
+    def get_tfidf_as_json(self, frequency_floor=1, top_k=None,
+                          min_weight=None):
         '''
         This is a utility method that retrieves the model.TfidfModel object
         and the bag-of-words distribution and transforms these values
-        into JSON.
+        into JSON. When the output is pruned ('top_k' or 'min_weight'), the
+        entries kept also hold their word.
 
         @param frequency_floor: An indicator of the minimum number of
         occurrences that any word in the corpus can have.
         @type frequency_floor: int
+        @param top_k: The maximum number of entries kept per document; None
+        for all
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept; None
+        for no minimum
+        @type min_weight: float
         @return: str
         '''
-        json_data = {}
-        (tfidf, bow) = self.get_tfidf(frequency_floor)
-        json_data = self.__json_transform(model=tfidf, bag_of_words=bow)
-        return json_data
+        if top_k is not None or min_weight is not None:
+            return self.__get_transformed('tfidf', self.__json_transform,
+                                          frequency_floor, top_k=top_k,
+                                          min_weight=min_weight)
+        if self.__uses_tfidf_matrix():
+            return self.__get_tfidf_from_matrix(frequency_floor)
+        return self.__get_cached_output(
+            'tfidf', {'frequency_floor': frequency_floor},
+            lambda: self.get_tfidf(frequency_floor))
 
-    def get_lsi(self, frequency_floor=1, number_of_topics=5):
+    def get_lsi_model(self, frequency_floor=1, number_of_topics=5):
         '''
-        This method retrieves the Latent Semantic Indexing distribution of
-        topics in the corpus.
+        This method creates a gensim models.LsiModel object on top of the
+        TF-IDF weighted bag-of-words distribution.
 
         @param frequency_floor: An indicator of the minimum number of
         occurrences that any word in the corpus can have.
@@ -211,16 +682,14 @@ class TopicAnalyzer(object):
         @param number_of_topics: the number of topics that the gensim model.
         LsiModel object will retrieve from the corpus
         @type number_of_topics: int
-        @return: str
+        @return: tuple
         '''
         lsi = None
+        bow = None
         try:
             (corpus_tfidf, bow) = self.get_tfidf(frequency_floor)
             if corpus_tfidf is not None:
-                transormed_corpus = self.__get_transformed_corpus(
-                                        frequency_floor)
-                dictionary = self.__get_corpora_dictionary_from_transformed_corpus(
-                                    transormed_corpus)
+                (_, dictionary, _) = self.__preprocess(frequency_floor)
                 lsi = models.LsiModel(corpus_tfidf[bow],
                                       id2word=dictionary,
                                       num_topics=number_of_topics)
@@ -230,13 +699,49 @@ class TopicAnalyzer(object):
             self._logger.error(
                 "TopicAnalyzer.get_lsi: Error occurred - {0}".format(
                                                                 str(error)))
-        return self.__json_transform(lsi, bow)
+        return lsi, bow
 
-    def get_lda(self, frequency_floor=1, num_topics=5, sample_ratio=5):
+    def get_lsi(self, frequency_floor=1, number_of_topics=5, top_k=None,
+                min_weight=None):
         '''
-        This method extracts topics using gensim's implementation of Latent
-        Dirichlet Allocation (similar to probabilistic Latent Semantic
-        Indexing except that it uses Dirichlet priors).
+        This method retrieves the Latent Semantic Indexing distribution of
+        topics in the corpus. With global models, the TF-IDF weighted corpus
+        is folded into the trained LSI model (whose number of topics then
+        applies) instead.
+
+        @param frequency_floor: An indicator of the minimum number of
+        occurrences that any word in the corpus can have.
+        @type frequency_floor: int
+        @param number_of_topics: the number of topics that the gensim model.
+        LsiModel object will retrieve from the corpus
+        @type number_of_topics: int
+        @param top_k: The maximum number of entries kept per document; None
+        for all
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept; None
+        for no minimum
+        @type min_weight: float
+        @return: str
+        '''
+        if top_k is not None or min_weight is not None:
+            return self.__get_transformed('lsi', self.__json_transform,
+                                          frequency_floor, number_of_topics,
+                                          top_k=top_k, min_weight=min_weight)
+        if self._global_model is not None:
+            return self.__json_transform(
+                self._global_model.lsi,
+                self._global_model.tfidf[self.__get_global_bow()])
+        return self.__get_cached_output(
+            'lsi', {'frequency_floor': frequency_floor,
+                    'num_topics': number_of_topics},
+            lambda: self.get_lsi_model(frequency_floor, number_of_topics))
+
+    def get_lda_model(self, frequency_floor=1, num_topics=5, sample_ratio=5,
+                      workers=None, chunksize=None, passes=None):
+        '''
+        This method creates a gensim models.LdaModel object from the
+        bag-of-words distribution, on several cores when the corpus is large
+        enough (see train_lda_model).
 
         @param frequency_floor: An indicator of the minimum number of
         occurrences that any word in the corpus can have.
@@ -246,23 +751,225 @@ class TopicAnalyzer(object):
         @param sample_ratio: The sampling ratio to use during the topic
         extraction process.
         @type sample_ratio: int
-        @return: str
+        @param workers: The number of training processes, None for
+        LDA_WORKERS
+        @type workers: int
+        @param chunksize: The number of documents per training chunk, None
+        for LDA_CHUNK_SIZE
+        @type chunksize: int
+        @param passes: The number of passes over the corpus, None for
+        LDA_PASSES
+        @type passes: int
+        @return: tuple
         '''
         ldaModel = None
-        corpus = [[]]
+        bow = None
         try:
-            corpus = self.__get_transformed_corpus(frequency_floor)
+            (corpus, corpus_dictionary, bow) = self.__preprocess(
+                                                    frequency_floor)
             if corpus is not None and len(corpus) > 0:
-                corpus_dictionary = self.__get_corpora_dictionary_from_transformed_corpus(
-                                        corpus)
-                bow = self.__get_bag_of_words_count_from_dictionary(
-                                corpus_dictionary, corpus)
-                ldaModel = models.LdaModel(bow,
-                                           id2word=corpus_dictionary,
-                                           num_topics=num_topics,
-                                           alpha='auto',
-                                           eval_every=sample_ratio)
+                ldaModel = train_lda_model(bow, corpus_dictionary, num_topics,
+                                           len(corpus),
+                                           eval_every=sample_ratio,
+                                           workers=workers,
+                                           chunksize=chunksize,
+                                           passes=passes)
         except Exception, error:
             self._logger.error("TopicAnalyzer.get_lda: Error occurred - {0}".format(
                                 str(error)))
-        return self.__json_transform(ldaModel, bow)
+        return ldaModel, bow
+
+    def get_lda(self, frequency_floor=1, num_topics=5, sample_ratio=5,
+                workers=None, chunksize=None, passes=None, top_k=None,
+                min_weight=None):
+        '''
+        This method extracts topics using gensim's implementation of Latent
+        Dirichlet Allocation (similar to probabilistic Latent Semantic
+        Indexing except that it uses Dirichlet priors). With global models,
+        the topic distributions of the documents are inferred from the
+        trained LDA model instead.
+
+        The parameters are those of get_lda_model; 'top_k' and
+        'min_weight' prune the output as in __get_transformed.
+
+        @return: str
+        '''
+        if top_k is not None or min_weight is not None:
+            return self.__get_transformed('lda', self.__json_transform,
+                                          frequency_floor, num_topics,
+                                          sample_ratio, workers, chunksize,
+                                          passes, top_k, min_weight)
+        if self._global_model is not None:
+            return self.__json_transform(self._global_model.lda,
+                                         self.__get_global_bow())
+        return self.__get_cached_output(
+            'lda', {'frequency_floor': frequency_floor,
+                    'num_topics': num_topics,
+                    'sample_ratio': sample_ratio,
+                    'workers': workers,
+                    'chunksize': chunksize,
+                    'passes': passes},
+            lambda: self.get_lda_model(frequency_floor, num_topics,
+                                       sample_ratio, workers, chunksize,
+                                       passes))
+
+    def get_all_as_json(self, frequency_floor=1, num_topics=5,
+                        sample_ratio=5, workers=None, chunksize=None,
+                        passes=None, top_k=None, min_weight=None):
+        '''
+        This method builds the TF-IDF, LSI and LDA models from a single
+        preprocessing pass over the corpus and returns all three as one JSON
+        object keyed by model name.
+
+        The parameters are those of get_lda_model, 'num_topics' also
+        applying to LSI; 'top_k' and 'min_weight' prune the output as in
+        __get_transformed.
+
+        @return: str
+        '''
+        return '{{"tfidf": {0}, "lsi": {1}, "lda": {2}}}'.format(
+            self.get_tfidf_as_json(frequency_floor, top_k, min_weight),
+            self.get_lsi(frequency_floor, num_topics, top_k, min_weight),
+            self.get_lda(frequency_floor, num_topics, sample_ratio, workers,
+                         chunksize, passes, top_k, min_weight))
+
+    def __get_transformed(self, model_type, transform, frequency_floor=1,
+                          num_topics=5, sample_ratio=5, workers=None,
+                          chunksize=None, passes=None, top_k=None,
+                          min_weight=None):
+        '''
+        This method applies the passed transform to the model of the given
+        type (the global model when there is one, for LSI and LDA, and the
+        cached or newly fitted model otherwise) and to the bag-of-words
+        distribution it applies to.
+
+        @param model_type: One of 'tfidf', 'lsi' or 'lda'
+        @type model_type: str
+        @param transform: A callable of the model, the bag-of-words
+        distribution, the dictionary of the word ids (for TF-IDF, None
+        otherwise), 'top_k' and 'min_weight'
+        @type transform: function
+        @param top_k: The maximum number of entries kept per document; None
+        for all
+        @type top_k: int
+        @param min_weight: The minimum magnitude of the weights kept; None
+        for no minimum
+        @type min_weight: float
+
+        The other parameters are those of get_lda_model, 'num_topics'
+        also applying to LSI.
+
+        @return: object
+        '''
+        def bound_transform(model, bow, dictionary=None):
+            return transform(model, bow, dictionary, top_k, min_weight)
+
+        if model_type == 'tfidf':
+            dictionary = self.get_dictionary(frequency_floor)
+            return self.__get_cached_output(
+                'tfidf', {'frequency_floor': frequency_floor},
+                lambda: self.get_tfidf(frequency_floor),
+                lambda model, bow: bound_transform(model, bow, dictionary))
+        if model_type == 'lsi' and self._global_model is not None:
+            return bound_transform(
+                self._global_model.lsi,
+                self._global_model.tfidf[self.__get_global_bow()])
+        if model_type == 'lsi':
+            return self.__get_cached_output(
+                'lsi', {'frequency_floor': frequency_floor,
+                        'num_topics': num_topics},
+                lambda: self.get_lsi_model(frequency_floor, num_topics),
+                bound_transform)
+        if model_type == 'lda' and self._global_model is not None:
+            return bound_transform(self._global_model.lda,
+                                   self.__get_global_bow())
+        if model_type == 'lda':
+            return self.__get_cached_output(
+                'lda', {'frequency_floor': frequency_floor,
+                        'num_topics': num_topics,
+                        'sample_ratio': sample_ratio,
+                        'workers': workers,
+                        'chunksize': chunksize,
+                        'passes': passes},
+                lambda: self.get_lda_model(frequency_floor, num_topics,
+                                           sample_ratio, workers, chunksize,
+                                           passes),
+                bound_transform)
+        raise ValueError('Unknown model type {0}'.format(model_type))
+
+    def get_columns(self, model_type, frequency_floor=1, num_topics=5,
+                    sample_ratio=5, workers=None, chunksize=None,
+                    passes=None, top_k=None, min_weight=None):
+        '''
+        This method returns the output of a model as columns (parallel
+        arrays of document offsets, ids and values; see
+        app.topic.encoding.get_columns) rather than JSON, for the other
+        response formats. The TF-IDF columns also hold the words of the ids.
+
+        @param model_type: One of 'tfidf', 'lsi' or 'lda'
+        @type model_type: str
+
+        The other parameters are those of __get_transformed.
+
+        @return: dict
+        '''
+        if model_type == 'tfidf' and top_k is None and min_weight is None \
+           and self.__uses_tfidf_matrix():
+            dictionary = self.get_dictionary(frequency_floor)
+            return self.__get_tfidf_from_matrix(
+                frequency_floor,
+                lambda weights: get_tfidf_columns(weights, dictionary))
+        return self.__get_transformed(model_type, self.__transform_columns,
+                                      frequency_floor, num_topics,
+                                      sample_ratio, workers, chunksize,
+                                      passes, top_k, min_weight)
+
+    def iter_records(self, model_type, frequency_floor=1, num_topics=5,
+                     sample_ratio=5, workers=None, chunksize=None,
+                     passes=None, top_k=None, min_weight=None):
+        '''
+        This method fits (or retrieves) the model of the given type and
+        returns its output as an iterator over the (id, value) lists of the
+        documents, which are only transformed as the iterator is consumed;
+        a response can then be streamed document by document.
+
+        @param model_type: One of 'tfidf', 'lsi' or 'lda'
+        @type model_type: str
+
+        The other parameters are those of __get_transformed.
+
+        @return: iterator
+        '''
+        return self.__get_transformed(model_type, self.__transform_lazily,
+                                      frequency_floor, num_topics,
+                                      sample_ratio, workers, chunksize,
+                                      passes, top_k, min_weight)
+
+    def get_aggregate(self, model_type, frequency_floor=1, num_topics=5,
+                      sample_ratio=5, workers=None, chunksize=None,
+                      passes=None, top_k=None, min_weight=None):
+        '''
+        This method returns the 'top_k' words (for TF-IDF) or topics (for
+        LSI and LDA, with their strongest words) of the corpus as a whole,
+        ranked by their mean weight across the documents.
+
+        @param model_type: One of 'tfidf', 'lsi' or 'lda'
+        @type model_type: str
+        @param top_k: The number of words or topics returned; None for
+        TOPICS_AGGREGATE_TOP_K
+        @type top_k: int
+        @param min_weight: The minimum mean weight of the words or topics
+        returned; None for no minimum
+        @type min_weight: float
+
+        The other parameters are those of __get_transformed.
+
+        @return: dict
+        '''
+        aggregate = self.__get_transformed(model_type,
+                                           self.__transform_aggregate,
+                                           frequency_floor, num_topics,
+                                           sample_ratio, workers, chunksize,
+                                           passes, top_k, min_weight)
+        aggregate['model'] = model_type
+        return aggregate
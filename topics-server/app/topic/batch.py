@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import json
+import time
+import logging
+import multiprocessing
+from app.config import settings
+from app.utils.es import Search
+from app.topic.analyzer import TopicAnalyzer
+from app.topic.model import get_global_model
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+logging.basicConfig(level=logging.INFO)
+
+MODEL_TYPES = ('tfidf', 'lsi', 'lda')
+
+
+def _analyze_term(term, model_types, params, state):
+    '''
+    This function computes the topics of one term of the batch. LDA models
+    are trained on a single core: the terms are analyzed in parallel
+    already, and LdaMulticore would fork the request's process.
+
+    Returns: dict (model type -> JSON)
+    '''
+    documents, token_cache, global_model = state
+    documents = documents.get(term) or []
+    if not documents:
+        return dict((model_type, '[]') for model_type in model_types)
+    topics = TopicAnalyzer(documents, global_model, token_cache)
+    frequency_floor = params.get('frequency_floor', 1)
+    results = {}
+    for model_type in model_types:
+        if model_type == 'tfidf':
+            results[model_type] = topics.get_tfidf_as_json(frequency_floor)
+        elif model_type == 'lsi':
+            results[model_type] = topics.get_lsi(frequency_floor,
+                                                 params.get('num_topics', 5))
+        else:
+            results[model_type] = topics.get_lda(**dict(params, workers=1))
+    return results
+
+
+def run_batch(terms, model_types, params):
+    '''
+    This function computes the topics of several terms at once. The result
+    sets are fetched in one multi-search round trip, every distinct document
+    is tokenized once for the whole batch, and the terms are then analyzed
+    in parallel by BATCH_WORKERS threads sharing the token cache (threads
+    rather than processes, as forking a threaded uwsgi worker copies the
+    locks and connections of its other threads). Terms that are not
+    analyzed within BATCH_TIMEOUT seconds are reported as timed out, along
+    with the results of the others.
+
+    Params:
+    -------
+    - terms (list): The search terms
+    - model_types (list): Some of MODEL_TYPES
+    - params (dict): The model parameters, shared by every term
+
+    Returns: dict
+    '''
+    start = time.time()
+    deadline = start + settings.BATCH_TIMEOUT
+    terms = list(OrderedDict.fromkeys(terms))
+    documents, search_timed_out = Search().get_many(
+        terms, settings.BATCH_SEARCH_TIMEOUT)
+    token_cache = {}
+    TopicAnalyzer(list(set(document for term_documents in documents.values()
+                           for document in term_documents)),
+                  token_cache=token_cache).fill_token_cache()
+    state = (documents, token_cache, get_global_model())
+    results = {}
+    pool = None
+    try:
+        number_of_workers = min(settings.BATCH_WORKERS, len(terms))
+        if number_of_workers > 1:
+            pool = ThreadPool(number_of_workers)
+            pending = [(term, pool.apply_async(_analyze_term,
+                                               (term, model_types, params,
+                                                state)))
+                       for term in terms]
+        else:
+            pending = [(term, None) for term in terms]
+        for term, async_result in pending:
+            result = {
+                'status': 'ok',
+                'documents': len(documents.get(term) or []),
+                'partial': term in search_timed_out
+            }
+            try:
+                if term not in documents:
+                    raise ValueError('The search failed')
+                if async_result is not None:
+                    # Past the deadline, only the terms already analyzed
+                    # are collected
+                    topics = async_result.get(
+                        max(deadline - time.time(), 0))
+                elif time.time() < deadline:
+                    topics = _analyze_term(term, model_types, params,
+                                           state)
+                else:
+                    raise multiprocessing.TimeoutError()
+                for model_type, json_data in topics.iteritems():
+                    result[model_type] = json.loads(json_data)
+            except multiprocessing.TimeoutError:
+                result['status'] = 'timeout'
+            except Exception, error:
+                logging.error('run_batch: Error occurred for {0} - {1}'.format(
+                              term, str(error)))
+                result['status'] = 'error'
+                result['error'] = str(error)
+            results[term] = result
+    finally:
+        if pool is not None:
+            # Terms still being analyzed past the deadline are abandoned;
+            # their threads cannot be stopped, so they are not waited for
+            pool.terminate()
+    timed_out = sorted(term for term, result in results.iteritems()
+                       if result['status'] == 'timeout')
+    logging.info('Analyzed a batch of {0} terms in {1:.2f}s ({2} timed '
+                 'out)'.format(len(terms), time.time() - start,
+                               len(timed_out)))
+    return {
+        'results': results,
+        'timed_out': timed_out,
+        'elapsed': time.time() - start
+    }
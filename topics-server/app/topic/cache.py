@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import glob
+import json
+import time
+import hashlib
+import logging
+import threading
+import numpy
+from gensim import models
+from app.config import settings
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+
+# Bumped whenever the persisted models or their JSON output change, so that
+# stale entries are never served by a newer analyzer.
+CACHE_FORMAT_VERSION = 1
+
+_MODEL_CLASSES = {
+    'tfidf': models.TfidfModel,
+    'lsi': models.LsiModel,
+    'lda': models.LdaModel
+}
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_corpus_fingerprint(documents, model_type, params,
+                           tfidf_backend=None):
+    '''
+    This function hashes the retrieved documents together with the model
+    type, its parameters and the settings the documents are tokenized and
+    weighted with, so that the same result set analyzed the same way always
+    maps onto the same cache entry.
+
+    Params:
+    -------
+    - documents (list): The search results being analyzed
+    - model_type (str): One of 'tfidf', 'lsi' or 'lda'
+    - params (dict): The model parameters (e.g. frequency_floor, num_topics)
+    - tfidf_backend (str): The TF-IDF backend of the analyzer; None for
+    TFIDF_BACKEND
+
+    Returns: str
+    '''
+    digest = hashlib.sha1()
+    digest.update(json.dumps([CACHE_FORMAT_VERSION,
+                              settings.TOKENIZER_STOPWORDS,
+                              settings.TOKENIZER_STEMMER,
+                              tfidf_backend or settings.TFIDF_BACKEND,
+                              model_type, sorted(params.items())]))
+    for document in documents:
+        if isinstance(document, unicode):
+            document = document.encode('utf-8')
+        digest.update(str(len(document)))
+        digest.update(':')
+        digest.update(document)
+    return digest.hexdigest()
+
+
+def _estimate_size(obj, depth=0):
+    '''
+    This is a utility function that roughly estimates the memory held by a
+    fitted gensim model by summing the numpy arrays and containers reachable
+    from its attributes.
+
+    Returns: int
+    '''
+    if isinstance(obj, numpy.ndarray):
+        return obj.nbytes
+    if isinstance(obj, basestring):
+        return len(obj)
+    if depth > 3:
+        return 64
+    if isinstance(obj, dict):
+        return sum(64 + _estimate_size(value, depth + 1)
+                   for value in obj.itervalues())
+    if isinstance(obj, (list, tuple)):
+        return sum(_estimate_size(value, depth + 1) for value in obj)
+    if hasattr(obj, '__dict__'):
+        return sum(_estimate_size(value, depth + 1)
+                   for value in vars(obj).itervalues())
+    return 64
+
+
+class TopicModelCache(object):
+    '''
+    This class caches fitted gensim models and their JSON output across
+    requests. Entries are evicted in least-recently-used order once their
+    estimated size exceeds the memory budget, and may optionally be saved
+    to disk (through gensim's 'save') so that a restarted worker starts
+    warm. Saved models are pruned by age and count, as with EngineCache.
+    '''
+
+    def __init__(self, memory_budget, directory=None, max_age_days=None,
+                 keep=None):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - memory_budget (int): The memory budget of the cache, in bytes
+        - directory (str): The directory models are persisted to; None
+        disables persistence
+        - max_age_days (float): The maximum age of the saved models; None
+        for no maximum
+        - keep (int): The maximum number of saved models; None for no
+        maximum
+        '''
+        self._memory_budget = memory_budget
+        self._directory = directory
+        self._max_age_days = max_age_days
+        self._keep = keep
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if self._directory is not None and \
+           not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+    def __get_path(self, key):
+        return os.path.join(self._directory, key)
+
+    def __store(self, key, entry):
+        '''
+        This method adds an entry to the in-memory LRU and evicts the least
+        recently used entries until the budget is respected again.
+        '''
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[3]
+            self._entries[key] = entry
+            self._size += entry[3]
+            while self._size > self._memory_budget and \
+                    len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[3]
+
+    def __load(self, key):
+        '''
+        This method loads a persisted model and its JSON output from disk.
+
+        Returns: tuple or None
+        '''
+        path = self.__get_path(key)
+        if not os.path.isfile(path + '.json'):
+            return None
+        try:
+            with open(path + '.json') as manifest_file:
+                manifest = json.load(manifest_file)
+            model_class = _MODEL_CLASSES[manifest['model_type']]
+            model = model_class.load(path + '.model')
+            json_data = manifest['json_data']
+            if json_data is not None:
+                json_data = json_data.encode('utf-8')
+            return (manifest['model_type'], model, json_data,
+                    _estimate_size(model) + len(json_data or ''))
+        except Exception, error:
+            logging.error('TopicModelCache.__load: Error occurred - '
+                          '{0}'.format(str(error)))
+        return None
+
+    def __save(self, key, model_type, model, json_data):
+        path = self.__get_path(key)
+        try:
+            model.save(path + '.model')
+            with open(path + '.json', 'w') as manifest_file:
+                json.dump({'model_type': model_type,
+                           'json_data': json_data}, manifest_file)
+        except Exception, error:
+            logging.error('TopicModelCache.__save: Error occurred - '
+                          '{0}'.format(str(error)))
+        if self._max_age_days is not None or self._keep is not None:
+            self.prune(self._max_age_days, self._keep)
+
+    def get(self, key):
+        '''
+        This method retrieves a cached model, looking on disk when the entry
+        is not held in memory.
+
+        Params:
+        -------
+        - key (str): The corpus fingerprint
+
+        Returns: tuple (model, json_data) or None
+        '''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                self._hits += 1
+                return entry[1], entry[2]
+        if self._directory is not None:
+            entry = self.__load(key)
+            if entry is not None:
+                self.__store(key, entry)
+                self._disk_hits += 1
+                return entry[1], entry[2]
+        self._misses += 1
+        return None
+
+    def put(self, key, model_type, model, json_data):
+        '''
+        This method caches a fitted model and its JSON output.
+
+        Params:
+        -------
+        - key (str): The corpus fingerprint
+        - model_type (str): One of 'tfidf', 'lsi' or 'lda'
+        - model (object): The fitted gensim model
+        - json_data (str): The JSON output of the model; None when it has
+        not been computed
+        '''
+        self.__store(key, (model_type, model, json_data,
+                           _estimate_size(model) + len(json_data or '')))
+        if self._directory is not None:
+            self.__save(key, model_type, model, json_data)
+
+    def list(self):
+        '''
+        This method lists the models saved to disk, most recently saved
+        first. The manifests hold the JSON output of the models, so the
+        entries are described from the files rather than read.
+
+        Returns: list of dict
+        '''
+        entries = []
+        if self._directory is None:
+            return entries
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith('.json'):
+                continue
+            path = self.__get_path(file_name[:-len('.json')])
+            try:
+                entries.append({
+                    'key': file_name[:-len('.json')],
+                    'created': os.path.getmtime(path + '.json'),
+                    'size': sum(os.path.getsize(model_path) for model_path
+                                in glob.glob(path + '.model*') +
+                                [path + '.json'])
+                })
+            except Exception, error:
+                logging.error('TopicModelCache.list: Error occurred - '
+                              '{0}'.format(str(error)))
+        return sorted(entries, key=lambda entry: entry['created'],
+                      reverse=True)
+
+    def remove(self, key):
+        # The manifest goes first, so that the entry is no longer loaded
+        path = self.__get_path(key)
+        for entry_path in [path + '.json'] + glob.glob(path + '.model*'):
+            if os.path.isfile(entry_path):
+                os.remove(entry_path)
+
+    def prune(self, max_age_days=None, keep=None):
+        '''
+        This method removes saved models older than max_age_days and/or
+        beyond the 'keep' most recent ones.
+
+        Params:
+        -------
+        - max_age_days (float): The maximum age of the entries kept
+        - keep (int): The maximum number of entries kept
+
+        Returns: list of the removed entries
+        '''
+        removed = []
+        now = time.time()
+        for position, entry in enumerate(self.list()):
+            too_old = max_age_days is not None and \
+                now - entry['created'] > max_age_days * 86400
+            too_many = keep is not None and position >= keep
+            if too_old or too_many:
+                try:
+                    self.remove(entry['key'])
+                    removed.append(entry)
+                except Exception, error:
+                    logging.error('TopicModelCache.prune: Error occurred - '
+                                  '{0}'.format(str(error)))
+        return removed
+
+    def stats(self):
+        '''
+        This method reports the hit/miss counts and memory use of the cache.
+
+        Returns: dict
+        '''
+        return {
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'memory_budget': self._memory_budget,
+            'hits': self._hits,
+            'disk_hits': self._disk_hits,
+            'misses': self._misses
+        }
+
+
+def get_model_cache():
+    '''
+    This function returns the topic model cache of the current process as
+    configured in settings, or None when caching is disabled.
+
+    Returns: TopicModelCache or None
+    '''
+    global _cache, _cache_pid
+    if not settings.TOPIC_MODEL_CACHE_ENABLED:
+        return None
+    pid = os.getpid()
+    with _cache_lock:
+        if _cache is None or _cache_pid != pid:
+            directory = None
+            if settings.TOPIC_MODEL_CACHE_PERSIST:
+                directory = os.path.abspath(
+                    settings.TOPIC_MODEL_CACHE_DIRECTORY)
+            _cache = TopicModelCache(
+                settings.TOPIC_MODEL_CACHE_MEMORY_MB * 1024 * 1024, directory,
+                settings.TOPIC_MODEL_CACHE_MAX_AGE_DAYS or None,
+                settings.TOPIC_MODEL_CACHE_KEEP or None)
+            _cache_pid = pid
+        return _cache
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import json
+import zlib
+import struct
+import logging
+import numpy
+from cStringIO import StringIO
+from gzip import GzipFile
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logging.basicConfig(level=logging.INFO)
+
+# The response formats of the topic end-points, by name, with their media
+# type. 'json' is the original list of {"id", "value"} objects; 'ndjson' is
+# streamed, one line per document.
+FORMATS = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.topics.columnar+json',
+    'msgpack': 'application/x-msgpack',
+    'binary': 'application/vnd.topics.float32',
+    'ndjson': 'application/x-ndjson'
+}
+
+COMPRESSIONS = ('gzip', 'deflate')
+
+# Magic number and version of the 'binary' format; version 1 had a 16-byte
+# header, without the kind of strings
+BINARY_MAGIC = 'TPC2'
+_BINARY_HEADER = struct.Struct('<4sIIII')
+
+# What the strings of the 'binary' format are: the word of every id, or the
+# word of every entry
+_BINARY_TOKENS = 0
+_BINARY_WORDS = 1
+
+
+def get_available_formats():
+    '''
+    This function returns the formats that can be produced, 'msgpack' being
+    only available when the msgpack package is installed.
+
+    Returns: list of str
+    '''
+    return sorted(name for name in FORMATS
+                  if name != 'msgpack' or msgpack is not None)
+
+
+def get_columns(records, id2word=None):
+    '''
+    This function lays the transformed documents of a model (e.g.
+    'model[bow]') out as parallel arrays rather than one object per pair:
+    the entries of document i are ids[offsets[i]:offsets[i + 1]] and
+    values[offsets[i]:offsets[i + 1]]. Entries that already hold their
+    word (see app.topic.selection.iter_selected) yield a parallel array of
+    'words' as well.
+
+    Params:
+    -------
+    - records (iterable): The (id, value) lists of the documents
+    - id2word (corpora.Dictionary): The dictionary the ids refer to, for
+    the words to be included as 'tokens' (tokens[id] being the word of id);
+    None when the ids are not word ids (e.g. topics)
+
+    Returns: dict
+    '''
+    offsets = [0]
+    ids = []
+    values = []
+    words = []
+    for record in records:
+        if record:
+            entries = zip(*record)
+            ids.extend(entries[0])
+            values.extend(entries[1])
+            if len(entries) > 2:
+                words.extend(entries[2])
+        offsets.append(len(ids))
+    columns = {
+        'offsets': numpy.array(offsets, dtype=numpy.int64),
+        'ids': numpy.array(ids, dtype=numpy.int64),
+        'values': numpy.array(values, dtype=numpy.float64)
+    }
+    if words:
+        columns['words'] = words
+    elif id2word is not None:
+        columns['tokens'] = [id2word[word_id] for word_id in
+                             xrange(len(id2word))]
+    return columns
+
+
+def get_records(columns):
+    '''
+    This function converts columns back into the original list of
+    {"id", "value"} objects.
+
+    Returns: list of dict
+    '''
+    return [{'id': word_id, 'value': value} for word_id, value in
+            zip(columns['ids'].tolist(), columns['values'].tolist())]
+
+
+def _get_document(columns):
+    document = {
+        'offsets': columns['offsets'].tolist(),
+        'ids': columns['ids'].tolist(),
+        'values': columns['values'].tolist()
+    }
+    for name in ('tokens', 'words'):
+        if name in columns:
+            document[name] = columns[name]
+    return document
+
+
+def encode_json(columns):
+    '''
+    This function serializes columns as the original JSON list.
+
+    Returns: str
+    '''
+    return json.dumps(get_records(columns))
+
+
+def encode_columnar(columns):
+    '''
+    This function serializes columns as a JSON object of parallel arrays.
+
+    Returns: str
+    '''
+    return json.dumps(_get_document(columns))
+
+
+def encode_msgpack(columns):
+    '''
+    This function serializes columns as a msgpack map of parallel arrays,
+    the values being single precision floats.
+
+    Returns: str
+    '''
+    if msgpack is None:
+        raise ValueError('The msgpack format requires the msgpack package')
+    return msgpack.packb(_get_document(columns), use_single_float=True)
+
+
+def encode_binary(columns):
+    '''
+    This function packs columns into little-endian arrays behind a 20-byte
+    header (magic number, number of documents, number of entries, byte
+    length of the strings and what they are): uint32 offsets (one more than
+    there are documents), int32 ids and float32 values, followed by the
+    tokens or words, if any, as newline-separated UTF-8.
+
+    Returns: str
+    '''
+    if 'words' in columns:
+        strings, kind = columns['words'], _BINARY_WORDS
+    else:
+        strings, kind = columns.get('tokens') or [], _BINARY_TOKENS
+    strings = u'\n'.join(strings).encode('utf-8')
+    number_of_entries = len(columns['ids'])
+    return ''.join([
+        _BINARY_HEADER.pack(BINARY_MAGIC, len(columns['offsets']) - 1,
+                            number_of_entries, len(strings), kind),
+        columns['offsets'].astype('<u4').tostring(),
+        columns['ids'].astype('<i4').tostring(),
+        columns['values'].astype('<f4').tostring(),
+        strings
+    ])
+
+
+def decode_binary(data):
+    '''
+    This function unpacks the 'binary' format (see encode_binary).
+
+    Returns: dict
+    '''
+    magic, number_of_documents, number_of_entries, strings_length, kind = \
+        _BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC:
+        if magic[:3] == BINARY_MAGIC[:3]:
+            raise ValueError('Unsupported topics binary version {0}'.format(
+                             magic[3:]))
+        raise ValueError('Not a topics binary payload')
+    position = _BINARY_HEADER.size
+    columns = {}
+    for name, dtype, length in (('offsets', '<u4', number_of_documents + 1),
+                                ('ids', '<i4', number_of_entries),
+                                ('values', '<f4', number_of_entries)):
+        columns[name] = numpy.frombuffer(data, dtype=dtype, count=length,
+                                         offset=position)
+        position += columns[name].nbytes
+    if strings_length:
+        name = 'words' if kind == _BINARY_WORDS else 'tokens'
+        columns[name] = data[position:position + strings_length].decode(
+            'utf-8').split(u'\n')
+    return columns
+
+
+ENCODERS = {
+    'json': encode_json,
+    'columnar': encode_columnar,
+    'msgpack': encode_msgpack,
+    'binary': encode_binary
+}
+
+
+def encode(columns, response_format):
+    '''
+    This function serializes columns in one of the FORMATS.
+
+    Params:
+    -------
+    - columns (dict): The columns, as returned by get_columns
+    - response_format (str): The name of the format
+
+    Returns: str
+    '''
+    return ENCODERS[response_format](columns)
+
+
+def encode_many(columns_by_name, response_format):
+    '''
+    This function serializes several named columns (e.g. the models of
+    /topics/all) as one object, in the 'columnar' or 'msgpack' format; the
+    'binary' format has a single set of columns per payload.
+
+    Params:
+    -------
+    - columns_by_name (dict): The columns, by name
+    - response_format (str): The name of the format
+
+    Returns: str
+    '''
+    document = dict((name, _get_document(columns)) for name, columns in
+                    columns_by_name.iteritems())
+    if response_format == 'columnar':
+        return json.dumps(document)
+    if response_format == 'msgpack' and msgpack is not None:
+        return msgpack.packb(document, use_single_float=True)
+    raise ValueError('The {0} format cannot hold several models'.format(
+                     response_format))
+
+
+def iter_ndjson(records, model_type):
+    '''
+    This function serializes the transformed documents of a model as
+    newline-delimited JSON, one line per document, as they are produced:
+    {"model": ..., "document": ..., "values": [{"id", "value"}, ...]}. The
+    entries that hold their word (see app.topic.selection.iter_selected)
+    carry it as "word".
+
+    Params:
+    -------
+    - records (iterable): The (id, value) lists of the documents
+    - model_type (str): The name of the model, repeated on every line
+
+    Returns: generator of str
+    '''
+    for document, record in enumerate(records):
+        values = []
+        for elem in record:
+            value = {'id': elem[0], 'value': elem[1]}
+            if len(elem) > 2:
+                value['word'] = elem[2]
+            values.append(value)
+        yield json.dumps({
+            'model': model_type,
+            'document': document,
+            'values': values
+        }) + '\n'
+
+
+def compress(data, compression, level=6):
+    '''
+    This function compresses a response body.
+
+    Params:
+    -------
+    - data (str): The body
+    - compression (str): One of COMPRESSIONS
+    - level (int): The compression level, from 1 (fastest) to 9 (smallest)
+
+    Returns: str
+    '''
+    if compression == 'gzip':
+        body = StringIO()
+        with GzipFile(fileobj=body, mode='wb',
+                      compresslevel=level) as gzip_file:
+            gzip_file.write(data)
+        return body.getvalue()
+    if compression == 'deflate':
+        return zlib.compress(data, level)
+    raise ValueError('Unknown compression {0}'.format(compression))
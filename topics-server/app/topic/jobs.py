@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from app.config import settings
+from app.utils.es import Search
+from app.utils.es import get_documents
+from app.topic.analyzer import TopicAnalyzer
+from app.topic.model import get_global_model
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# The parameters every model type accepts, all of them integers
+MODEL_PARAMETERS = {
+    'tfidf': ('frequency_floor',),
+    'lsi': ('frequency_floor', 'num_topics'),
+    'lda': ('frequency_floor', 'num_topics', 'sample_ratio', 'workers',
+            'chunksize', 'passes'),
+    'all': ('frequency_floor', 'num_topics', 'sample_ratio', 'workers',
+            'chunksize', 'passes')
+}
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+class QueueFullError(Exception):
+    '''
+    This exception is raised when a job is submitted while JOBS_QUEUE_SIZE
+    jobs are already waiting.
+    '''
+    pass
+
+
+class JobStore(object):
+    '''
+    This class keeps the state of the topic jobs in a local sqlite file, so
+    that any uwsgi worker of the host can submit a job or report on it, and
+    the job workers can claim them. The queued rows are the job queue: they
+    are claimed highest priority first, then oldest first. A connection is
+    opened per operation so that the store is safe across threads and forks.
+    '''
+
+    def __init__(self, file_path):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - file_path (str): The path of the sqlite file
+        '''
+        self._file_path = file_path
+        with self.__transaction() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                               'id TEXT PRIMARY KEY, '
+                               'term TEXT, '
+                               'model_type TEXT, '
+                               'params TEXT, '
+                               'priority INTEGER, '
+                               'status TEXT, '
+                               'cancel_requested INTEGER DEFAULT 0, '
+                               'result TEXT, '
+                               'error TEXT, '
+                               'created_at REAL, '
+                               'started_at REAL, '
+                               'finished_at REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON '
+                               'jobs (status, priority, created_at)')
+
+    @contextmanager
+    def __transaction(self):
+        '''
+        This method yields a connection inside a transaction that holds the
+        write lock from the start, so that a read followed by a write (e.g.
+        claiming the next queued job) is atomic across processes.
+        '''
+        connection = sqlite3.connect(self._file_path, timeout=10,
+                                     isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        finally:
+            connection.close()
+
+    def __to_dict(self, row):
+        if row is None:
+            return None
+        job = dict(zip(('id', 'term', 'model_type', 'params', 'priority',
+                        'status', 'cancel_requested', 'result', 'error',
+                        'created_at', 'started_at', 'finished_at'), row))
+        job['params'] = json.loads(job['params'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def __get(self, connection, job_id):
+        return self.__to_dict(connection.execute(
+            'SELECT id, term, model_type, params, priority, status, '
+            'cancel_requested, result, error, created_at, started_at, '
+            'finished_at FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def submit(self, term, model_type, params, priority=0, max_queued=None):
+        '''
+        This method queues a new job.
+
+        Params:
+        -------
+        - term (str): The search term
+        - model_type (str): One of the keys of MODEL_PARAMETERS
+        - params (dict): The model parameters
+        - priority (int): Jobs of higher priority are run first
+        - max_queued (int): The maximum number of queued jobs; None for no
+        limit
+
+        Returns: str (the job ID)
+        '''
+        job_id = uuid.uuid4().hex
+        with self.__transaction() as connection:
+            if max_queued is not None:
+                queued = connection.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE status = ?',
+                    (QUEUED,)).fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFullError('{0} jobs are already queued'.format(
+                                         queued))
+            connection.execute('INSERT INTO jobs (id, term, model_type, '
+                               'params, priority, status, created_at) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (job_id, term, model_type, json.dumps(params),
+                                priority, QUEUED, time.time()))
+        return job_id
+
+    def get(self, job_id):
+        '''
+        This method retrieves a job.
+
+        Returns: dict or None
+        '''
+        with self.__transaction() as connection:
+            return self.__get(connection, job_id)
+
+    def claim(self):
+        '''
+        This method marks the next queued job as running and returns it.
+
+        Returns: dict or None
+        '''
+        with self.__transaction() as connection:
+            row = connection.execute(
+                'SELECT id FROM jobs WHERE status = ? '
+                'ORDER BY priority DESC, created_at, rowid LIMIT 1',
+                (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE jobs SET status = ?, started_at = ? '
+                               'WHERE id = ?', (RUNNING, time.time(), row[0]))
+            return self.__get(connection, row[0])
+
+    def finish(self, job_id, result=None, error=None, status=None):
+        '''
+        This method records the outcome of a running job; a job cancelled in
+        the meantime stays cancelled, and a job whose cancellation was
+        requested while it ran is recorded as cancelled.
+
+        Params:
+        -------
+        - job_id (str): The job ID
+        - result (str): The JSON output of the job
+        - error (str): The reason the job failed
+        - status (str): The final status; defaults to 'failed' when an error
+        is passed and to 'done' otherwise
+        '''
+        status = status or (FAILED if error else DONE)
+        with self.__transaction() as connection:
+            connection.execute('UPDATE jobs SET status = CASE WHEN '
+                               'cancel_requested = 1 THEN ? ELSE ? END, '
+                               'result = ?, error = ?, finished_at = ? '
+                               'WHERE id = ? AND status = ?',
+                               (CANCELLED, status, result, error, time.time(),
+                                job_id, RUNNING))
+
+    def cancel(self, job_id):
+        '''
+        This method cancels a job. A queued job is cancelled right away; a
+        running one is flagged, and its worker is stopped by the pool.
+
+        Returns: dict or None (the job after the request)
+        '''
+        with self.__transaction() as connection:
+            connection.execute('UPDATE jobs SET status = ?, finished_at = ? '
+                               'WHERE id = ? AND status = ?',
+                               (CANCELLED, time.time(), job_id, QUEUED))
+            connection.execute('UPDATE jobs SET cancel_requested = 1 '
+                               'WHERE id = ? AND status = ?',
+                               (job_id, RUNNING))
+            return self.__get(connection, job_id)
+
+    def get_cancel_requests(self):
+        '''
+        This method lists the running jobs whose cancellation was requested.
+
+        Returns: list of str
+        '''
+        with self.__transaction() as connection:
+            return [row[0] for row in connection.execute(
+                    'SELECT id FROM jobs WHERE status = ? AND '
+                    'cancel_requested = 1', (RUNNING,))]
+
+    def requeue_running(self):
+        '''
+        This method puts the jobs left running by a worker pool that died back
+        in the queue (or cancels them, when that was requested).
+
+        Returns: int (the number of jobs requeued)
+        '''
+        with self.__transaction() as connection:
+            connection.execute('UPDATE jobs SET status = ?, finished_at = ? '
+                               'WHERE status = ? AND cancel_requested = 1',
+                               (CANCELLED, time.time(), RUNNING))
+            return connection.execute('UPDATE jobs SET status = ?, '
+                                      'started_at = NULL WHERE status = ?',
+                                      (QUEUED, RUNNING)).rowcount
+
+    def prune(self, max_age):
+        '''
+        This method deletes the jobs finished more than 'max_age' seconds ago.
+
+        Returns: int (the number of jobs deleted)
+        '''
+        with self.__transaction() as connection:
+            return connection.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?, ?) AND '
+                'finished_at < ?',
+                FINISHED_STATUSES + (time.time() - max_age,)).rowcount
+
+    def stats(self):
+        '''
+        This method counts the jobs by status.
+
+        Returns: dict
+        '''
+        with self.__transaction() as connection:
+            return dict(connection.execute(
+                'SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+
+
+def get_job_store():
+    '''
+    This function returns the job store of the current process, opening the
+    sqlite file configured in settings upon first use.
+
+    Returns: JobStore
+    '''
+    global _store, _store_pid
+    pid = os.getpid()
+    with _store_lock:
+        if _store is None or _store_pid != pid:
+            file_path = os.path.abspath(settings.JOBS_DATABASE_PATH)
+            directory = os.path.dirname(file_path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            _store = JobStore(file_path)
+            _store_pid = pid
+        return _store
+
+
+def get_job_parameters(model_type, params):
+    '''
+    This function keeps the parameters the model type accepts, as integers.
+
+    Params:
+    -------
+    - model_type (str): One of the keys of MODEL_PARAMETERS
+    - params (dict): The parameters of the request
+
+    Returns: dict
+    '''
+    if model_type not in MODEL_PARAMETERS:
+        raise ValueError('Unknown model type {0}; expected one of {1}'.format(
+                         model_type, ', '.join(sorted(MODEL_PARAMETERS))))
+    return dict((name, int(params[name]))
+                for name in MODEL_PARAMETERS[model_type]
+                if params.get(name) is not None)
+
+
+def run_job(term, model_type, params):
+    '''
+    This function computes the topics of a job, exactly as the synchronous
+    end-point of the model type would.
+
+    Params:
+    -------
+    - term (str): The search term
+    - model_type (str): One of the keys of MODEL_PARAMETERS
+    - params (dict): The model parameters
+
+    Returns: str (JSON)
+    '''
+    data = get_documents(Search(), term)
+    if not data:
+        return '[]'
+    if model_type == 'tfidf':
+        return TopicAnalyzer(data).get_tfidf_as_json(
+            params.get('frequency_floor', 1))
+    topics = TopicAnalyzer(data, get_global_model())
+    if model_type == 'lsi':
+        return topics.get_lsi(params.get('frequency_floor', 1),
+                              params.get('num_topics', 5))
+    if model_type == 'lda':
+        return topics.get_lda(**params)
+    return topics.get_all_as_json(**params)
+
+
+def _execute(job):
+    '''
+    This is the entry point of the process running one job; it records the
+    result (or the error) in the job store.
+    '''
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # The job leads a process group of its own, so that terminating it also
+    # terminates the LdaMulticore processes it may have started
+    os.setpgrp()
+    try:
+        result = run_job(job['term'], job['model_type'], job['params'])
+        get_job_store().finish(job['id'], result=result)
+    except Exception, error:
+        logging.error('_execute: Error occurred - {0}'.format(str(error)))
+        get_job_store().finish(job['id'], error=str(error))
+
+
+def _terminate(process):
+    '''
+    This is a utility function that terminates a job process along with its
+    process group (see _execute), and reaps it.
+    '''
+    if process.pid:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            # The group is gone, or not yet created by the job
+            pass
+    process.terminate()
+    process.join()
+
+
+def check_running_jobs(store, running):
+    '''
+    This function goes over the jobs run by the worker pool: the processes
+    that have exited are reaped (a non-zero exit code failing their job),
+    and those that have run for longer than JOBS_TIMEOUT, or whose
+    cancellation was requested, are terminated.
+
+    Params:
+    -------
+    - store (JobStore): The job store
+    - running (dict): The (process, start time) of the running jobs, by job
+    ID; the jobs that are no longer running are removed from it
+    '''
+    for job_id, (process, started) in running.items():
+        if not process.is_alive():
+            process.join()
+            if process.exitcode != 0:
+                store.finish(job_id, error='The worker exited with code '
+                             '{0}'.format(process.exitcode))
+            del running[job_id]
+        elif settings.JOBS_TIMEOUT and \
+                time.time() - started > settings.JOBS_TIMEOUT:
+            _terminate(process)
+            store.finish(job_id, error='Timed out after {0}s'.format(
+                         settings.JOBS_TIMEOUT))
+            del running[job_id]
+    for job_id in store.get_cancel_requests():
+        if job_id in running:
+            _terminate(running[job_id][0])
+            del running[job_id]
+        store.finish(job_id, status=CANCELLED)
+        logging.info('Cancelled topic job {0}'.format(job_id))
+
+
+def start_queued_jobs(store, running, number_of_workers,
+                      process_class=multiprocessing.Process):
+    '''
+    This function claims queued jobs, highest priority first, until
+    'number_of_workers' jobs are running, and starts a process for each.
+
+    Params:
+    -------
+    - store (JobStore): The job store
+    - running (dict): The (process, start time) of the running jobs, by job
+    ID; the jobs started are added to it
+    - number_of_workers (int): The number of jobs run at the same time
+    - process_class (class): The class of the processes started
+
+    Returns: int (the number of jobs started)
+    '''
+    started = 0
+    while len(running) < number_of_workers:
+        job = store.claim()
+        if job is None:
+            break
+        logging.info('Running topic job {0} ({1} on "{2}")'.format(
+                     job['id'], job['model_type'], job['term']))
+        # Not daemonic: an LDA job may train with LdaMulticore, which starts
+        # processes of its own. The jobs are reaped by check_running_jobs.
+        process = process_class(target=_execute, args=(job,))
+        process.start()
+        running[job['id']] = (process, time.time())
+        started += 1
+    return started
+
+
+def run_workers(number_of_workers=None):
+    '''
+    This function runs the topic job worker pool until it is interrupted.
+    Every claimed job runs in a process of its own, forked from this one
+    (so they share the global models it has loaded), which is what allows a
+    running job to be cancelled or timed out by terminating it. At most
+    'number_of_workers' jobs run at the same time.
+
+    Params:
+    -------
+    - number_of_workers (int): The number of jobs run at the same time;
+    defaults to JOBS_WORKERS
+    '''
+    number_of_workers = max(number_of_workers or settings.JOBS_WORKERS, 1)
+    store = get_job_store()
+    requeued = store.requeue_running()
+    if requeued:
+        logging.info('Requeued {0} interrupted topic jobs'.format(requeued))
+    logging.info('Running topic jobs with {0} workers'.format(
+                 number_of_workers))
+    running = {}
+    last_prune = 0
+    # Stopping the pool (e.g. 'docker stop') stops its jobs too; they are
+    # requeued when it starts again.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            check_running_jobs(store, running)
+            if len(running) < number_of_workers:
+                # Loaded before forking, so that the jobs inherit the models
+                get_global_model()
+            start_queued_jobs(store, running, number_of_workers)
+            if time.time() - last_prune > 60:
+                store.prune(settings.JOBS_RESULT_TTL)
+                last_prune = time.time()
+            time.sleep(settings.JOBS_POLL_INTERVAL)
+    finally:
+        for process, _ in running.itervalues():
+            _terminate(process)
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+import itertools
+import numpy
+from gensim import corpora
+from gensim import models
+from app.config import settings
+from app.utils.es import Search
+from app.utils.es import get_index_version
+from app.utils.es import get_parent_version
+from app.topic.analyzer import TopicAnalyzer
+
+logging.basicConfig(level=logging.INFO)
+
+_CURRENT_FILE_NAME = 'current'
+_MANIFEST_FILE_NAME = 'manifest.json'
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+def _get_version_directory(directory, version):
+    return os.path.join(directory, re.sub(r'[^\w.-]', '_', version))
+
+
+class GlobalTopicModel(object):
+    '''
+    This class holds the dictionary, TF-IDF, LSI and LDA models trained on
+    the whole index. Query-time requests only fold the retrieved documents
+    into these models, so topic ids mean the same thing across queries.
+    '''
+
+    def __init__(self, directory):
+        '''
+        Constructor; loads the models saved in the directory of one version.
+
+        Params:
+        -------
+        - directory (str): The directory of the model version
+        '''
+        with open(os.path.join(directory, _MANIFEST_FILE_NAME)) as \
+                manifest_file:
+            self.manifest = json.load(manifest_file)
+        self.version = self.manifest['version']
+        self.dictionary = corpora.Dictionary.load(
+            os.path.join(directory, 'dictionary'))
+        self.tfidf = models.TfidfModel.load(os.path.join(directory, 'tfidf'))
+        self.lsi = models.LsiModel.load(os.path.join(directory, 'lsi'))
+        self.lda = models.LdaModel.load(os.path.join(directory, 'lda'))
+
+    def stats(self):
+        return self.manifest
+
+
+def train_global_models():
+    '''
+    This function fits the TF-IDF, LSI and LDA models on every document of
+    the index, streamed through a scroll, and saves them under the version of
+    the index they were trained on. The 'current' marker is only moved once
+    the models are completely written, so the API keeps serving the previous
+    version until then.
+
+    Returns: str (the version) or None
+    '''
+    try:
+        start = time.time()
+        version = get_index_version()
+        logging.info('Training global topic models for index version '
+                     '{0}'.format(version))
+        frequency_floor = settings.GLOBAL_TOPIC_MODELS_FREQUENCY_FLOOR
+        num_topics = settings.GLOBAL_TOPIC_MODELS_NUM_TOPICS
+        corpus = Search().stream(None)
+        analyzer = TopicAnalyzer(corpus)
+        tfidf, _ = analyzer.get_tfidf(frequency_floor)
+        lsi, _ = analyzer.get_lsi_model(frequency_floor, num_topics)
+        lda, _ = analyzer.get_lda_model(frequency_floor, num_topics)
+        if tfidf is None or lsi is None or lda is None:
+            logging.error('train_global_models: The index could not be '
+                          'modelled; version {0} was not saved'.format(
+                            version))
+            return None
+        _publish(version, analyzer.get_dictionary(frequency_floor), tfidf,
+                 lsi, lda, {'index_version': version,
+                            'lineage': [version],
+                            'updates': 0,
+                            'trained': time.time(),
+                            'documents': corpus.num_docs,
+                            'num_topics': num_topics,
+                            'frequency_floor': frequency_floor})
+        logging.info('Trained global topic models for {0} documents in '
+                     '{1:.1f}s'.format(corpus.num_docs, time.time() - start))
+        return version
+    except Exception, error:
+        logging.error('train_global_models: Error occurred - {0}'.format(
+                      str(error)))
+    return None
+
+
+def update_global_models(since):
+    '''
+    This function folds the documents indexed at or after 'since' into the
+    current global models instead of retraining them: the dictionary is
+    extended with the new words, the LDA model is updated online and the
+    new documents are added to the LSI decomposition. The updated models are
+    published as a new version, which API workers pick up on their next
+    request. The models are retrained from scratch when there is nothing to
+    update yet, when the index has been rebuilt from scratch since they were
+    trained (its previous documents are gone) or after
+    GLOBAL_TOPIC_MODELS_MAX_UPDATES updates. An index rebuilt upon the one
+    the models were trained on (see SearchEngineIndexer.bulk_load) still
+    holds its documents, so the models are updated and the manifest records
+    the lineage of index versions they were trained on.
+
+    Params:
+    -------
+    - since (datetime): The time the indexing run started
+
+    Returns: str (the version) or None
+    '''
+    try:
+        start = time.time()
+        model = _load_current_model()
+        index_version = get_index_version()
+        if not settings.GLOBAL_TOPIC_MODELS_INCREMENTAL or model is None or \
+           model.manifest.get('index_version') not in (
+               index_version, get_parent_version()) or \
+           0 < settings.GLOBAL_TOPIC_MODELS_MAX_UPDATES <= \
+           model.manifest.get('updates', 0):
+            return train_global_models()
+        lineage = model.manifest.get('lineage',
+                                     [model.manifest['index_version']])
+        if lineage[-1] != index_version:
+            lineage = lineage + [index_version]
+        frequency_floor = model.manifest['frequency_floor']
+        analyzer = TopicAnalyzer(Search().stream(None, since=since))
+        # The new documents are first mapped onto a dictionary of their own,
+        # which is then merged into the global one.
+        new_dictionary = analyzer.get_dictionary(0)
+        if not new_dictionary.num_docs:
+            logging.info('No new documents to update the global topic '
+                         'models with')
+            return model.version
+        old_num_terms = len(model.dictionary)
+        old_topics = _get_topics(model.lda)
+        bow = _merge_dictionary(model.dictionary, new_dictionary,
+                                frequency_floor)[analyzer.get_bow(0)]
+        _grow_models(model.lsi, model.lda, model.dictionary)
+        tfidf = models.TfidfModel(dictionary=model.dictionary)
+        sample = list(itertools.islice(
+            bow, settings.GLOBAL_TOPIC_MODELS_EVALUATION_DOCUMENTS))
+        perplexity_before = _get_perplexity(model.lda, sample)
+        model.lda.update(bow)
+        model.lsi.add_documents(tfidf[bow])
+        perplexity_after = _get_perplexity(model.lda, sample)
+        drift, max_drift = _get_drift(old_topics, _get_topics(model.lda))
+        updates = model.manifest.get('updates', 0) + 1
+        version = '{0}+u{1}'.format(index_version, updates)
+        manifest = dict(model.manifest)
+        manifest.update({
+            'index_version': index_version,
+            'lineage': lineage,
+            'updates': updates,
+            'updated': time.time(),
+            'documents': manifest['documents'] + new_dictionary.num_docs,
+            'update': {
+                'documents': new_dictionary.num_docs,
+                'new_words': len(model.dictionary) - old_num_terms,
+                'drift': drift,
+                'max_drift': max_drift,
+                'perplexity_before': perplexity_before,
+                'perplexity_after': perplexity_after
+            }
+        })
+        _publish(version, model.dictionary, tfidf, model.lsi, model.lda,
+                 manifest)
+        logging.info('Updated global topic models with {0} documents '
+                     '({1} new words) in {2:.1f}s; topic drift {3:.4f} '
+                     '(max {4:.4f})'.format(
+                        new_dictionary.num_docs,
+                        len(model.dictionary) - old_num_terms,
+                        time.time() - start, drift, max_drift))
+        if perplexity_before is not None:
+            logging.info('LDA perplexity on {0} of the new documents: '
+                         '{1:.1f} before the update, {2:.1f} after'.format(
+                            len(sample), perplexity_before,
+                            perplexity_after))
+        return version
+    except Exception, error:
+        logging.error('update_global_models: Error occurred - {0}'.format(
+                      str(error)))
+    return None
+
+
+def _publish(version, dictionary, tfidf, lsi, lda, manifest):
+    '''
+    This function saves the models of a version into a temporary directory,
+    renames it into place and only then moves the 'current' marker onto it,
+    so that readers never see a partially written version.
+    '''
+    directory = os.path.abspath(settings.GLOBAL_TOPIC_MODELS_DIRECTORY)
+    version_directory = _get_version_directory(directory, version)
+    temporary_directory = '{0}.{1}.tmp'.format(version_directory, os.getpid())
+    if not os.path.isdir(temporary_directory):
+        os.makedirs(temporary_directory)
+    dictionary.save(os.path.join(temporary_directory, 'dictionary'))
+    tfidf.save(os.path.join(temporary_directory, 'tfidf'))
+    lsi.save(os.path.join(temporary_directory, 'lsi'))
+    lda.save(os.path.join(temporary_directory, 'lda'))
+    manifest = dict(manifest, version=version)
+    with open(os.path.join(temporary_directory, _MANIFEST_FILE_NAME),
+              'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    if os.path.isdir(version_directory):
+        shutil.rmtree(version_directory)
+    os.rename(temporary_directory, version_directory)
+    current_path = os.path.join(directory, _CURRENT_FILE_NAME)
+    with open(current_path + '.tmp', 'w') as current_file:
+        current_file.write(os.path.basename(version_directory))
+    os.rename(current_path + '.tmp', current_path)
+    _collect_garbage(directory, os.path.basename(version_directory))
+
+
+def _load_current_model():
+    '''
+    This function loads a private copy of the current version, which can be
+    modified without affecting the models served by get_global_model.
+
+    Returns: GlobalTopicModel or None
+    '''
+    directory = os.path.abspath(settings.GLOBAL_TOPIC_MODELS_DIRECTORY)
+    current_path = os.path.join(directory, _CURRENT_FILE_NAME)
+    if not os.path.isfile(current_path):
+        return None
+    with open(current_path) as current_file:
+        name = current_file.read().strip()
+    return GlobalTopicModel(os.path.join(directory, name))
+
+
+def _merge_dictionary(dictionary, new_dictionary, frequency_floor):
+    '''
+    This function adds the document frequencies of the new documents to the
+    global dictionary. Words the global dictionary does not know yet are
+    added when they occur in more than 'frequency_floor' of the new
+    documents and dropped otherwise.
+
+    Returns: gensim.models.VocabTransform (new ids -> global ids)
+    '''
+    old2new = {}
+    for new_id, token in new_dictionary.iteritems():
+        frequency = new_dictionary.dfs.get(new_id, 0)
+        if token not in dictionary.token2id:
+            if frequency <= frequency_floor:
+                continue
+            dictionary.token2id[token] = len(dictionary.token2id)
+        old2new[new_id] = dictionary.token2id[token]
+        dictionary.dfs[old2new[new_id]] = \
+            dictionary.dfs.get(old2new[new_id], 0) + frequency
+    dictionary.num_docs += new_dictionary.num_docs
+    dictionary.num_pos += new_dictionary.num_pos
+    dictionary.num_nnz += new_dictionary.num_nnz
+    return models.VocabTransform(old2new)
+
+
+def _grow_models(lsi, lda, dictionary):
+    '''
+    This function extends the LSI projection and the LDA topic-word
+    statistics with zeroed entries for the words added to the dictionary,
+    so that the online updates can assign them weight.
+    '''
+    added = len(dictionary) - lda.num_terms
+    if added <= 0:
+        return
+    if numpy.ndim(lda.eta) > 0:
+        raise ValueError('An asymmetric eta cannot be extended to new words')
+    lda.state.sstats = numpy.hstack([
+        lda.state.sstats, numpy.zeros((lda.num_topics, added))])
+    lda.num_terms = len(dictionary)
+    lda.id2word = dictionary
+    lda.sync_state()
+    lsi.projection.u = numpy.vstack([
+        lsi.projection.u,
+        numpy.zeros((added, lsi.projection.u.shape[1]),
+                    dtype=lsi.projection.u.dtype)])
+    lsi.projection.m = lsi.num_terms = len(dictionary)
+    lsi.id2word = dictionary
+
+
+def _get_topics(lda):
+    '''
+    This function returns the topic-word distributions of an LDA model.
+
+    Returns: numpy.ndarray (one row per topic)
+    '''
+    topics = lda.state.get_lambda()
+    return topics / topics.sum(axis=1)[:, numpy.newaxis]
+
+
+def _get_drift(old_topics, new_topics):
+    '''
+    This function measures how far every topic moved during an update, as
+    the Hellinger distance between its distribution before and after; words
+    added by the update had no weight before.
+
+    Returns: tuple (mean distance, largest distance)
+    '''
+    old_topics = numpy.hstack([old_topics, numpy.zeros(
+        (old_topics.shape[0], new_topics.shape[1] - old_topics.shape[1]))])
+    distances = numpy.sqrt(0.5 * ((numpy.sqrt(old_topics) -
+                                   numpy.sqrt(new_topics)) ** 2).sum(axis=1))
+    return float(distances.mean()), float(distances.max())
+
+
+def _get_perplexity(lda, sample):
+    '''
+    This function estimates the perplexity of the LDA model on a sample of
+    documents from its per-word likelihood bound.
+
+    Returns: float or None
+    '''
+    if not any(sample):
+        return None
+    return float(numpy.exp2(-lda.log_perplexity(sample)))
+
+
+def _collect_garbage(directory, current):
+    '''
+    This function removes the oldest model versions, keeping
+    GLOBAL_TOPIC_MODELS_RETAINED_VERSIONS of them (the current one included).
+    '''
+    versions = [name for name in os.listdir(directory)
+                if os.path.isfile(os.path.join(directory, name,
+                                               _MANIFEST_FILE_NAME))]
+    versions.sort(key=lambda name: os.path.getmtime(
+                  os.path.join(directory, name, _MANIFEST_FILE_NAME)),
+                  reverse=True)
+    for name in versions[settings.GLOBAL_TOPIC_MODELS_RETAINED_VERSIONS:]:
+        if name != current:
+            logging.info('Deleting old topic model version {0}'.format(name))
+            shutil.rmtree(os.path.join(directory, name))
+
+
+def get_global_model():
+    '''
+    This function returns the global topic models of the current process,
+    loading them on first use and again whenever the 'current' marker has
+    been moved to a new version. The models are read-only, so workers forked
+    after loading them keep sharing them. It returns None when global models
+    are disabled or have not been trained yet, in which case topics are
+    fitted on the search results as before.
+
+    Returns: GlobalTopicModel or None
+    '''
+    global _model, _model_mtime
+    if not settings.GLOBAL_TOPIC_MODELS_ENABLED:
+        return None
+    directory = os.path.abspath(settings.GLOBAL_TOPIC_MODELS_DIRECTORY)
+    current_path = os.path.join(directory, _CURRENT_FILE_NAME)
+    try:
+        mtime = os.stat(current_path).st_mtime
+    except OSError:
+        return None
+    with _model_lock:
+        if _model_mtime != mtime:
+            try:
+                with open(current_path) as current_file:
+                    name = current_file.read().strip()
+                _model = GlobalTopicModel(os.path.join(directory, name))
+                logging.info('Loaded global topic models {0}'.format(
+                             _model.version))
+            except Exception, error:
+                # The previous version (if any) keeps being served; loading
+                # is retried once the marker moves again.
+                logging.error('get_global_model: Error occurred - {0}'.format(
+                              str(error)))
+            _model_mtime = mtime
+        return _model
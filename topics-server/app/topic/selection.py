@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import heapq
+import logging
+import numpy
+from gensim import matutils
+
+logging.basicConfig(level=logging.INFO)
+
+# Number of documents whose weights are accumulated before being added up
+_AGGREGATE_CHUNK_SIZE = 10000
+
+
+def _get_magnitude(entry):
+    return abs(entry[1])
+
+
+def select_top(record, top_k=None, min_weight=None):
+    '''
+    This function keeps the strongest entries of a transformed document.
+    Weights are compared by magnitude, since LSI weights are signed. The
+    'top_k' entries are selected with a heap of that size rather than by
+    sorting the whole document, and are returned strongest first.
+
+    Params:
+    -------
+    - record (list): The (id, value) pairs of the document
+    - top_k (int): The maximum number of entries kept; None for all
+    - min_weight (float): The minimum magnitude of the weights kept; None
+    for no minimum
+
+    Returns: list
+    '''
+    if min_weight is not None:
+        record = [entry for entry in record if abs(entry[1]) >= min_weight]
+    if top_k is not None:
+        record = heapq.nlargest(top_k, record, key=_get_magnitude)
+    return record
+
+
+def iter_selected(records, top_k=None, min_weight=None, id2word=None):
+    '''
+    This function lazily applies select_top to every document. When the
+    ids are word ids, they are resolved to their words through the passed
+    dictionary, only for the entries kept.
+
+    Params:
+    -------
+    - records (iterable): The (id, value) lists of the documents
+    - top_k (int): The maximum number of entries kept per document
+    - min_weight (float): The minimum magnitude of the weights kept
+    - id2word (corpora.Dictionary): The dictionary of the ids; None when
+    they are not word ids
+
+    Returns: generator of list (of (id, value) or (id, value, word))
+    '''
+    for record in records:
+        record = select_top(record, top_k, min_weight)
+        if id2word is not None:
+            record = [(word_id, value, id2word[word_id])
+                      for (word_id, value) in record]
+        yield record
+
+
+def get_aggregate(records, number_of_ids, top_k, min_weight=None):
+    '''
+    This function ranks the ids (words or topics) of a corpus by their mean
+    weight magnitude across all of its documents. Weights are summed up in
+    chunks with bincount, and the 'top_k' ids are then selected with a
+    partial sort.
+
+    Params:
+    -------
+    - records (iterable): The (id, value) lists of the documents
+    - number_of_ids (int): The number of distinct ids (e.g. the size of the
+    dictionary, or the number of topics)
+    - top_k (int): The number of ids returned
+    - min_weight (float): The minimum mean weight of the ids returned; None
+    for no minimum
+
+    Returns: tuple (number of documents, list of (id, mean weight, number of
+    documents the id has a weight in))
+    '''
+    totals = numpy.zeros(number_of_ids)
+    counts = numpy.zeros(number_of_ids, dtype=numpy.int64)
+    number_of_documents = 0
+    ids = []
+    values = []
+
+    def add_chunk():
+        if ids:
+            totals[:] += numpy.bincount(ids, weights=numpy.abs(values),
+                                        minlength=number_of_ids)
+            counts[:] += numpy.bincount(ids, minlength=number_of_ids)
+        del ids[:], values[:]
+
+    for record in records:
+        number_of_documents += 1
+        for entry in record:
+            ids.append(entry[0])
+            values.append(entry[1])
+        if number_of_documents % _AGGREGATE_CHUNK_SIZE == 0:
+            add_chunk()
+    add_chunk()
+    if not number_of_documents:
+        return 0, []
+    means = totals / number_of_documents
+    selected = []
+    for top_id in matutils.argsort(means, top_k, reverse=True):
+        if counts[top_id] == 0 or \
+           (min_weight is not None and means[top_id] < min_weight):
+            break
+        selected.append((int(top_id), float(means[top_id]),
+                         int(counts[top_id])))
+    return number_of_documents, selected
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+
+class StreamedCorpus(object):
+    '''
+    This class is a re-iterable corpus of documents that are produced lazily
+    (e.g. from an Elasticsearch scroll). gensim walks a corpus several times
+    (dictionary, TF-IDF, LSI/LDA passes), so every iteration asks the factory
+    for a fresh document iterator instead of keeping the documents around.
+    '''
+
+    def __init__(self, document_factory, count_factory=None):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - document_factory (function): A callable returning a new iterator
+        over the documents every time it is invoked
+        - count_factory (function): A callable returning the number of
+        documents without iterating over them (e.g. an Elasticsearch count);
+        None to iterate over them when they have to be counted
+        '''
+        self._document_factory = document_factory
+        self._count_factory = count_factory
+        self.num_docs = None
+
+    def __iter__(self):
+        documents = self._document_factory()
+        count = 0
+        try:
+            for document in documents:
+                count += 1
+                yield document
+            self.num_docs = count
+        finally:
+            # An iteration stopped early (e.g. by a peek at the first
+            # document) closes the document iterator, so that it releases
+            # what it holds, such as a scroll context.
+            close = getattr(documents, 'close', None)
+            if close is not None:
+                close()
+
+    def __len__(self):
+        if self.num_docs is None:
+            if self._count_factory is not None:
+                self.num_docs = self._count_factory()
+            else:
+                self.num_docs = sum(1 for _ in self)
+        return self.num_docs
+
+    def __nonzero__(self):
+        if self.num_docs is not None or self._count_factory is not None:
+            return len(self) > 0
+        for _ in self:
+            return True
+        return False
+
+
+class StreamedBowCorpus(object):
+    '''
+    This class converts a StreamedCorpus into a gensim bag-of-words corpus on
+    the fly, tokenizing each document as it is read.
+    '''
+
+    def __init__(self, corpus, tokenizer, dictionary):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - corpus (StreamedCorpus): The documents being analyzed
+        - tokenizer (function): A callable turning a document into tokens
+        - dictionary (corpora.Dictionary): The dictionary built from the
+        corpus
+        '''
+        self._corpus = corpus
+        self._tokenizer = tokenizer
+        self._dictionary = dictionary
+
+    def __iter__(self):
+        for document in self._corpus:
+            yield self._dictionary.doc2bow(self._tokenizer(document))
+
+    def __len__(self):
+        return self._dictionary.num_docs
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import logging
+import numpy
+from gensim import interfaces
+from gensim import matutils
+from gensim import utils
+
+logging.basicConfig(level=logging.INFO)
+
+TFIDF_BACKENDS = ('gensim', 'sparse')
+
+# Weights at or below this magnitude are dropped, as gensim does
+_EPSILON = 1e-12
+
+
+def get_idfs(dfs, number_of_documents):
+    '''
+    This function computes the inverse document frequencies of the words
+    the way gensim's TfidfModel does: log2(documents / document frequency).
+
+    Params:
+    -------
+    - dfs (numpy.ndarray): The document frequency of every word
+    - number_of_documents (int): The number of documents
+
+    Returns: numpy.ndarray
+    '''
+    idfs = numpy.zeros(len(dfs))
+    present = dfs > 0
+    idfs[present] = numpy.log(float(number_of_documents) / dfs[present]) / \
+        numpy.log(2.0)
+    return idfs
+
+
+class SparseTfidfModel(interfaces.TransformationABC):
+    '''
+    This class is a TF-IDF model fitted to, and applied to, a whole
+    document-term matrix at once: the weighting and the L2 normalisation
+    are vectorized over the arrays of the CSR matrix instead of being
+    computed document by document. Its weights are those of gensim's
+    TfidfModel (with its default weighting), and, like it, it can also be
+    applied to gensim bag-of-words documents and corpora.
+    '''
+
+    def __init__(self, matrix, id2word=None):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - matrix (scipy.sparse.csr_matrix): The word counts of the documents
+        - id2word (corpora.Dictionary): The dictionary of the word ids
+        '''
+        self.id2word = id2word
+        self.num_docs = matrix.shape[0]
+        self.num_nnz = matrix.nnz
+        self.dfs = numpy.bincount(matrix.indices, minlength=matrix.shape[1])
+        self.idfs = get_idfs(self.dfs, self.num_docs)
+
+    def transform(self, matrix):
+        '''
+        This method weights the word counts of a document-term matrix.
+
+        Params:
+        -------
+        - matrix (scipy.sparse.csr_matrix): The word counts of the documents
+
+        Returns: scipy.sparse.csr_matrix
+        '''
+        weights = matrix.astype(numpy.float64)
+        weights.data *= self.idfs[weights.indices]
+        # The squares are summed row by row in order (a sparse matrix-vector
+        # product), as gensim does, so that the norms are the same to the bit
+        squares = weights.copy()
+        squares.data **= 2
+        norms = numpy.sqrt(squares.dot(numpy.ones(weights.shape[1])))
+        norms[norms == 0.0] = 1.0
+        weights.data /= numpy.repeat(norms, numpy.diff(weights.indptr))
+        weights.data[numpy.abs(weights.data) <= _EPSILON] = 0.0
+        weights.eliminate_zeros()
+        return weights
+
+    def __getitem__(self, bow, eps=_EPSILON):
+        '''
+        This method applies the model to a bag-of-words document or corpus.
+
+        Returns: list or gensim TransformedCorpus
+        '''
+        is_corpus, bow = utils.is_corpus(bow)
+        if is_corpus:
+            return self._apply(bow)
+        vector = [(word_id, count * float(self.idfs[word_id]))
+                  for word_id, count in bow
+                  if word_id < len(self.idfs) and self.idfs[word_id] != 0.0]
+        vector = matutils.unitvec(vector)
+        return [(word_id, weight) for word_id, weight in vector
+                if abs(weight) > eps]
+
+
+def get_json(weights):
+    '''
+    This function serializes a weighted document-term matrix straight from
+    its arrays into the JSON output of TopicAnalyzer (a list of
+    {"id", "value"} objects), without a dict per entry.
+
+    Params:
+    -------
+    - weights (scipy.sparse.csr_matrix): The weights of the documents
+
+    Returns: str
+    '''
+    return '[' + ', '.join(['{"id": %d, "value": %r}' % entry for entry in
+                            zip(weights.indices.tolist(),
+                                weights.data.tolist())]) + ']'
+
+
+def get_columns(weights, id2word=None):
+    '''
+    This function returns a weighted document-term matrix as the columns of
+    app.topic.encoding, which are its CSR arrays.
+
+    Params:
+    -------
+    - weights (scipy.sparse.csr_matrix): The weights of the documents
+    - id2word (corpora.Dictionary): The dictionary of the word ids, for the
+    words to be included as 'tokens'
+
+    Returns: dict
+    '''
+    columns = {
+        'offsets': weights.indptr.astype(numpy.int64),
+        'ids': weights.indices.astype(numpy.int64),
+        'values': weights.data
+    }
+    if id2word is not None:
+        columns['tokens'] = [id2word[word_id] for word_id in
+                             xrange(len(id2word))]
+    return columns
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import re
+import logging
+import threading
+import numpy
+from scipy import sparse
+from gensim import corpora
+from nltk.stem.lancaster import LancasterStemmer
+from nltk.stem.porter import PorterStemmer
+from nltk.stem.snowball import SnowballStemmer
+from app.config import settings
+
+logging.basicConfig(level=logging.INFO)
+
+# Words, possibly with inner apostrophes (e.g. "don't")
+_TOKEN_RE = re.compile(r"\w+(?:'\w+)*", re.UNICODE)
+
+STOPWORD_SETS = {
+    'none': frozenset(),
+    'default': frozenset('for a of the and to in'.split()),
+    'english': frozenset('''
+        i me my myself we our ours ourselves you your yours yourself
+        yourselves he him his himself she her hers herself it its itself they
+        them their theirs themselves what which who whom this that these those
+        am is are was were be been being have has had having do does did doing
+        a an the and but if or because as until while of at by for with about
+        against between into through during before after above below to from
+        up down in out on off over under again further then once here there
+        when where why how all any both each few more most other some such no
+        nor not only own same so than too very s t can will just don should
+        now'''.split())
+}
+
+STEMMERS = {
+    'none': None,
+    'porter': PorterStemmer,
+    'snowball': lambda: SnowballStemmer('english'),
+    'lancaster': LancasterStemmer
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_stopwords(name):
+    '''
+    This function returns one of the STOPWORD_SETS, or the words listed in a
+    file (one or more per line) when given a path instead.
+
+    Params:
+    -------
+    - name (str): The name of the set or the path of the file
+
+    Returns: frozenset
+    '''
+    if name in STOPWORD_SETS:
+        return STOPWORD_SETS[name]
+    if os.path.isfile(name):
+        with open(name) as stopwords_file:
+            return frozenset(word.lower() for word in
+                             stopwords_file.read().decode('utf-8').split())
+    raise ValueError('Unknown stopword set {0}; expected one of {1} or a '
+                     'file path'.format(name,
+                                        ', '.join(sorted(STOPWORD_SETS))))
+
+
+class _RawTokenIds(dict):
+    '''
+    This is the mapping from raw tokens to token IDs (-1 for stopwords); a
+    token seen for the first time is interned by the vocabulary.
+    '''
+
+    def __init__(self, intern):
+        super(_RawTokenIds, self).__init__()
+        self._intern = intern
+
+    def __missing__(self, token):
+        token_id = self[token] = self._intern(token)
+        return token_id
+
+
+class Vocabulary(object):
+    '''
+    This class interns tokens to integer IDs. Every distinct raw token is
+    stopword-filtered and stemmed once, when it is first seen, and mapped to
+    the ID of its stem; afterwards, encoding a document is a dict lookup per
+    token. IDs are never reused, so arrays encoded by the vocabulary remain
+    valid for as long as it lives.
+    '''
+
+    def __init__(self, stopwords=frozenset(), stemmer=None):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - stopwords (frozenset): The (lowercase) words that are dropped
+        - stemmer (object): An NLTK stemmer; None to keep words as they are
+        '''
+        self._stopwords = stopwords
+        self._stemmer = stemmer
+        self._raw_ids = _RawTokenIds(self.__intern)
+        self._lock = threading.Lock()
+        self.token2id = {}
+        self.id2token = []
+
+    def __intern(self, token):
+        if token in self._stopwords:
+            return -1
+        if self._stemmer is not None:
+            token = self._stemmer.stem(token)
+            if token in self._stopwords:
+                return -1
+        with self._lock:
+            token_id = self.token2id.get(token)
+            if token_id is None:
+                token_id = self.token2id[token] = len(self.id2token)
+                self.id2token.append(token)
+        return token_id
+
+    def __len__(self):
+        return len(self.id2token)
+
+    def encode(self, tokens):
+        '''
+        This method maps raw tokens onto their IDs, dropping stopwords.
+
+        Returns: numpy.ndarray
+        '''
+        token_ids = numpy.array(map(self._raw_ids.__getitem__, tokens),
+                                dtype=numpy.int32)
+        return token_ids[token_ids >= 0]
+
+
+class Tokenizer(object):
+    '''
+    This class splits documents into lowercase words with a precompiled
+    regular expression and encodes them as arrays of token IDs of its
+    vocabulary, from which bag-of-words corpora are built with vectorized
+    counting.
+    '''
+
+    def __init__(self, stopwords=frozenset(), stemmer=None):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - stopwords (frozenset): The (lowercase) words that are dropped
+        - stemmer (object): An NLTK stemmer; None to keep words as they are
+        '''
+        self.vocabulary = Vocabulary(stopwords, stemmer)
+
+    def encode(self, document):
+        '''
+        This method tokenizes a document into token IDs.
+
+        Returns: numpy.ndarray
+        '''
+        return self.vocabulary.encode(_TOKEN_RE.findall(document.lower()))
+
+    def decode(self, token_ids):
+        '''
+        This method maps token IDs back onto their (stemmed) words.
+
+        Returns: list of str
+        '''
+        id2token = self.vocabulary.id2token
+        return [id2token[token_id] for token_id in token_ids]
+
+    def tokenize(self, document):
+        '''
+        This method tokenizes a document into (stemmed) words.
+
+        Returns: list of str
+        '''
+        return self.decode(self.encode(document))
+
+    def get_matrix(self, encoded_documents, frequency_floor=1):
+        '''
+        This method builds the gensim Dictionary and the document-term
+        matrix (of word counts) of encoded documents in one pass, keeping
+        the words that occur more than 'frequency_floor' times in them.
+        Word and document frequencies are counted over the concatenated
+        token IDs at once rather than word by word.
+
+        Params:
+        -------
+        - encoded_documents (list): The documents, as returned by encode
+        - frequency_floor (int): An indicator of the minimum number of
+        occurrences that any word in the corpus can have
+
+        Returns: tuple (corpora.Dictionary, scipy.sparse.csr_matrix)
+        '''
+        number_of_documents = len(encoded_documents)
+        lengths = numpy.array([len(token_ids) for token_ids in
+                               encoded_documents], dtype=numpy.int64)
+        token_ids = numpy.concatenate(encoded_documents).astype(numpy.int64) \
+            if number_of_documents else numpy.zeros(0, dtype=numpy.int64)
+        frequencies = numpy.bincount(token_ids)
+        kept = numpy.flatnonzero(frequencies > frequency_floor)
+        dictionary = corpora.Dictionary()
+        dictionary.num_docs = number_of_documents
+        if not len(kept):
+            return dictionary, sparse.csr_matrix((number_of_documents, 0),
+                                                 dtype=numpy.int64)
+        documents = numpy.repeat(numpy.arange(number_of_documents), lengths)
+        mask = frequencies[token_ids] > frequency_floor
+        documents, token_ids = documents[mask], token_ids[mask]
+        # Corpus-local IDs are assigned to the kept words by the first
+        # document they occur in, then alphabetically, so that they do not
+        # depend on the order in which the vocabulary interned them.
+        _, occurrences = numpy.unique(token_ids, return_index=True)
+        id2token = self.vocabulary.id2token
+        kept = sorted(kept.tolist(), key=lambda token_id: id2token[token_id])
+        kept = numpy.array(kept, dtype=numpy.int64)
+        first_documents = numpy.empty(len(frequencies), dtype=numpy.int64)
+        first_documents[token_ids[occurrences]] = documents[occurrences]
+        kept = kept[numpy.argsort(first_documents[kept], kind='mergesort')]
+        local_ids = numpy.empty(len(frequencies), dtype=numpy.int64)
+        local_ids[kept] = numpy.arange(len(kept))
+        token_ids = local_ids[token_ids]
+        # A (document, word) pair is one bag-of-words entry; its count is the
+        # length of its run once the pairs are sorted.
+        keys = numpy.sort(documents * len(kept) + token_ids)
+        first = numpy.flatnonzero(numpy.diff(numpy.append(-1, keys)))
+        counts = numpy.diff(numpy.append(first, len(keys)))
+        keys = keys[first]
+        words = keys % len(kept)
+        offsets = numpy.searchsorted(keys // len(kept),
+                                     numpy.arange(number_of_documents + 1))
+        dictionary.token2id = dict((id2token[token_id], local_id)
+                                   for local_id, token_id in
+                                   enumerate(kept.tolist()))
+        dictionary.dfs = dict(enumerate(numpy.bincount(
+            words, minlength=len(kept)).tolist()))
+        dictionary.num_pos = len(token_ids)
+        dictionary.num_nnz = len(keys)
+        return dictionary, sparse.csr_matrix((counts, words, offsets),
+                                             shape=(number_of_documents,
+                                                    len(kept)))
+
+    def get_bow(self, encoded_documents, frequency_floor=1):
+        '''
+        This method builds the gensim Dictionary and bag-of-words corpus of
+        encoded documents (see get_matrix).
+
+        Params:
+        -------
+        - encoded_documents (list): The documents, as returned by encode
+        - frequency_floor (int): An indicator of the minimum number of
+        occurrences that any word in the corpus can have
+
+        Returns: tuple (corpora.Dictionary, list of bag-of-words)
+        '''
+        dictionary, matrix = self.get_matrix(encoded_documents,
+                                             frequency_floor)
+        return dictionary, get_bow_from_matrix(matrix)
+
+
+def get_bow_from_matrix(matrix):
+    '''
+    This function converts the rows of a document-term matrix into a gensim
+    bag-of-words corpus.
+
+    Params:
+    -------
+    - matrix (scipy.sparse.csr_matrix): The word counts of the documents
+
+    Returns: list of bag-of-words
+    '''
+    offsets = matrix.indptr.tolist()
+    words, counts = matrix.indices.tolist(), matrix.data.tolist()
+    return [zip(words[offsets[document]:offsets[document + 1]],
+                counts[offsets[document]:offsets[document + 1]])
+            for document in xrange(matrix.shape[0])]
+
+
+def get_tokenizer():
+    '''
+    This function returns the tokenizer of the current process, configured
+    by TOKENIZER_STOPWORDS and TOKENIZER_STEMMER. Its vocabulary is shared by
+    every request, so each distinct word is interned (and stemmed) once per
+    process; it is bounded by the vocabulary of the index. Forked processes
+    keep the vocabulary they inherit, so token IDs encoded before the fork
+    stay valid in them.
+
+    Returns: Tokenizer
+    '''
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            stemmer = STEMMERS[settings.TOKENIZER_STEMMER]
+            _tokenizer = Tokenizer(get_stopwords(settings.TOKENIZER_STOPWORDS),
+                                   stemmer() if stemmer else None)
+        return _tokenizer
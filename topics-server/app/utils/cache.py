@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from app.config import settings
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+
+_GENERATION_FILE_NAME = 'generation'
+_SHARED_CACHE_FILE_NAME = 'search-cache.db'
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+class MemoryCacheBackend(object):
+    '''
+    This is an in-process cache backend. Entries are kept in an OrderedDict
+    in least-recently-used order, so eviction simply pops the oldest item.
+    Values are copied in and out, so that callers never share the cached
+    lists.
+    '''
+
+    def __init__(self, max_entries):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - max_entries (int): The maximum number of entries kept in the cache
+        '''
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, now):
+        '''
+        This method retrieves a copy of an unexpired entry and marks it as
+        the most recently used one.
+
+        Params:
+        -------
+        - key (str): The cache key
+        - now (float): The current time stamp
+
+        Returns: object or None
+        '''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[1] < now:
+                self._misses += 1
+                return None
+            self._entries[key] = entry
+            self._hits += 1
+            return list(entry[0])
+
+    def set(self, key, value, expires_at):
+        '''
+        This method stores an entry and evicts the least-recently-used
+        entries above the size limit.
+
+        Params:
+        -------
+        - key (str): The cache key
+        - value (object): The value to store
+        - expires_at (float): The time stamp at which the entry expires
+        '''
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (list(value), expires_at)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def counts(self):
+        return self._hits, self._misses
+
+
+class SharedCacheBackend(object):
+    '''
+    This is a cache backend stored in a local sqlite file, which makes it
+    visible to every uwsgi worker on the host. A connection is opened per
+    operation so that the backend is safe across threads and forks. The
+    hit/miss counts are kept in the file as well, so that they cover every
+    worker.
+    '''
+
+    def __init__(self, max_entries, file_path):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - max_entries (int): The maximum number of entries kept in the cache
+        - file_path (str): The path of the sqlite file
+        '''
+        self._max_entries = max_entries
+        self._file_path = file_path
+        with self.__connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, '
+                               'value TEXT, '
+                               'expires_at REAL, '
+                               'accessed_at REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS '
+                               'entries_accessed_at ON entries (accessed_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS counters ('
+                               'name TEXT PRIMARY KEY, '
+                               'value INTEGER)')
+            connection.executemany('INSERT OR IGNORE INTO counters '
+                                   '(name, value) VALUES (?, 0)',
+                                   [('hits',), ('misses',)])
+
+    @contextmanager
+    def __connect(self):
+        connection = sqlite3.connect(self._file_path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def __count(self, connection, name):
+        connection.execute('UPDATE counters SET value = value + 1 '
+                           'WHERE name = ?', (name,))
+
+    def get(self, key, now):
+        with self.__connect() as connection:
+            row = connection.execute('SELECT value, expires_at FROM entries '
+                                     'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.__count(connection, 'misses')
+                return None
+            if row[1] < now:
+                connection.execute('DELETE FROM entries WHERE key = ?',
+                                   (key,))
+                self.__count(connection, 'misses')
+                return None
+            connection.execute('UPDATE entries SET accessed_at = ? '
+                               'WHERE key = ?', (now, key))
+            self.__count(connection, 'hits')
+            return json.loads(row[0])
+
+    def set(self, key, value, expires_at):
+        with self.__connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO entries '
+                               '(key, value, expires_at, accessed_at) '
+                               'VALUES (?, ?, ?, ?)',
+                               (key, json.dumps(value), expires_at,
+                                time.time()))
+            connection.execute('DELETE FROM entries WHERE key IN ('
+                               'SELECT key FROM entries '
+                               'ORDER BY accessed_at DESC '
+                               'LIMIT -1 OFFSET ?)', (self._max_entries,))
+
+    def clear(self):
+        with self.__connect() as connection:
+            connection.execute('DELETE FROM entries')
+
+    def size(self):
+        with self.__connect() as connection:
+            return connection.execute(
+                'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def counts(self):
+        with self.__connect() as connection:
+            counters = dict(connection.execute(
+                'SELECT name, value FROM counters').fetchall())
+        return counters['hits'], counters['misses']
+
+
+class SearchResultCache(object):
+    '''
+    This class caches Elasticsearch results keyed by index name and search
+    term. Every key also carries the 'generation' recorded in a marker file,
+    which is bumped whenever the indexer reindexes; entries written before a
+    reindex therefore stop matching in every worker process at once.
+    '''
+
+    def __init__(self, backend, ttl, directory):
+        '''
+        Constructor
+
+        Params:
+        -------
+        - backend (object): One of the cache backends above
+        - ttl (int): The number of seconds an entry remains valid
+        - directory (str): The directory holding the generation marker file
+        '''
+        self._backend = backend
+        self._ttl = ttl
+        self._generation_path = os.path.join(directory,
+                                             _GENERATION_FILE_NAME)
+        self._generation = ''
+        self._generation_mtime = None
+
+    def __get_generation(self):
+        '''
+        This method re-reads the generation marker only when its modification
+        time has changed, so that checking it costs a single stat call.
+
+        Returns: str
+        '''
+        try:
+            mtime = os.stat(self._generation_path).st_mtime
+        except OSError:
+            return self._generation
+        if mtime != self._generation_mtime:
+            with open(self._generation_path) as generation_file:
+                self._generation = generation_file.read().strip()
+            self._generation_mtime = mtime
+        return self._generation
+
+    def __get_key(self, index_name, search_term):
+        return json.dumps([self.__get_generation(), index_name, search_term])
+
+    def get(self, index_name, search_term):
+        '''
+        This method retrieves the cached result set of a search term.
+
+        Params:
+        -------
+        - index_name (str): The Elasticsearch index name
+        - search_term (str): The search term
+
+        Returns: list or None
+        '''
+        return self._backend.get(self.__get_key(index_name, search_term),
+                                 time.time())
+
+    def set(self, index_name, search_term, documents):
+        '''
+        This method caches the result set of a search term.
+
+        Params:
+        -------
+        - index_name (str): The Elasticsearch index name
+        - search_term (str): The search term
+        - documents (list): The search results
+        '''
+        self._backend.set(self.__get_key(index_name, search_term), documents,
+                          time.time() + self._ttl)
+
+    def invalidate(self):
+        '''
+        This method drops every cached result and bumps the generation marker
+        so that other processes stop serving their entries as well.
+        '''
+        directory = os.path.dirname(self._generation_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self._generation_path, 'w') as generation_file:
+            generation_file.write(repr(time.time()))
+        self._backend.clear()
+
+    def stats(self):
+        '''
+        This method reports the hit/miss counts of the backend: those of the
+        current process for the memory backend, and those of every worker
+        for the shared one.
+
+        Returns: dict
+        '''
+        hits, misses = self._backend.counts()
+        lookups = hits + misses
+        return {
+            'backend': self._backend.__class__.__name__,
+            'entries': self._backend.size(),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': float(hits) / lookups if lookups else 0.0
+        }
+
+
+def get_search_cache():
+    '''
+    This function returns the search result cache of the current process as
+    configured in settings, or None when caching is disabled.
+
+    Returns: SearchResultCache or None
+    '''
+    global _cache, _cache_pid
+    if settings.SEARCH_CACHE_BACKEND == 'none':
+        return None
+    pid = os.getpid()
+    with _cache_lock:
+        if _cache is None or _cache_pid != pid:
+            directory = os.path.abspath(settings.SEARCH_CACHE_DIRECTORY)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            if settings.SEARCH_CACHE_BACKEND == 'shared':
+                backend = SharedCacheBackend(
+                    settings.SEARCH_CACHE_MAX_ENTRIES,
+                    os.path.join(directory, _SHARED_CACHE_FILE_NAME))
+            else:
+                backend = MemoryCacheBackend(settings.SEARCH_CACHE_MAX_ENTRIES)
+            _cache = SearchResultCache(backend, settings.SEARCH_CACHE_TTL,
+                                       directory)
+            _cache_pid = pid
+        return _cache
+
+
+def invalidate_search_cache():
+    '''
+    This function invalidates the search result cache after a reindex.
+    '''
+    try:
+        cache = get_search_cache()
+        if cache is not None:
+            cache.invalidate()
+            logging.info('Search result cache invalidated')
+    except Exception, error:
+        logging.error('invalidate_search_cache: Error occurred - {0}'.format(
+                      str(error)))
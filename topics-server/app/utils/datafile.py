@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import gzip
+from app.config import settings
+
+
+def is_compressed(file_path):
+    '''
+    This function indicates whether the data-file at the given path is
+    gzip-compressed, either because DATAFILE_COMPRESS is set or because its
+    name ends in '.gz'.
+
+    Params:
+    -------
+    - file_path (str): The path of the data-file
+
+    Returns: bool
+    '''
+    return settings.DATAFILE_COMPRESS or file_path.endswith('.gz')
+
+
+def open_datafile(file_path, mode, compress=None):
+    '''
+    This function opens a data-file, transparently going through gzip when
+    the file is compressed.
+
+    Params:
+    -------
+    - file_path (str): The path of the data-file
+    - mode (str): The mode the file is opened with
+    - compress (bool): Whether the file is compressed; when omitted this is
+    derived from the settings and the file name
+
+    Returns: file
+    '''
+    if compress is None:
+        compress = is_compressed(file_path)
+    if compress:
+        return gzip.open(file_path, mode)
+    return open(file_path, mode)
@@ -1,10 +1,136 @@
+import os
 import json
 import logging
+import threading
 from app.config import settings
+from app.utils.cache import get_search_cache
+from app.topic.stream import StreamedCorpus
 from elasticsearch import Elasticsearch
+from elasticsearch import helpers
 
 logging.basicConfig(level=logging.INFO)
 
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_client_stats = {
+    'clients_created': 0,
+    'client_checkouts': 0
+}
+
+
+def get_client():
+    '''
+    This function returns the Elasticsearch client shared by every thread of
+    the current worker process. The client (and its connection pool) is
+    created lazily upon first use and re-created if the process has been
+    forked since, so that uwsgi workers never share sockets with the master.
+
+    Returns: Elasticsearch
+    '''
+    global _client, _client_pid
+    pid = os.getpid()
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            logging.info('Creating Elasticsearch client for process '
+                         '{0}'.format(pid))
+            _client = Elasticsearch(
+                hosts=[{
+                    'host': settings.ELASTIC_SEARCH_HOSTNAME,
+                    'port': settings.ELASTIC_SEARCH_PORT
+                }],
+                maxsize=settings.ELASTIC_SEARCH_POOL_MAXSIZE,
+                timeout=settings.ELASTIC_SEARCH_TIMEOUT,
+                max_retries=settings.ELASTIC_SEARCH_MAX_RETRIES,
+                retry_on_timeout=settings.ELASTIC_SEARCH_RETRY_ON_TIMEOUT)
+            _client_pid = pid
+            _client_stats['clients_created'] += 1
+        _client_stats['client_checkouts'] += 1
+        return _client
+
+
+def get_connection_stats():
+    '''
+    This function reports how often the pooled connections of the current
+    process' Elasticsearch client have been reused. 'reused_requests' is the
+    number of requests that did not have to open a new HTTP connection.
+
+    Returns: dict
+    '''
+    stats = {
+        'pid': os.getpid(),
+        'clients_created': _client_stats['clients_created'],
+        'client_checkouts': _client_stats['client_checkouts'],
+        'connections_opened': 0,
+        'requests': 0,
+        'reused_requests': 0
+    }
+    if _client is None or _client_pid != os.getpid():
+        return stats
+    try:
+        for connection in _client.transport.connection_pool.connections:
+            pool = getattr(connection, 'pool', None)
+            if pool is None:
+                continue
+            stats['connections_opened'] += getattr(pool, 'num_connections', 0)
+            stats['requests'] += getattr(pool, 'num_requests', 0)
+        stats['reused_requests'] = max(
+            stats['requests'] - stats['connections_opened'], 0)
+    except Exception, error:
+        logging.error('get_connection_stats: Error occurred - {0}'.format(
+                      str(error)))
+    return stats
+
+
+def get_index_version(index_name=None):
+    '''
+    This function identifies the version of the index (or of the index behind
+    the alias) currently being searched, as its concrete name and creation
+    date, so that a rebuilt index always yields a new version.
+
+    Params:
+    -------
+    - index_name (str): The index or alias; defaults to the one in settings
+
+    Returns: str
+    '''
+    index_settings = get_client().indices.get_settings(
+        index=index_name or settings.ELASTIC_SEARCH_INDEX_NAME)
+    return ','.join(
+        '{0}-{1}'.format(name, value['settings']['index'].get(
+                         'creation_date', '0'))
+        for name, value in sorted(index_settings.iteritems()))
+
+
+def get_parent_version(index_name=None):
+    '''
+    This function identifies the version of the index that the index (or the
+    index behind the alias) was built upon, i.e. whose documents were copied
+    into it before its own were loaded (see SearchEngineIndexer.bulk_load).
+
+    Params:
+    -------
+    - index_name (str): The index or alias; defaults to the one in settings
+
+    Returns: str or None (when the index was built from scratch)
+    '''
+    index_settings = get_client().indices.get_settings(
+        index=index_name or settings.ELASTIC_SEARCH_INDEX_NAME)
+    parents = [value['settings']['index'].get('parent_version')
+               for value in index_settings.itervalues()]
+    return parents[0] if len(parents) == 1 else None
+
+
+def get_documents(search, term):
+    '''
+    This function retrieves the documents matching the term, either as an
+    in-memory list or as a corpus streamed through a scroll, depending upon
+    the configured retrieval mode.
+    '''
+    if settings.SEARCH_RETRIEVAL_MODE == 'scroll':
+        return search.stream(term)
+    return search.get(term)
+
 
 class Search(object):
     '''
@@ -19,6 +145,35 @@ class Search(object):
         '''
         pass
 
+    def __get_query(self, search_term, since=None):
+        if search_term is None:
+            query = {"match_all": {}}
+        else:
+            query = {
+                "bool": {
+                    "must": [
+                        {
+                            "query_string": {
+                                "default_field": "text",
+                                "query": search_term
+                            }
+                        }
+                    ]
+                }
+            }
+        if since is not None:
+            query = {
+                "filtered": {
+                    "query": query,
+                    "filter": {
+                        "range": {
+                            "timestamp": {"gte": since.isoformat()}
+                        }
+                    }
+                }
+            }
+        return {"_source": ["text"], "query": query}
+
     def get(self, search_term=''):
         '''
         This method retrieves the search results returned by Elasticsearch and
@@ -32,32 +187,181 @@ class Search(object):
         '''
         documents = []
         try:
-            query = {
-              "query": {
-                    "bool": {
-                        "must": [
-                           {
-                                "query_string": {
-                                    "default_field": "text",
-                                    "query": search_term
-                                }
-                            }
-                        ]
-                    }
-                }
-             }
+            cache = get_search_cache()
+            if cache is not None:
+                cached_documents = cache.get(
+                    settings.ELASTIC_SEARCH_INDEX_NAME, search_term)
+                if cached_documents is not None:
+                    return cached_documents
+            query = self.__get_query(search_term)
             logging.info('Query = {0}'.format(query))
-            es = Elasticsearch(hosts=[{
-                'host': settings.ELASTIC_SEARCH_HOSTNAME,
-                'port': settings.ELASTIC_SEARCH_PORT
-            }])
+            es = get_client()
             data = es.search(index=settings.ELASTIC_SEARCH_INDEX_NAME,
-                             body=query)
+                             body=query, size=settings.SEARCH_RESULT_SIZE)
             for record in data['hits']['hits']:
                 result = ''
                 result = record.get('_source', {}).get('text', {})
                 documents.append(result)
+            if cache is not None:
+                cache.set(settings.ELASTIC_SEARCH_INDEX_NAME, search_term,
+                          documents)
         except Exception, error:
             logging.error('Search.get: Error occurred - {0}'.format(
                           str(error)))
         return documents
+
+    def get_many(self, search_terms, timeout=None):
+        '''
+        This method retrieves the search results of several terms in a single
+        multi-search round trip; terms found in the search result cache are
+        not sent to Elasticsearch.
+
+        Params:
+        -------
+        search_terms (list): The search terms
+        timeout (float): The number of seconds every search may take before
+        Elasticsearch returns the hits collected so far; None for no limit
+
+        Return: tuple (dict of term -> list, set of timed out terms); the
+        terms whose search failed are missing from the dict
+        '''
+        documents = {}
+        timed_out = set()
+        try:
+            cache = get_search_cache()
+            missing = []
+            for search_term in search_terms:
+                if search_term in documents or search_term in missing:
+                    continue
+                cached_documents = None
+                if cache is not None:
+                    cached_documents = cache.get(
+                        settings.ELASTIC_SEARCH_INDEX_NAME, search_term)
+                if cached_documents is not None:
+                    documents[search_term] = cached_documents
+                else:
+                    missing.append(search_term)
+            if not missing:
+                return documents, timed_out
+            body = []
+            for search_term in missing:
+                query = self.__get_query(search_term)
+                query['size'] = settings.SEARCH_RESULT_SIZE
+                if timeout:
+                    query['timeout'] = '{0}ms'.format(int(timeout * 1000))
+                body.extend([{}, query])
+            logging.info('Multi-search for {0} terms'.format(len(missing)))
+            data = get_client().msearch(
+                body=body, index=settings.ELASTIC_SEARCH_INDEX_NAME)
+            for search_term, response in zip(missing, data['responses']):
+                if 'error' in response:
+                    logging.error('Search.get_many: Error occurred for '
+                                  '{0} - {1}'.format(search_term,
+                                                     response['error']))
+                    continue
+                documents[search_term] = [
+                    record.get('_source', {}).get('text', '')
+                    for record in response['hits']['hits']]
+                if response.get('timed_out'):
+                    timed_out.add(search_term)
+                elif cache is not None:
+                    cache.set(settings.ELASTIC_SEARCH_INDEX_NAME,
+                              search_term, documents[search_term])
+        except Exception, error:
+            logging.error('Search.get_many: Error occurred - {0}'.format(
+                          str(error)))
+        return documents, timed_out
+
+    def count(self, search_term='', since=None):
+        '''
+        This method counts the documents matching the search term (or every
+        document when the term is None) without retrieving them.
+
+        Params:
+        -------
+        search_term (str): The search term
+        since (datetime): When set, only the documents indexed at or after
+        this time are counted
+
+        Return: int
+        '''
+        try:
+            query = self.__get_query(search_term, since)
+            return get_client().count(
+                index=settings.ELASTIC_SEARCH_INDEX_NAME,
+                body={'query': query['query']})['count']
+        except Exception, error:
+            logging.error('Search.count: Error occurred - {0}'.format(
+                          str(error)))
+        return 0
+
+    def iterate(self, search_term='', page_size=None, since=None):
+        '''
+        This method lazily yields the text of every document matching the
+        search term (or of every document when the term is None), fetching
+        the results page by page through a scan/scroll context so that only
+        one page is ever held in memory. The scroll context is cleared once
+        the iteration ends, whether the results are exhausted or not.
+
+        Params:
+        -------
+        search_term (str): The search term
+        page_size (int): The number of hits fetched per shard and per page
+        since (datetime): When set, only the documents indexed at or after
+        this time are returned
+
+        Return: generator
+        '''
+        es = None
+        scroll_id = None
+        try:
+            query = self.__get_query(search_term, since)
+            logging.info('Scroll query = {0}'.format(query))
+            es = get_client()
+            response = es.search(
+                index=settings.ELASTIC_SEARCH_INDEX_NAME, body=query,
+                search_type='scan', scroll=settings.SEARCH_SCROLL_TIMEOUT,
+                size=page_size or settings.SEARCH_SCROLL_PAGE_SIZE)
+            scroll_id = response.get('_scroll_id')
+            while scroll_id is not None:
+                response = es.scroll(scroll_id,
+                                     scroll=settings.SEARCH_SCROLL_TIMEOUT)
+                if response['_shards']['failed']:
+                    raise helpers.ScanError(
+                        'Scroll request has failed on {0} shards out of '
+                        '{1}'.format(response['_shards']['failed'],
+                                     response['_shards']['total']))
+                scroll_id = response.get('_scroll_id', scroll_id)
+                if not response['hits']['hits']:
+                    break
+                for record in response['hits']['hits']:
+                    yield record.get('_source', {}).get('text', '')
+        except Exception, error:
+            logging.error('Search.iterate: Error occurred - {0}'.format(
+                          str(error)))
+        finally:
+            if scroll_id is not None:
+                try:
+                    es.clear_scroll(scroll_id=scroll_id)
+                except Exception, error:
+                    logging.warning('Search.iterate: The scroll could not '
+                                    'be cleared - {0}'.format(str(error)))
+
+    def stream(self, search_term='', page_size=None, since=None):
+        '''
+        This method wraps the scrolled results into a re-iterable corpus that
+        TopicAnalyzer can hand to gensim without materializing the documents.
+        Its length (and whether it is empty) is answered by a count query.
+
+        Params:
+        -------
+        search_term (str): The search term
+        page_size (int): The number of hits fetched per shard and per page
+        since (datetime): When set, only the documents indexed at or after
+        this time are returned
+
+        Return: StreamedCorpus
+        '''
+        return StreamedCorpus(lambda: self.iterate(search_term, page_size,
+                                                   since),
+                              lambda: self.count(search_term, since))
@@ -3,19 +3,96 @@ from __future__ import absolute_import
 import os
 import time
 import csv
+import Queue
 import logging
+import threading
 from app.config import settings
 from datetime import datetime
-from elasticsearch import Elasticsearch
+from elasticsearch import helpers
+from app.utils.es import get_client
+from app.utils.es import get_index_version
+from app.utils.datafile import open_datafile
+from app.utils.cache import invalidate_search_cache
+from app.topic.model import update_global_models
 
 logging.basicConfig(level=logging.INFO)
 
+# Bulk item statuses that indicate a transient rejection worth retrying
+RETRYABLE_STATUSES = set([429, 500, 502, 503, 504])
+
+
+class IndexingStats(object):
+    '''
+    This is a thread-safe accumulator of the throughput and latency figures
+    reported at the end of an indexation run.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._latencies = []
+        self.documents = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def record(self, indexed, failed, sent_bytes, latency):
+        '''
+        This method records the outcome of a single bulk batch.
+
+        Params:
+        -------
+        - indexed (int): The number of documents indexed
+        - failed (int): The number of documents that could not be indexed
+        - sent_bytes (int): The number of bytes sent, retries included
+        - latency (float): The wall-clock time the batch took, in seconds
+        '''
+        with self._lock:
+            self.documents += indexed
+            self.failed += failed
+            self.bytes += sent_bytes
+            self._latencies.append(latency)
+
+    def report(self):
+        '''
+        This method summarizes the run.
+
+        Returns: dict
+        '''
+        with self._lock:
+            elapsed = max(time.time() - self._start, 1e-9)
+            latencies = sorted(self._latencies)
+            summary = {
+                'documents': self.documents,
+                'failed': self.failed,
+                'batches': len(latencies),
+                'bytes': self.bytes,
+                'elapsed': elapsed,
+                'docs_per_sec': self.documents / elapsed,
+                'bytes_per_sec': self.bytes / elapsed,
+                'batch_latency': {}
+            }
+            if latencies:
+                summary['batch_latency'] = {
+                    'min': latencies[0],
+                    'mean': sum(latencies) / len(latencies),
+                    'p50': latencies[len(latencies) // 2],
+                    'p95': latencies[min(int(len(latencies) * 0.95),
+                                         len(latencies) - 1)],
+                    'max': latencies[-1]
+                }
+            return summary
+
 
 class SearchEngineIndexer(object):
     '''
     This is a utility class that handles the indexation of the resulting novel
     text (from the TextGenerator object) into the target
     search engine 'store', which in the case of this project, is Elasticsearch.
+    Records are streamed from the data-file, grouped into bulk batches bounded
+    by document count and byte size, and sent by a pool of worker threads.
     '''
 
     def __init__(self):
@@ -49,75 +126,356 @@ class SearchEngineIndexer(object):
             }
         }
 
-    def __get_search_engine_config(self):
+    def __get_search_engine_config(self, bulk_load=False,
+                                   parent_version=None):
+        if bulk_load:
+            config = {
+                'settings': {
+                    'number_of_shards': 1,
+                    'number_of_replicas': 0,
+                    'refresh_interval': '-1'
+                }
+             }
+            if parent_version is not None:
+                config['settings']['parent_version'] = parent_version
+            return config
         return {
             'settings': {
                 'number_of_shards': 1,
-                'number_of_replicas': 0
+                'number_of_replicas':
+                    settings.ELASTIC_SEARCH_NUMBER_OF_REPLICAS
             }
          }
 
-    def __create_documents(self):
+    def __prepare_index(self, es):
+        '''
+        This method honours DROP_INDEX_FLAG when indexing in place (i.e.
+        without alias swapping) and creates the index if it is missing.
+
+        Params:
+        --------
+        - es (Elasticsearch): The Elasticsearch client
+        '''
+        if self._dropIndexFlag and es.indices.exists(index=self._indexName):
+            logging.info('Dropping index {0}'.format(self._indexName))
+            es.indices.delete(index=self._indexName)
+        if not es.indices.exists(index=self._indexName):
+            es.indices.create(index=self._indexName,
+                              body=self.__get_search_engine_config())
+
+    def __swap_alias(self, es, alias):
+        '''
+        This method atomically moves the alias from whichever indices it
+        points at onto the freshly loaded index. A concrete index that still
+        carries the alias' name (i.e. one created before versioned indices
+        were introduced) has to be deleted first, since an alias cannot share
+        its name with an index.
+
+        Params:
+        --------
+        - es (Elasticsearch): The Elasticsearch client
+        - alias (str): The alias queried by Search
+        '''
+        actions = []
+        if es.indices.exists_alias(name=alias):
+            for index_name in es.indices.get_alias(name=alias):
+                actions.append({'remove': {'index': index_name,
+                                           'alias': alias}})
+        elif es.indices.exists(index=alias):
+            logging.warning('Index {0} predates versioned indices and will '
+                            'be replaced by an alias'.format(alias))
+            es.indices.delete(index=alias)
+        actions.append({'add': {'index': self._indexName, 'alias': alias}})
+        es.indices.update_aliases(body={'actions': actions})
+        logging.info('Alias {0} now points at {1}'.format(alias,
+                                                          self._indexName))
+
+    def __collect_garbage(self, es, alias):
+        '''
+        This method deletes the versioned indices that fall outside of the
+        ELASTIC_SEARCH_RETAINED_VERSIONS most recent ones.
+
+        Params:
+        --------
+        - es (Elasticsearch): The Elasticsearch client
+        - alias (str): The alias queried by Search
+        '''
+        versions = sorted(es.indices.get_settings(
+            index='{0}_v*'.format(alias)).keys())
+        retained = max(settings.ELASTIC_SEARCH_RETAINED_VERSIONS, 1)
+        for index_name in versions[:-retained]:
+            if index_name != self._indexName:
+                logging.info('Deleting old index version {0}'.format(
+                             index_name))
+                es.indices.delete(index=index_name)
+
+    def __read_records(self):
+        '''
+        This method streams the (documentId, documentText) records from the
+        data-file one row at a time.
+
+        Params:
+        --------
+        Returns: generator
+        '''
+        input_file_path = settings.DATAFILE_OUTPUT_FILE_PATH
+        abs_path = os.path.abspath(input_file_path)
+        if os.path.isfile(abs_path):
+            with open_datafile(abs_path, 'rb') as csvObj:
+                csv_file = csv.DictReader(
+                                    csvObj,
+                                    delimiter=settings.DATAFILE_DELIMITER,
+                                    fieldnames=['documentId',
+                                                'documentText'])
+                for row in csv_file:
+                    yield row['documentId'], row['documentText']
+        else:
+            logging.error('There was an error retrieving the CSV file via '
+                          'the passed parameters. Please verify accuracy '
+                          'of path.')
+
+    def __create_documents(self, records):
         '''
         This method is charged with creating Elasticsearch documents.
 
         Params:
         --------
-        Returns: list
+        - records (iterable): The (documentId, documentText) records
+
+        Returns: generator of (action, document) tuples
         '''
-        bulk_data = []
-        try:
-            input_file_path = settings.DATAFILE_OUTPUT_FILE_PATH
-            abs_path = os.path.abspath(input_file_path)
-            if os.path.isfile(abs_path):
-                with open(abs_path, 'r') as csvObj:
-                    csv_file = csv.DictReader(
-                                        csvObj,
-                                        delimiter=settings.DATAFILE_DELIMITER,
-                                        fieldnames=['documentId',
-                                                    'documentText'])
-                    for row in csv_file:
-                        _search_index_model = self.__create_indexer_model()
-                        _doc_model = self.__create_base_document()
-                        _search_index_model['index']['_index'] =  \
-                            settings.ELASTIC_SEARCH_INDEX_NAME
-                        _search_index_model['index']['_id'] = row['documentId']
-                        _search_index_model['index']['_type'] = 'document'
-                        _doc_model['text'] = row['documentText']
-                        _doc_model['timestamp'] = datetime.now()
-                        bulk_data.append(_search_index_model)
-                        bulk_data.append(_doc_model)
+        for document_id, document_text in records:
+            _search_index_model = self.__create_indexer_model()
+            _doc_model = self.__create_base_document()
+            _search_index_model['index']['_index'] = self._indexName
+            _search_index_model['index']['_id'] = document_id
+            _search_index_model['index']['_type'] = 'document'
+            _doc_model['text'] = document_text
+            _doc_model['timestamp'] = datetime.now()
+            yield _search_index_model, _doc_model
+
+    def __create_batches(self, documents, serializer):
+        '''
+        This method serializes the documents into bulk batches bounded by
+        document count and byte size.
+
+        Params:
+        --------
+        - documents (iterable): The (action, document) tuples
+        - serializer (object): The Elasticsearch client's serializer
+
+        Returns: generator of lists of serialized (action, document) tuples
+        '''
+        batch = []
+        batch_bytes = 0
+        for action, document in documents:
+            entry = (serializer.dumps(action), serializer.dumps(document))
+            entry_bytes = len(entry[0]) + len(entry[1]) + 2
+            if batch and (len(batch) >= settings.INDEXER_BATCH_DOCUMENTS or
+                          batch_bytes + entry_bytes >
+                          settings.INDEXER_BATCH_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(entry)
+            batch_bytes += entry_bytes
+        if batch:
+            yield batch
+
+    def __send_batch(self, es, batch):
+        '''
+        This method sends one batch via Elasticsearch's Bulk API, retrying the
+        items that were rejected with a transient status (or the whole batch
+        on a transport error) with exponential back-off.
+
+        Params:
+        --------
+        - es (Elasticsearch): The Elasticsearch client
+        - batch (list): The serialized (action, document) tuples
+
+        Returns: tuple (indexed, failed, sent bytes, latency)
+        '''
+        start = time.time()
+        indexed = 0
+        failed = 0
+        sent_bytes = 0
+        attempt = 0
+        pending = batch
+        while pending:
+            body = ''.join('{0}\n{1}\n'.format(action, document)
+                           for action, document in pending)
+            sent_bytes += len(body)
+            retry = []
+            try:
+                response = es.bulk(body=body)
+                for entry, item in zip(pending, response['items']):
+                    result = item.values()[0]
+                    status = result.get('status', 500)
+                    if status < 300:
+                        indexed += 1
+                    elif status in RETRYABLE_STATUSES:
+                        retry.append(entry)
+                    else:
+                        failed += 1
+                        logging.error('SearchEngineIndexer: Document {0} '
+                                      'rejected - {1}'.format(
+                                        result.get('_id'),
+                                        result.get('error')))
+            except Exception, error:
+                logging.error('SearchEngineIndexer.__send_batch: Error '
+                              'occured - {}'.format(str(error)))
+                retry = pending
+            if retry and attempt < settings.INDEXER_MAX_RETRIES:
+                time.sleep(settings.INDEXER_RETRY_BACKOFF * (2 ** attempt))
+                attempt += 1
+                pending = retry
             else:
-                logging.error('There was an error retrieving the CSV file via '
-                              'the passed parameters. Please verify accuracy '
-                              'of path.')
-        except Exception, error:
-            logging.error('SearchEngineIndexer.__create_documents: Error '
-                          'occured - {}'.format(str(error)))
-        return bulk_data
+                failed += len(retry)
+                pending = []
+        return indexed, failed, sent_bytes, time.time() - start
+
+    def __bulk_worker(self, es, batches, stats):
+        '''
+        This method is run by every indexer thread; it sends the batches
+        taken from the queue until it receives the None sentinel.
+        '''
+        while True:
+            batch = batches.get()
+            try:
+                if batch is None:
+                    return
+                stats.record(*self.__send_batch(es, batch))
+            finally:
+                batches.task_done()
 
-    def ingest_into_es(self, refresh):
+    def ingest_records(self, records, refresh):
         '''
-        This method is charged with indexing the documents created above via
-        Elasticsearch's Bulk API
+        This method indexes the passed records through a pool of bulk
+        worker threads. The queue between the batching loop and the workers
+        is bounded, so at most INDEXER_QUEUE_SIZE batches (plus one per
+        thread) are held in memory at any time.
+
+        Params:
+        --------
+        - records (iterable): The (documentId, documentText) records
+        - refresh (bool): A flag to determine if the index should be refreshed
+        once every batch has been sent.
+
+        Returns: dict
+        '''
+        es = get_client()
+        stats = IndexingStats()
+        batches = Queue.Queue(maxsize=settings.INDEXER_QUEUE_SIZE)
+        workers = [threading.Thread(target=self.__bulk_worker,
+                                    args=(es, batches, stats))
+                   for _ in range(max(settings.INDEXER_THREADS, 1))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        try:
+            for batch in self.__create_batches(
+                    self.__create_documents(records),
+                    es.transport.serializer):
+                batches.put(batch)
+        finally:
+            for _ in workers:
+                batches.put(None)
+            for worker in workers:
+                worker.join()
+        if refresh:
+            es.indices.refresh(index=self._indexName)
+        report = stats.report()
+        logging.info('Indexed {0} documents ({1} failed) in {2} batches: '
+                     '{3:.1f} docs/sec, {4:.1f} bytes/sec, batch latency '
+                     '{5}'.format(report['documents'], report['failed'],
+                                  report['batches'], report['docs_per_sec'],
+                                  report['bytes_per_sec'],
+                                  report['batch_latency']))
+        return report
+
+    def bulk_load(self, records):
+        '''
+        This method loads the records into a new versioned index created with
+        refresh disabled and no replicas, restores the regular settings and
+        force-merges the index once the load is done, and only then moves the
+        alias that Search queries onto it. Queries therefore keep hitting the
+        previous, complete index for the whole duration of the load. Unless
+        DROP_INDEX_FLAG is set, the documents of the previous index are
+        copied into the new one first and its version is recorded as the
+        parent of the new one, so that the global topic models trained on it
+        can be updated with the new documents rather than retrained.
+
+        Params:
+        --------
+        - records (iterable): The (documentId, documentText) records
+
+        Returns: dict
+        '''
+        es = get_client()
+        alias = settings.ELASTIC_SEARCH_INDEX_NAME
+        self._indexName = '{0}_v{1}'.format(
+            alias, datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+        parent_version = None
+        if not self._dropIndexFlag and es.indices.exists_alias(name=alias):
+            parent_version = get_index_version(alias)
+        logging.info('Bulk loading into {0}'.format(self._indexName))
+        es.indices.create(index=self._indexName,
+                          body=self.__get_search_engine_config(
+                                bulk_load=True,
+                                parent_version=parent_version))
+        if parent_version is not None:
+            copied, _ = helpers.reindex(es, alias, self._indexName,
+                                        bulk_kwargs={'stats_only': True})
+            logging.info('Copied {0} documents of {1}'.format(
+                         copied, parent_version))
+        report = self.ingest_records(records, refresh=False)
+        if report['documents'] == 0:
+            logging.error('No documents were indexed; alias {0} was left '
+                          'untouched'.format(alias))
+            es.indices.delete(index=self._indexName)
+            return report
+        es.indices.put_settings(index=self._indexName, body={
+            'index': {
+                'refresh_interval': settings.ELASTIC_SEARCH_REFRESH_INTERVAL,
+                'number_of_replicas':
+                    settings.ELASTIC_SEARCH_NUMBER_OF_REPLICAS
+            }
+        })
+        es.indices.refresh(index=self._indexName)
+        es.indices.optimize(
+            index=self._indexName,
+            max_num_segments=settings.INDEXER_FORCE_MERGE_SEGMENTS)
+        self.__swap_alias(es, alias)
+        self.__collect_garbage(es, alias)
+        return report
+
+    def ingest_into_es(self, refresh, records=None):
+        '''
+        This method is charged with indexing the documents of the data-file
+        (or of the passed records) via Elasticsearch's Bulk API
 
         Params:
         --------
         refresh (bool): A flag to determine if the index should be refreshed.
+        records (iterable): The (documentId, documentText) records; the
+        data-file is read when None
+
+        Returns: dict
         '''
-        es = None
+        report = None
+        if records is None:
+            records = self.__read_records()
         try:
-            es = Elasticsearch(hosts=[{
-                'host': settings.ELASTIC_SEARCH_HOSTNAME,
-                'port': settings.ELASTIC_SEARCH_PORT
-            }])
-            bulk_data = self.__create_documents()
-            es.bulk(index=settings.ELASTIC_SEARCH_INDEX_NAME,
-                    body=bulk_data, refresh=refresh)
+            if settings.INDEXER_ALIAS_SWAP:
+                report = self.bulk_load(records)
+            else:
+                self.__prepare_index(get_client())
+                report = self.ingest_records(records, refresh)
         except Exception, error:
             logging.error('SearchEngineIndexer.'
                           'ingest_into_es:'
                           'Error occured - {}'.format(str(error)))
+        return report
 
 
 def index():
@@ -126,6 +484,10 @@ def index():
         if settings.OPERATION_INDEX_DATAFILE:
             logging.info('Datafile with be indexed...')
             indexer = SearchEngineIndexer()
+            started = datetime.now()
             indexer.ingest_into_es(refresh=True)
+            invalidate_search_cache()
+            if settings.GLOBAL_TOPIC_MODELS_TRAIN_ON_INDEX:
+                update_global_models(started)
     except Exception, error:
         logging.error('Error occurred - {}'.format(error))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import time
+import Queue
+import logging
+import multiprocessing
+from datetime import datetime
+from app.config import settings
+from app.corpus.generator import TextGenerator
+from app.corpus.generator import get_shard_sizes
+from app.corpus.generator import load_corpus
+from app.utils.indexer import SearchEngineIndexer
+from app.utils.cache import invalidate_search_cache
+from app.topic.model import update_global_models
+
+logging.basicConfig(level=logging.INFO)
+
+
+class PipelineStats(object):
+    '''
+    This is an accumulator of the end-to-end figures of a generate-to-index
+    run: how many records were produced, how long the generator workers were
+    held back by a full queue (backpressure from the indexer) and how long
+    the indexer waited on an empty one (starvation).
+    '''
+
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self._start = time.time()
+        self._first_record = None
+        self.produced = 0
+        self.consumed = 0
+        self.producer_blocked = 0.0
+        self.consumer_waiting = 0.0
+        self.errors = []
+
+    def record_chunk(self, size, waited):
+        if self._first_record is None:
+            self._first_record = time.time()
+        self.consumed += size
+        self.consumer_waiting += waited
+
+    def record_worker(self, produced, blocked, error):
+        self.produced += produced
+        self.producer_blocked += blocked
+        if error:
+            self.errors.append(error)
+
+    def report(self):
+        '''
+        This method summarizes the run.
+
+        Returns: dict
+        '''
+        elapsed = max(time.time() - self._start, 1e-9)
+        return {
+            'produced': self.produced,
+            'consumed': self.consumed,
+            'elapsed': elapsed,
+            'records_per_sec': self.consumed / elapsed,
+            'time_to_first_record': (self._first_record - self._start
+                                     if self._first_record else None),
+            'producer_blocked': self.producer_blocked,
+            'consumer_waiting': self.consumer_waiting,
+            'errors': self.errors
+        }
+
+
+def _produce(engine_type, engine, shard, offset, number_of_records, records,
+             chunk_size):
+    '''
+    This is the entry point of a generator worker process. It generates one
+    shard and puts its records on the queue in chunks, blocking whenever the
+    queue is full, and ends with a ('done', ...) message carrying its own
+    figures.
+    '''
+    produced = 0
+    blocked = 0.0
+    error = None
+    try:
+        chunk = []
+        for record in TextGenerator().generate_shard_records(
+                engine_type, engine, shard, offset, number_of_records,
+                settings.GENERATOR_SEED, settings.DATAFILE_GENERATE_UUID,
+                settings.DATAFILE_WORDS_PER_RECORD,
+                settings.DATAFILE_SENTENCES_PER_RECORD):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                start = time.time()
+                records.put(('records', chunk))
+                blocked += time.time() - start
+                produced += len(chunk)
+                chunk = []
+        if chunk:
+            start = time.time()
+            records.put(('records', chunk))
+            blocked += time.time() - start
+            produced += len(chunk)
+    except Exception, error:
+        logging.error('_produce: Error occurred - {0}'.format(str(error)))
+        error = str(error)
+    records.put(('done', (produced, blocked, error)))
+
+
+def _drain(records, workers, stats):
+    '''
+    This function yields the records put on the queue by the generator
+    workers until every one of them has reported it is done (or has died
+    without doing so).
+
+    Returns: generator of (id, text) tuples
+    '''
+    pending = len(workers)
+    while pending:
+        start = time.time()
+        try:
+            kind, payload = records.get(timeout=1.0)
+        except Queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                logging.error('Generator workers exited without finishing')
+                return
+            continue
+        waited = time.time() - start
+        if kind == 'done':
+            stats.record_worker(*payload)
+            pending -= 1
+            continue
+        stats.record_chunk(len(payload), waited)
+        for record in payload:
+            yield record
+
+
+def run_pipeline():
+    '''
+    This function generates records and indexes them in one streaming run,
+    without writing the data-file: PIPELINE_GENERATOR_PROCESSES workers each
+    generate a shard onto a queue bounded to PIPELINE_QUEUE_SIZE chunks, and
+    the indexer drains it into Elasticsearch as the records arrive.
+
+    Returns: dict
+    '''
+    workers = []
+    try:
+        generator = TextGenerator()
+        engine_type = settings.CORPUS_ENGINE_TYPE
+        engine = generator.load_engine(engine_type, load_corpus(generator))
+        records = multiprocessing.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        stats = PipelineStats()
+        # Workers are forked, so they inherit the trained engine rather than
+        # receiving a pickled copy of it.
+        for shard, offset, shard_records in get_shard_sizes(
+                settings.DATAFILE_RECORD_NUMBER,
+                max(settings.PIPELINE_GENERATOR_PROCESSES, 1)):
+            worker = multiprocessing.Process(
+                target=_produce,
+                args=(engine_type, engine, shard, offset, shard_records,
+                      records, settings.PIPELINE_CHUNK_SIZE))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        indexer = SearchEngineIndexer()
+        started = datetime.now()
+        index_report = indexer.ingest_into_es(
+            refresh=True, records=_drain(records, workers, stats))
+        invalidate_search_cache()
+        report = stats.report()
+        if settings.GLOBAL_TOPIC_MODELS_TRAIN_ON_INDEX:
+            update_global_models(started)
+        report['index'] = index_report
+        logging.info('Pipeline generated {0} and indexed {1} records in '
+                     '{2:.1f}s ({3:.1f} records/sec); generators were held '
+                     'back {4:.1f} worker-seconds by a full queue and the '
+                     'indexer waited {5:.1f}s on an empty one'.format(
+                        report['produced'],
+                        index_report['documents'] if index_report else 0,
+                        report['elapsed'], report['records_per_sec'],
+                        report['producer_blocked'],
+                        report['consumer_waiting']))
+        return report
+    except Exception, error:
+        logging.error('run_pipeline: Error occurred - {0}'.format(str(error)))
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
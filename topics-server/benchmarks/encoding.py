@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import json
+import time
+import logging
+from app.topic.analyzer import TopicAnalyzer
+from app.topic.encoding import COMPRESSIONS
+from app.topic.encoding import compress
+from app.topic.encoding import encode
+from app.topic.encoding import get_available_formats
+from app.topic.encoding import get_columns
+from benchmarks.synthetic import get_synthetic_documents
+
+logging.basicConfig(level=logging.INFO)
+
+
+def get_legacy_json(records):
+    '''
+    This function replicates the JSON transform of TopicAnalyzer, which
+    serves the 'json' format: one dict per (id, value) pair, serialized as a
+    whole.
+
+    Returns: str
+    '''
+    json_array = []
+    for record in records:
+        for elem in record:
+            json_elem = {}
+            json_elem['id'] = elem[0]
+            json_elem['value'] = elem[1]
+            json_array.append(json_elem)
+    return json.dumps(json_array)
+
+
+def run(number_of_documents=10000, words_per_document=50,
+        vocabulary_size=20000, model_types=('tfidf', 'lda'), repeat=3,
+        seed=0):
+    '''
+    This function compares the serialization time and payload size of the
+    response formats, uncompressed and compressed, on the output of models
+    fitted to a synthetic corpus. The output of every model is evaluated
+    once beforehand, so that only the serialization is timed.
+
+    Params:
+    -------
+    - number_of_documents (int): The size of the synthetic corpus
+    - words_per_document (int): The number of words per document
+    - vocabulary_size (int): The vocabulary size of the synthetic corpus
+    - model_types (list): The models whose output is serialized
+    - repeat (int): The number of runs the best time is taken over
+    - seed (int): The seed of the random number generator
+
+    Returns: list of dict
+    '''
+    documents = get_synthetic_documents(number_of_documents,
+                                        words_per_document, vocabulary_size,
+                                        seed)
+    topics = TopicAnalyzer(documents)
+    results = []
+    for model_type in model_types:
+        if model_type == 'tfidf':
+            (model, bow) = topics.get_tfidf()
+        elif model_type == 'lsi':
+            (model, bow) = topics.get_lsi_model()
+        else:
+            (model, bow) = topics.get_lda_model()
+        records = [list(record) for record in model[bow]]
+        dictionary = topics.get_dictionary() if model_type == 'tfidf' \
+            else None
+        encoders = [('json', lambda: get_legacy_json(records))]
+        for response_format in get_available_formats():
+            if response_format == 'json':
+                continue
+            encoders.append((response_format, lambda response_format=(
+                response_format): encode(get_columns(records, dictionary),
+                                         response_format)))
+        for name, encoder in encoders:
+            seconds = []
+            for _ in xrange(repeat):
+                start = time.time()
+                body = encoder()
+                seconds.append(time.time() - start)
+            result = {
+                'model': model_type,
+                'format': name,
+                'seconds': round(min(seconds), 4),
+                'bytes': len(body)
+            }
+            for compression in COMPRESSIONS:
+                start = time.time()
+                result[compression + '_bytes'] = len(compress(body,
+                                                              compression))
+                result[compression + '_seconds'] = round(time.time() - start,
+                                                         4)
+            logging.info('{model} as {format}: {seconds}s, {bytes} bytes '
+                         '(gzip: {gzip_bytes} bytes in {gzip_seconds}s, '
+                         'deflate: {deflate_bytes} bytes in '
+                         '{deflate_seconds}s)'.format(**result))
+            results.append(result)
+    return results
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import time
+import logging
+import multiprocessing
+from gensim import corpora
+from app.topic.analyzer import get_lda_workers
+from app.topic.analyzer import train_lda_model
+from benchmarks.synthetic import get_synthetic_documents
+
+logging.basicConfig(level=logging.INFO)
+
+
+def get_default_worker_counts():
+    '''
+    This function returns the worker counts compared by default: powers of
+    two up to the number of cores, and the number of cores itself.
+
+    Returns: list of int
+    '''
+    cores = multiprocessing.cpu_count()
+    counts = []
+    workers = 1
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    counts.append(cores)
+    return counts
+
+
+def run(number_of_documents=20000, words_per_document=100,
+        vocabulary_size=10000, num_topics=20, worker_counts=None,
+        chunksize=None, passes=1, seed=0):
+    '''
+    This function trains the same LDA model with an increasing number of
+    worker processes and reports the speedup over a single core, along with
+    the perplexity of every model on the first documents of the corpus.
+
+    Params:
+    -------
+    - number_of_documents (int): The size of the synthetic corpus
+    - words_per_document (int): The number of words per document
+    - vocabulary_size (int): The vocabulary size of the synthetic corpus
+    - num_topics (int): The number of topics
+    - worker_counts (list): The worker counts compared; see
+    get_default_worker_counts when None
+    - chunksize (int): The number of documents per chunk, None for
+    LDA_CHUNK_SIZE
+    - passes (int): The number of passes over the corpus
+    - seed (int): The seed of the random number generators
+
+    Returns: list of dict
+    '''
+    documents = [document.split() for document in get_synthetic_documents(
+        number_of_documents, words_per_document, vocabulary_size, seed,
+        num_topics)]
+    dictionary = corpora.Dictionary(documents)
+    bow = [dictionary.doc2bow(document) for document in documents]
+    evaluation = bow[:1000]
+    results = []
+    for workers in worker_counts or get_default_worker_counts():
+        start = time.time()
+        lda = train_lda_model(bow, dictionary, num_topics, len(bow),
+                              eval_every=None, workers=workers,
+                              chunksize=chunksize, passes=passes)
+        seconds = time.time() - start
+        result = {
+            'requested_workers': workers,
+            'workers': get_lda_workers(len(bow), workers, chunksize),
+            'seconds': round(seconds, 3),
+            'documents_per_sec': int(len(bow) * passes / seconds)
+            if seconds else 0,
+            'per_word_bound': round(lda.log_perplexity(evaluation), 4)
+        }
+        result['speedup'] = round(results[0]['seconds'] / seconds, 2) \
+            if results and seconds else 1.0
+        logging.info('{requested_workers} worker(s) requested, {workers} '
+                     'used: trained in {seconds}s ({documents_per_sec} '
+                     'documents/sec), speedup {speedup}x, per-word bound '
+                     '{per_word_bound}'.format(**result))
+        results.append(result)
+    return results
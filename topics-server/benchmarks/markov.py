@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import gc
+import os
+import time
+import random
+import shutil
+import tempfile
+import cPickle
+import logging
+import resource
+import multiprocessing
+from app.corpus.generator import TextGenerator
+from benchmarks.synthetic import get_synthetic_corpus
+
+logging.basicConfig(level=logging.INFO)
+
+ENGINES = ('simplifiedmarkovchain', 'compactmarkovchain')
+
+
+def get_rss():
+    '''
+    This is a utility function that returns the current and the peak resident
+    set size of the process, in kilobytes. The current size is read from
+    /proc and falls back to the peak where /proc is unavailable.
+
+    Returns: tuple (int, int)
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open('/proc/self/statm') as statm_file:
+            pages = int(statm_file.read().split()[1])
+        return pages * resource.getpagesize() // 1024, peak
+    except (IOError, IndexError, ValueError):
+        return peak, peak
+
+
+def _train(args):
+    '''
+    This function trains one engine and pickles it to a file, the way the
+    engine cache stores it.
+
+    Returns: float
+    '''
+    engine_type, corpus, path = args
+    start = time.time()
+    engine = TextGenerator().train_engine(engine_type, corpus)
+    train_seconds = time.time() - start
+    with open(path, 'wb') as engine_file:
+        cPickle.dump(engine, engine_file, cPickle.HIGHEST_PROTOCOL)
+    return train_seconds
+
+
+def _sample(args):
+    '''
+    This function loads a pickled engine and samples from it. It runs in a
+    fresh process, so that the RSS growth reflects the loaded model rather
+    than what the allocator kept from training.
+
+    Returns: dict
+    '''
+    engine_type, path, words, sentences, records, seed = args
+    generator = TextGenerator()
+    gc.collect()
+    baseline_rss, _ = get_rss()
+    with open(path, 'rb') as engine_file:
+        engine = cPickle.load(engine_file)
+    gc.collect()
+    model_rss, _ = get_rss()
+    start = time.time()
+    for _ in generator.sample_engine(engine_type, engine, words, sentences,
+                                     records, random.Random(seed)):
+        pass
+    sample_seconds = time.time() - start
+    _, peak_rss = get_rss()
+    tokens = words * sentences * records
+    return {
+        'engine_type': engine_type,
+        'sample_seconds': round(sample_seconds, 3),
+        'tokens_per_sec': int(tokens / sample_seconds) if sample_seconds
+        else 0,
+        'model_rss_kb': model_rss - baseline_rss,
+        'peak_rss_kb': peak_rss
+    }
+
+
+def _run_isolated(function, args):
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(function, (args,))
+    finally:
+        pool.terminate()
+
+
+def run(corpus=None, number_of_tokens=1000000, vocabulary_size=50000,
+        words=20, sentences=5, records=10000, seed=0):
+    '''
+    This function compares the sampling throughput and memory use of the
+    dict-of-lists Markov engine against the compact NumPy one.
+
+    Params:
+    -------
+    - corpus (str): The training corpus; a synthetic one is built when None
+    - number_of_tokens (int): The size of the synthetic corpus
+    - vocabulary_size (int): The vocabulary size of the synthetic corpus
+    - words (int): The number of words per sentence
+    - sentences (int): The number of sentences per record
+    - records (int): The number of records sampled
+    - seed (int): The seed of the random number generators
+
+    Returns: list of dict
+    '''
+    if corpus is None:
+        corpus = get_synthetic_corpus(number_of_tokens, vocabulary_size, seed)
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for engine_type in ENGINES:
+            path = os.path.join(directory, engine_type)
+            train_seconds = _run_isolated(_train, (engine_type, corpus, path))
+            result = _run_isolated(_sample, (engine_type, path, words,
+                                             sentences, records, seed))
+            result['train_seconds'] = round(train_seconds, 3)
+            result['model_bytes'] = os.path.getsize(path)
+            logging.info('{engine_type}: trained in {train_seconds}s, '
+                         '{tokens_per_sec} tokens/sec, pickled model '
+                         '{model_bytes} bytes, loaded model RSS '
+                         '{model_rss_kb} KB, process peak RSS {peak_rss_kb} '
+                         'KB'.format(**result))
+            results.append(result)
+    finally:
+        shutil.rmtree(directory)
+    return results
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import gc
+import json
+import time
+import random
+import logging
+import platform
+import multiprocessing
+import numpy
+import app as topics_server
+from app.config import settings
+from app.corpus.generator import TextGenerator
+from app.corpus.generator import load_corpus
+from app.topic.analyzer import TopicAnalyzer
+from app.topic.cache import TopicModelCache
+from app.topic.cache import get_corpus_fingerprint
+from benchmarks.markov import get_rss
+from benchmarks.synthetic import get_synthetic_corpus
+
+logging.basicConfig(level=logging.INFO)
+
+# The stages of TopicAnalyzer, in the order they run
+STAGES = ('tokenize', 'dictionary', 'bow', 'tfidf', 'lsi', 'lda', 'json')
+
+# The end-points requested through the Flask test client, by name
+REQUESTS = (
+    ('tfidf', '/topics/tfidf/benchmark'),
+    ('lsi', '/topics/lsi/benchmark'),
+    ('lda', '/topics/lda/benchmark?passes={passes}'),
+    ('all', '/topics/all/benchmark?passes={passes}'),
+    ('tfidf_columnar', '/topics/tfidf/benchmark?format=columnar')
+)
+
+
+class _StubSearch(object):
+    '''
+    This class stands in for app.utils.es.Search in the end-to-end requests,
+    so that they return the synthetic corpus without an Elasticsearch
+    cluster.
+    '''
+
+    documents = []
+
+    def get(self, term):
+        return self.documents
+
+    def stream(self, term):
+        return self.documents
+
+
+def get_documents(number_of_documents, corpus=None,
+                  engine_type='compactmarkovchain', words_per_sentence=20,
+                  sentences_per_document=3, seed=0):
+    '''
+    This function synthesizes the documents of a benchmark corpus with
+    TextGenerator, trained on the passed text (on the reference corpus of
+    settings when None, or on a synthetic one when that is unavailable) and
+    sampled with a fixed seed, so that every run sees the same documents.
+
+    Params:
+    -------
+    - number_of_documents (int): The number of documents
+    - corpus (str): The text the generator is trained on
+    - engine_type (str): The engine of the generator (see ENGINE_TYPES)
+    - words_per_sentence (int): The number of words per sentence
+    - sentences_per_document (int): The number of sentences per document
+    - seed (int): The seed of the generator
+
+    Returns: list of str
+    '''
+    generator = TextGenerator()
+    if not corpus:
+        try:
+            corpus = load_corpus(generator)
+        except Exception, error:
+            logging.error('get_documents: Error occurred - {0}'.format(
+                str(error)))
+    if not corpus:
+        logging.info('Training the generator on a synthetic corpus')
+        corpus = get_synthetic_corpus(200000, 5000, seed)
+    engine = generator.train_engine(engine_type, corpus)
+    return [text for (_, text) in generator.generate_shard_records(
+        engine_type, engine, 0, 0, number_of_documents, seed, False,
+        words_per_sentence, sentences_per_document)]
+
+
+def _measure(function):
+    '''
+    This is a utility function that times a call, along with the growth of
+    the resident set size it causes and the peak resident set size of the
+    process after it (Python 2 has no tracemalloc, so memory is measured at
+    the process level).
+
+    Returns: tuple (result, dict)
+    '''
+    gc.collect()
+    rss_before, _ = get_rss()
+    start = time.time()
+    result = function()
+    seconds = time.time() - start
+    rss_after, peak_rss = get_rss()
+    return result, {
+        'seconds': seconds,
+        'rss_kb': rss_after - rss_before,
+        'peak_rss_kb': peak_rss
+    }
+
+
+def _run_stages(documents, frequency_floor, num_topics, passes):
+    '''
+    This function runs the stages of TopicAnalyzer one at a time on a fresh
+    analyzer. 'dictionary' builds the Dictionary along with the
+    document-term matrix, and 'json' times the JSON output methods of the
+    analyzer for the three models (TF-IDF on the configured backend), the
+    fitted LSI and LDA models being served from the model cache so that
+    they are not fitted again.
+
+    Returns: dict
+    '''
+    lsi_params = {'frequency_floor': frequency_floor,
+                  'num_topics': num_topics}
+    lda_params = dict(lsi_params, sample_ratio=5, workers=None,
+                      chunksize=None, passes=passes)
+    topics = TopicAnalyzer(documents, token_cache={})
+    # The model cache of the run, empty whatever the settings
+    model_cache = topics._model_cache = TopicModelCache(
+        settings.TOPIC_MODEL_CACHE_MEMORY_MB * 1024 * 1024)
+
+    def get_tfidf():
+        topics.get_tfidf(frequency_floor)
+
+    def get_lsi():
+        lsi, _ = topics.get_lsi_model(frequency_floor, num_topics)
+        model_cache.put(get_corpus_fingerprint(documents, 'lsi', lsi_params),
+                        'lsi', lsi, None)
+
+    def get_lda():
+        lda, _ = topics.get_lda_model(**lda_params)
+        model_cache.put(get_corpus_fingerprint(documents, 'lda', lda_params),
+                        'lda', lda, None)
+
+    def get_json():
+        topics.get_tfidf_as_json(frequency_floor)
+        topics.get_lsi(frequency_floor, num_topics)
+        topics.get_lda(**lda_params)
+
+    functions = {
+        'tokenize': topics.fill_token_cache,
+        'dictionary': lambda: topics.get_matrix(frequency_floor),
+        'bow': lambda: topics.get_bow(frequency_floor),
+        'tfidf': get_tfidf,
+        'lsi': get_lsi,
+        'lda': get_lda,
+        'json': get_json
+    }
+    stages = {}
+    for stage in STAGES:
+        _, stages[stage] = _measure(functions[stage])
+    return stages
+
+
+def _run_requests(documents, passes):
+    '''
+    This function requests the topic end-points through the Flask test
+    client, with _StubSearch in place of Search and without global models.
+
+    Returns: dict
+    '''
+    search, get_global_model = (topics_server.Search,
+                                topics_server.get_global_model)
+    _StubSearch.documents = documents
+    topics_server.Search = _StubSearch
+    topics_server.get_global_model = lambda: None
+    client = topics_server.topics_app.test_client()
+    requests = {}
+    try:
+        for name, url in REQUESTS:
+            response, requests[name] = _measure(
+                lambda: client.get(url.format(passes=passes)))
+            requests[name]['status'] = response.status_code
+            requests[name]['bytes'] = len(response.data)
+    finally:
+        topics_server.Search = search
+        topics_server.get_global_model = get_global_model
+    return requests
+
+
+def _get_best(runs):
+    '''
+    This is a utility function that keeps the best time of every stage (or
+    request) over several runs, and the memory figures of the first one.
+
+    Returns: dict
+    '''
+    best = {}
+    for name, measure in runs[0].iteritems():
+        best[name] = dict(measure)
+        best[name]['seconds'] = round(min(run[name]['seconds']
+                                          for run in runs), 4)
+    return best
+
+
+def run_size(args):
+    '''
+    This function benchmarks one corpus size. It is the entry point of the
+    process every size runs in, so that the peak resident set size is that
+    of the size alone. The model cache is disabled, so that every run fits
+    the models.
+
+    Params:
+    -------
+    - args (tuple): The documents, the frequency floor, the number of
+    topics, the number of LDA passes, the number of runs and the seed
+
+    Returns: dict
+    '''
+    documents, frequency_floor, num_topics, passes, repeat, seed = args
+    settings.TOPIC_MODEL_CACHE_ENABLED = False
+    numpy.random.seed(seed)
+    random.seed(seed)
+    gc.collect()
+    baseline_rss, _ = get_rss()
+    stages = []
+    requests = []
+    for _ in xrange(repeat):
+        stages.append(_run_stages(documents, frequency_floor, num_topics,
+                                  passes))
+        requests.append(_run_requests(documents, passes))
+    _, peak_rss = get_rss()
+    return {
+        'documents': len(documents),
+        'baseline_rss_kb': baseline_rss,
+        'peak_rss_kb': peak_rss,
+        'stages': _get_best(stages),
+        'requests': _get_best(requests)
+    }
+
+
+def _run_isolated(pool, function, args):
+    try:
+        return pool.apply(function, (args,))
+    finally:
+        pool.terminate()
+
+
+def run(document_counts=(1000, 10000), output_path='benchmark.json',
+        corpus=None, engine_type='compactmarkovchain', words_per_sentence=20,
+        sentences_per_document=3, frequency_floor=1, num_topics=5, passes=1,
+        repeat=3, seed=0):
+    '''
+    This function runs the benchmark suite: for every corpus size, it times
+    each stage of TopicAnalyzer (see STAGES) and the topic end-points (see
+    REQUESTS) on documents synthesized by TextGenerator, in a process of its
+    own, and writes the results to a JSON file (see compare). The processes
+    are forked before the documents are synthesized, so that their memory
+    figures only account for the documents they are sent.
+
+    Params:
+    -------
+    - document_counts (list): The corpus sizes benchmarked
+    - output_path (str): The path of the results file
+    - corpus (str): The text the generator is trained on (see
+    get_documents)
+    - engine_type (str): The engine of the generator
+    - words_per_sentence (int): The number of words per sentence
+    - sentences_per_document (int): The number of sentences per document
+    - frequency_floor (int): The frequency floor of the dictionary
+    - num_topics (int): The number of LSI and LDA topics
+    - passes (int): The number of LDA passes
+    - repeat (int): The number of runs the best time is taken over
+    - seed (int): The seed of the generator and of the models
+
+    Returns: dict
+    '''
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpus': multiprocessing.cpu_count(),
+        'seed': seed,
+        'engine_type': engine_type,
+        'settings': {
+            'TFIDF_BACKEND': settings.TFIDF_BACKEND,
+            'TOKENIZER_STOPWORDS': settings.TOKENIZER_STOPWORDS,
+            'TOKENIZER_STEMMER': settings.TOKENIZER_STEMMER,
+            'LDA_WORKERS': settings.LDA_WORKERS
+        },
+        'results': []
+    }
+    pools = [multiprocessing.Pool(1) for _ in document_counts]
+    try:
+        documents = get_documents(max(document_counts), corpus, engine_type,
+                                  words_per_sentence, sentences_per_document,
+                                  seed)
+        for pool, number_of_documents in zip(pools, document_counts):
+            result = _run_isolated(pool, run_size, (
+                documents[:number_of_documents], frequency_floor,
+                num_topics, passes, repeat, seed))
+            for section in ('stages', 'requests'):
+                for name, measure in sorted(result[section].iteritems()):
+                    logging.info('{0} documents, {1} {2}: {seconds}s '
+                                 '({rss_kb} KB, peak RSS {peak_rss_kb} '
+                                 'KB)'.format(number_of_documents,
+                                              section[:-1], name, **measure))
+            report['results'].append(result)
+    finally:
+        for pool in pools:
+            pool.terminate()
+    with open(output_path, 'w') as output_file:
+        json.dump(report, output_file, indent=2, sort_keys=True)
+    logging.info('Wrote the results to {0}'.format(output_path))
+    return report
+
+
+def compare(baseline_path, current_path, threshold=0.1, min_seconds=0.01):
+    '''
+    This function compares two results files of run, flagging as slowdowns
+    the stages and requests that take more than 'threshold' (relatively)
+    and 'min_seconds' (absolutely) longer, and the corpus sizes whose peak
+    resident set size grows by more than 'threshold'.
+
+    Params:
+    -------
+    - baseline_path (str): The path of the reference results
+    - current_path (str): The path of the results compared to them
+    - threshold (float): The relative slowdown flagged, e.g. 0.1 for 10%
+    - min_seconds (float): The smallest slowdown flagged, in seconds, below
+    which timings are noise
+
+    Returns: list of dict (the slowdowns)
+    '''
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(current_path) as current_file:
+        current = json.load(current_file)
+    baseline_results = dict((result['documents'], result) for result in
+                            baseline['results'])
+    slowdowns = []
+    for result in current['results']:
+        reference = baseline_results.get(result['documents'])
+        if reference is None:
+            continue
+        comparisons = [('memory', 'peak_rss_kb', reference['peak_rss_kb'],
+                        result['peak_rss_kb'], 0)]
+        for section in ('stages', 'requests'):
+            for name in sorted(set(reference[section]) &
+                               set(result[section])):
+                comparisons.append((section[:-1], name,
+                                    reference[section][name]['seconds'],
+                                    result[section][name]['seconds'],
+                                    min_seconds))
+        for kind, name, before, after, minimum in comparisons:
+            ratio = float(after) / before if before else None
+            slower = after - before > minimum and \
+                (ratio is None or ratio > 1 + threshold)
+            logging.info('{0} documents, {1} {2}: {3} -> {4}{5}{6}'.format(
+                result['documents'], kind, name, before, after,
+                ' ({0:+.1%})'.format(ratio - 1) if ratio is not None else '',
+                '' if not slower else ' LARGER' if kind == 'memory' else
+                ' SLOWER'))
+            if slower:
+                slowdowns.append({
+                    'documents': result['documents'],
+                    'kind': kind,
+                    'name': name,
+                    'baseline': before,
+                    'current': after,
+                    'ratio': round(ratio, 3) if ratio is not None else None
+                })
+    logging.info('{0} slowdown(s) over {1:.0%}'.format(len(slowdowns),
+                                                        threshold))
+    return slowdowns
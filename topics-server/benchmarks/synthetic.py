@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import bisect
+import random
+
+# The number of words per sentence of get_synthetic_corpus
+_WORDS_PER_SENTENCE = 20
+
+
+def _get_vocabulary(vocabulary_size):
+    return ['w{0}'.format(word) for word in xrange(vocabulary_size)]
+
+
+def _get_zipf_weights(vocabulary_size):
+    '''
+    This is a utility function that returns the cumulative weights of a Zipf
+    distribution over the ranks of a vocabulary.
+
+    Returns: list of float
+    '''
+    cumulative_weights = []
+    total = 0.0
+    for rank in xrange(1, vocabulary_size + 1):
+        total += 1.0 / rank
+        cumulative_weights.append(total)
+    return cumulative_weights
+
+
+def _iter_zipf_words(rng, vocabulary, cumulative_weights, number_of_words):
+    total = cumulative_weights[-1]
+    last = len(vocabulary) - 1
+    for _ in xrange(number_of_words):
+        yield vocabulary[min(bisect.bisect_right(
+            cumulative_weights, rng.random() * total), last)]
+
+
+def get_synthetic_documents(number_of_documents, words_per_document,
+                            vocabulary_size, seed=0, num_topics=None):
+    '''
+    This function builds synthetic documents, so that the benchmarks do not
+    depend on an index: Zipf-distributed words by default or, when
+    'num_topics' is set, words drawn from a known mixture of topics (each
+    topic being a random slice of the vocabulary), so that LDA has structure
+    to recover.
+
+    Params:
+    -------
+    - number_of_documents (int): The number of documents
+    - words_per_document (int): The number of words per document
+    - vocabulary_size (int): The number of distinct words
+    - seed (int): The seed of the random number generator
+    - num_topics (int): The number of topics the documents are drawn from;
+    None for Zipf-distributed words
+
+    Returns: list of str
+    '''
+    rng = random.Random(seed)
+    vocabulary = _get_vocabulary(vocabulary_size)
+    documents = []
+    if num_topics:
+        topic_size = max(vocabulary_size // num_topics, 1)
+        topics = [rng.sample(vocabulary, topic_size)
+                  for _ in xrange(num_topics)]
+        for _ in xrange(number_of_documents):
+            mixture = rng.sample(topics, min(2, num_topics))
+            documents.append(' '.join(rng.choice(rng.choice(mixture))
+                                      for _ in xrange(words_per_document)))
+        return documents
+    cumulative_weights = _get_zipf_weights(vocabulary_size)
+    for _ in xrange(number_of_documents):
+        documents.append(' '.join(_iter_zipf_words(
+            rng, vocabulary, cumulative_weights, words_per_document)))
+    return documents
+
+
+def get_synthetic_corpus(number_of_tokens, vocabulary_size, seed=0):
+    '''
+    This function builds a corpus of Zipf-distributed words, split into
+    sentences, for the text generator to be trained on without downloaded
+    corpora.
+
+    Params:
+    -------
+    - number_of_tokens (int): The approximate size of the corpus
+    - vocabulary_size (int): The number of distinct words
+    - seed (int): The seed of the random number generator
+
+    Returns: str
+    '''
+    rng = random.Random(seed)
+    words = []
+    for position, word in enumerate(_iter_zipf_words(
+            rng, _get_vocabulary(vocabulary_size),
+            _get_zipf_weights(vocabulary_size), number_of_tokens)):
+        words.append(word)
+        if position % _WORDS_PER_SENTENCE == _WORDS_PER_SENTENCE - 1:
+            words.append('.')
+    return ' '.join(words)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import time
+import logging
+from app.config import settings
+from app.topic.analyzer import TopicAnalyzer
+from app.topic.tfidf import TFIDF_BACKENDS
+from benchmarks.synthetic import get_synthetic_documents
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _time_backend(documents, token_cache, tfidf_backend, frequency_floor,
+                  repeat):
+    seconds = []
+    for _ in xrange(repeat):
+        topics = TopicAnalyzer(documents, token_cache=token_cache,
+                               tfidf_backend=tfidf_backend)
+        start = time.time()
+        json_data = topics.get_tfidf_as_json(frequency_floor)
+        seconds.append(time.time() - start)
+    return min(seconds), json_data
+
+
+def run(document_counts=(1000, 10000, 100000), words_per_document=50,
+        vocabulary_size=50000, frequency_floor=1, repeat=3, seed=0):
+    '''
+    This function compares the TF-IDF backends on synthetic corpora of
+    increasing size, timing the JSON output of /topics/tfidf from the
+    tokenized documents: the bag-of-words corpus weighted document by
+    document with gensim ('gensim'), against the document-term matrix
+    weighted at once ('sparse'). The documents are tokenized beforehand and
+    the model cache is disabled, so that every run fits the model. The
+    outputs of the backends are checked to be identical.
+
+    Params:
+    -------
+    - document_counts (list): The corpus sizes compared
+    - words_per_document (int): The number of words per document
+    - vocabulary_size (int): The vocabulary size of the synthetic corpora
+    - frequency_floor (int): The frequency floor of the dictionary
+    - repeat (int): The number of runs the best time is taken over
+    - seed (int): The seed of the random number generator
+
+    Returns: list of dict
+    '''
+    cache_enabled = settings.TOPIC_MODEL_CACHE_ENABLED
+    settings.TOPIC_MODEL_CACHE_ENABLED = False
+    results = []
+    try:
+        for number_of_documents in document_counts:
+            documents = get_synthetic_documents(number_of_documents,
+                                                words_per_document,
+                                                vocabulary_size, seed)
+            token_cache = {}
+            TopicAnalyzer(documents, token_cache=token_cache) \
+                .fill_token_cache()
+            result = {'documents': number_of_documents}
+            outputs = []
+            for tfidf_backend in TFIDF_BACKENDS:
+                seconds, json_data = _time_backend(documents, token_cache,
+                                                   tfidf_backend,
+                                                   frequency_floor, repeat)
+                outputs.append(json_data)
+                result[tfidf_backend] = {
+                    'seconds': round(seconds, 3),
+                    'documents_per_sec': int(number_of_documents / seconds)
+                    if seconds else 0,
+                    'bytes': len(json_data)
+                }
+                logging.info('{0} documents, {1}: {seconds}s '
+                             '({documents_per_sec} documents/sec, {bytes} '
+                             'bytes)'.format(number_of_documents,
+                                             tfidf_backend,
+                                             **result[tfidf_backend]))
+            result['identical'] = len(set(outputs)) == 1
+            result['speedup'] = round(result['gensim']['seconds'] /
+                                      result['sparse']['seconds'], 2) \
+                if result['sparse']['seconds'] else None
+            logging.info('{documents} documents: {speedup}x speedup, '
+                         'identical output: {identical}'.format(**result))
+            results.append(result)
+    finally:
+        settings.TOPIC_MODEL_CACHE_ENABLED = cache_enabled
+    return results
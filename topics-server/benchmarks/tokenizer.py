@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import time
+import logging
+from gensim import corpora
+from collections import defaultdict
+from app.topic.tokenizer import STOPWORD_SETS
+from app.topic.tokenizer import Tokenizer
+from benchmarks.synthetic import get_synthetic_documents
+
+logging.basicConfig(level=logging.INFO)
+
+
+def get_legacy_bow(documents, frequency_floor=1, split=False):
+    '''
+    This function replicates the preprocessing of TopicAnalyzer before the
+    tokenizer was introduced: tokens are the characters of the documents
+    (their words when 'split' is set), counted and filtered by the floor in
+    Python before the Dictionary and bag-of-words are built.
+
+    Returns: tuple (corpora.Dictionary, list of bag-of-words)
+    '''
+    stoplist = STOPWORD_SETS['default']
+    tokenized = [[token for token in (document.lower().split() if split
+                                      else document.lower())
+                  if token not in stoplist] for document in documents]
+    frequencies = defaultdict(int)
+    for tokens in tokenized:
+        for token in tokens:
+            frequencies[token] += 1
+    tokenized = [[token for token in tokens if frequencies[token] >
+                  frequency_floor] for tokens in tokenized]
+    dictionary = corpora.Dictionary(tokenized)
+    return dictionary, [dictionary.doc2bow(tokens) for tokens in tokenized]
+
+
+def get_tokenizer_bow(tokenizer, documents, frequency_floor=1):
+    '''
+    This function preprocesses the documents the way TopicAnalyzer does.
+
+    Returns: tuple (corpora.Dictionary, list of bag-of-words)
+    '''
+    return tokenizer.get_bow([tokenizer.encode(document)
+                              for document in documents], frequency_floor)
+
+
+def _time(function, *args, **kwargs):
+    start = time.time()
+    dictionary, _ = function(*args, **kwargs)
+    return time.time() - start, len(dictionary)
+
+
+def run(document_counts=(10000, 100000, 1000000), words_per_document=50,
+        vocabulary_size=50000, legacy_max_documents=100000, seed=0):
+    '''
+    This function compares the preprocessing of the legacy path with the
+    tokenizer, cold (empty vocabulary) and warm (every word interned), on
+    corpora of increasing size. The legacy path is skipped above
+    'legacy_max_documents' documents, as it holds every character of the
+    corpus as a Python string.
+
+    Params:
+    -------
+    - document_counts (list): The corpus sizes compared
+    - words_per_document (int): The number of words per document
+    - vocabulary_size (int): The vocabulary size of the synthetic corpora
+    - legacy_max_documents (int): The largest corpus the legacy path runs on
+    - seed (int): The seed of the random number generator
+
+    Returns: list of dict
+    '''
+    results = []
+    for number_of_documents in document_counts:
+        documents = get_synthetic_documents(number_of_documents,
+                                            words_per_document,
+                                            vocabulary_size, seed)
+        result = {'documents': number_of_documents}
+        if number_of_documents <= legacy_max_documents:
+            result['legacy_chars'] = _time(get_legacy_bow, documents)
+            result['legacy_words'] = _time(get_legacy_bow, documents,
+                                           split=True)
+        tokenizer = Tokenizer(STOPWORD_SETS['default'])
+        result['tokenizer_cold'] = _time(get_tokenizer_bow, tokenizer,
+                                         documents)
+        result['tokenizer_warm'] = _time(get_tokenizer_bow, tokenizer,
+                                         documents)
+        for path in ('legacy_chars', 'legacy_words', 'tokenizer_cold',
+                     'tokenizer_warm'):
+            if path not in result:
+                logging.info('{0} documents, {1}: skipped'.format(
+                             number_of_documents, path))
+                continue
+            seconds, number_of_tokens = result[path]
+            result[path] = {
+                'seconds': round(seconds, 3),
+                'documents_per_sec': int(number_of_documents / seconds)
+                if seconds else 0,
+                'tokens': number_of_tokens
+            }
+            logging.info('{0} documents, {1}: {seconds}s ({documents_per_sec}'
+                         ' documents/sec, {tokens} distinct tokens)'.format(
+                             number_of_documents, path, **result[path]))
+        if 'legacy_words' in result:
+            result['speedup'] = round(result['legacy_words']['seconds'] /
+                                      result['tokenizer_warm']['seconds'], 2) \
+                if result['tokenizer_warm']['seconds'] else None
+        results.append(result)
+    return results
@@ -1,9 +1,23 @@
 from __future__ import absolute_import
+import os
 import logging
+from datetime import datetime
 from flask_script import Manager
 from app import topics_app
 from app.corpus.generator import generate
 from app.utils.indexer import index
+from app.utils.pipeline import run_pipeline as generate_and_index
+from app.topic.model import train_global_models
+from app.topic.jobs import run_workers
+from app.config import settings
+from app.corpus.cache import EngineCache
+from app.topic.cache import TopicModelCache
+from benchmarks import lda as lda_benchmark
+from benchmarks import encoding as encoding_benchmark
+from benchmarks import markov as markov_benchmark
+from benchmarks import suite as benchmark_suite
+from benchmarks import tfidf as tfidf_benchmark
+from benchmarks import tokenizer as tokenizer_benchmark
 
 logging.basicConfig(level=logging.INFO)
 
@@ -21,6 +35,132 @@ def run_generator():
     generate()
 
 
+@manager.command
+def run_pipeline():
+    logging.info("Running generate-to-index pipeline")
+    generate_and_index()
+
+
+@manager.command
+def train_topic_models():
+    logging.info("Training global topic models")
+    train_global_models()
+
+
+@manager.command
+def run_topic_workers(workers=None):
+    logging.info("Running topic job workers")
+    run_workers(int(workers) if workers else None)
+
+
+@manager.command
+def list_generator_models():
+    cache = EngineCache(settings.GENERATOR_MODEL_CACHE_DIRECTORY)
+    for entry in cache.list():
+        logging.info('{0} {1} {2} bytes, created {3}, parameters {4}'.format(
+                     entry['key'], entry['engine_type'], entry['size'],
+                     datetime.fromtimestamp(entry['created']).isoformat(),
+                     entry['parameters']))
+
+
+@manager.command
+def prune_generator_models(max_age_days=None, keep=None):
+    cache = EngineCache(settings.GENERATOR_MODEL_CACHE_DIRECTORY)
+    removed = cache.prune(
+        max_age_days=float(max_age_days) if max_age_days else None,
+        keep=int(keep) if keep else None)
+    for entry in removed:
+        logging.info('Removed {0} {1}'.format(entry['key'],
+                                              entry['engine_type']))
+
+
+@manager.command
+def list_topic_models():
+    cache = TopicModelCache(0, os.path.abspath(
+        settings.TOPIC_MODEL_CACHE_DIRECTORY))
+    for entry in cache.list():
+        logging.info('{0} {1} bytes, saved {2}'.format(
+                     entry['key'], entry['size'],
+                     datetime.fromtimestamp(entry['created']).isoformat()))
+
+
+@manager.command
+def prune_topic_models(max_age_days=None, keep=None):
+    cache = TopicModelCache(0, os.path.abspath(
+        settings.TOPIC_MODEL_CACHE_DIRECTORY))
+    removed = cache.prune(
+        max_age_days=float(max_age_days) if max_age_days else None,
+        keep=int(keep) if keep else None)
+    for entry in removed:
+        logging.info('Removed {0} {1} bytes'.format(entry['key'],
+                                                    entry['size']))
+
+
+@manager.command
+def bench_markov(corpus_path=None, tokens=1000000, records=10000):
+    corpus = None
+    if corpus_path:
+        with open(corpus_path) as corpus_file:
+            corpus = corpus_file.read()
+    markov_benchmark.run(corpus=corpus, number_of_tokens=int(tokens),
+                         records=int(records))
+
+
+
+@manager.command
+def bench_lda(documents=20000, topics=20, workers=None, chunksize=None,
+              passes=1):
+    worker_counts = None
+    if workers:
+        worker_counts = [int(count) for count in workers.split(',')]
+    lda_benchmark.run(number_of_documents=int(documents),
+                      num_topics=int(topics), worker_counts=worker_counts,
+                      chunksize=int(chunksize) if chunksize else None,
+                      passes=int(passes))
+
+
+@manager.command
+def bench_tokenizer(documents='10000,100000,1000000', words=50,
+                    legacy_max_documents=100000):
+    tokenizer_benchmark.run(
+        document_counts=[int(count) for count in documents.split(',')],
+        words_per_document=int(words),
+        legacy_max_documents=int(legacy_max_documents))
+
+
+@manager.command
+def bench_encoding(documents=10000, words=50, models='tfidf,lda'):
+    encoding_benchmark.run(number_of_documents=int(documents),
+                           words_per_document=int(words),
+                           model_types=models.split(','))
+
+
+@manager.command
+def bench_tfidf(documents='1000,10000,100000', words=50, floor=1):
+    tfidf_benchmark.run(
+        document_counts=[int(count) for count in documents.split(',')],
+        words_per_document=int(words), frequency_floor=int(floor))
+
+
+@manager.command
+def bench(documents='1000,10000', output='benchmark.json', corpus_path=None,
+          engine='compactmarkovchain', repeat=3, seed=0):
+    corpus = None
+    if corpus_path:
+        with open(corpus_path) as corpus_file:
+            corpus = corpus_file.read()
+    benchmark_suite.run(
+        document_counts=[int(count) for count in documents.split(',')],
+        output_path=output, corpus=corpus,
+        engine_type=engine, repeat=int(repeat),
+        seed=int(seed))
+
+
+@manager.command
+def bench_compare(baseline, current, threshold=0.1):
+    if benchmark_suite.compare(baseline, current, float(threshold)):
+        return 1
+
 
 if __name__ == "__main__":
     manager.run()
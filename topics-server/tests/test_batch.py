@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import unittest
+import multiprocessing
+from app.config import settings
+from app.topic import batch
+from app.topic.analyzer import get_lda_workers
+from benchmarks.synthetic import get_synthetic_documents
+
+
+class _StubSearch(object):
+    '''
+    This class stands in for the Search of run_batch: every term matches
+    the same synthetic documents.
+    '''
+
+    documents = get_synthetic_documents(40, 20, 60, num_topics=3)
+
+    def get_many(self, search_terms, timeout=None):
+        return dict((search_term, list(self.documents))
+                    for search_term in search_terms), set()
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = (settings.LDA_MULTICORE_MIN_DOCUMENTS,
+                         settings.LDA_CHUNK_SIZE,
+                         settings.LDA_WORKERS,
+                         settings.BATCH_WORKERS,
+                         settings.TOPIC_MODEL_CACHE_ENABLED)
+        settings.LDA_MULTICORE_MIN_DOCUMENTS = 20
+        settings.LDA_CHUNK_SIZE = 10
+        settings.LDA_WORKERS = 2
+        settings.BATCH_WORKERS = 2
+        settings.TOPIC_MODEL_CACHE_ENABLED = False
+        self.functions = (multiprocessing.cpu_count, batch.Search,
+                          batch.get_global_model)
+        multiprocessing.cpu_count = lambda: 2
+        batch.Search = _StubSearch
+        batch.get_global_model = lambda: None
+
+    def tearDown(self):
+        (settings.LDA_MULTICORE_MIN_DOCUMENTS,
+         settings.LDA_CHUNK_SIZE,
+         settings.LDA_WORKERS,
+         settings.BATCH_WORKERS,
+         settings.TOPIC_MODEL_CACHE_ENABLED) = self.settings
+        (multiprocessing.cpu_count, batch.Search,
+         batch.get_global_model) = self.functions
+
+    def test_lda_above_the_multicore_threshold(self):
+        self.assertGreater(get_lda_workers(40), 1)
+        data = batch.run_batch(['freedom', 'nation', 'freedom'],
+                               ['tfidf', 'lda'], {'num_topics': 3})
+        self.assertEqual(sorted(data['results']), ['freedom', 'nation'])
+        self.assertEqual(data['timed_out'], [])
+        for result in data['results'].itervalues():
+            self.assertEqual(result['status'], 'ok')
+            self.assertEqual(result['documents'], 40)
+            self.assertTrue(result['tfidf'])
+            self.assertTrue(result['lda'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import csv
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from app.corpus.cache import TaggedCorpusCache
+
+# What the tagger produces for a UTF-8 corpus: byte strings
+_SENTENCES = [[('the', 'AT'), ('caf\xc3\xa9', 'NN'), ('opens', 'VBZ')],
+              [('na\xc3\xafve', 'JJ'), ('rivers', 'NNS')]]
+
+
+class TaggedCorpusCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = TaggedCorpusCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_keeps_byte_strings(self):
+        tags = sorted(set(tag for sequence in _SENTENCES
+                          for _, tag in sequence))
+        symbols = sorted(set(word for sequence in _SENTENCES
+                             for word, _ in sequence))
+        self.cache.put('hash', _SENTENCES, tags, symbols)
+        (sentences, cached_tags, cached_symbols) = self.cache.get('hash')
+        self.assertEqual(sentences, _SENTENCES)
+        self.assertEqual(cached_tags, tags)
+        self.assertEqual(cached_symbols, symbols)
+        self.assertTrue(all(isinstance(text, str) for sequence in sentences
+                            for token in sequence for text in token))
+        self.assertTrue(all(isinstance(text, str) for text in
+                            cached_tags + cached_symbols))
+        # What the generator does with the sampled words
+        csv.writer(StringIO()).writerow([word for sequence in sentences
+                                         for word, _ in sequence])
+
+    def test_missing_entry(self):
+        self.assertIsNone(self.cache.get('unknown'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import struct
+import unittest
+import numpy
+from gensim import corpora
+from app.topic.encoding import BINARY_MAGIC
+from app.topic.encoding import decode_binary
+from app.topic.encoding import encode_binary
+from app.topic.encoding import get_columns
+
+_RECORDS = [
+    [(0, 0.5), (2, 0.25)],
+    [],
+    [(1, 1.0 / 3)],
+    [(0, -0.125), (1, 0.75), (2, 2.5)]
+]
+
+
+class BinaryEncodingTest(unittest.TestCase):
+
+    def assertRoundTrip(self, columns):
+        decoded = decode_binary(encode_binary(columns))
+        self.assertEqual(decoded['offsets'].tolist(),
+                         columns['offsets'].tolist())
+        self.assertEqual(decoded['ids'].tolist(), columns['ids'].tolist())
+        self.assertEqual(decoded['values'].tolist(),
+                         columns['values'].astype(numpy.float32).tolist())
+        for name in ('tokens', 'words'):
+            self.assertEqual(decoded.get(name), columns.get(name))
+        return decoded
+
+    def test_round_trip(self):
+        self.assertRoundTrip(get_columns(_RECORDS))
+
+    def test_round_trip_with_tokens(self):
+        dictionary = corpora.Dictionary([[u'river', u'caf\xe9', u'дом']])
+        decoded = self.assertRoundTrip(get_columns(_RECORDS, dictionary))
+        self.assertNotIn('words', decoded)
+
+    def test_round_trip_with_words(self):
+        records = [[(0, 0.5, u'river'), (2, 0.25, u'caf\xe9')], [],
+                   [(1, 0.75, u'дом')]]
+        decoded = self.assertRoundTrip(get_columns(records))
+        self.assertNotIn('tokens', decoded)
+
+    def test_round_trip_without_documents(self):
+        decoded = self.assertRoundTrip(get_columns([]))
+        self.assertEqual(decoded['offsets'].tolist(), [0])
+
+    def test_header(self):
+        data = encode_binary(get_columns(_RECORDS))
+        self.assertEqual(data[:4], BINARY_MAGIC)
+        self.assertEqual(struct.unpack_from('<IIII', data, 4),
+                         (4, 6, 0, 0))
+        self.assertEqual(len(data), 20 + 5 * 4 + 6 * 4 + 6 * 4)
+
+    def test_other_payloads_are_rejected(self):
+        data = encode_binary(get_columns(_RECORDS))
+        self.assertRaises(ValueError, decode_binary, 'TPC1' + data[4:])
+        self.assertRaises(ValueError, decode_binary, 'JSON' + data[4:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import json
+import unittest
+import app as topics_server
+
+
+class ResponseFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = topics_server.topics_app.test_client()
+
+    def test_unknown_format(self):
+        response = self.client.get('/topics/tfidf/freedom?format=xml')
+        self.assertEqual(response.status_code, 406)
+        error = json.loads(response.data)['error']
+        self.assertTrue(error.startswith('Unknown or unavailable format'))
+        self.assertIn('binary', error)
+
+    def test_binary_format_of_all_models(self):
+        response = self.client.get('/topics/all/freedom?format=binary')
+        self.assertEqual(response.status_code, 406)
+        error = json.loads(response.data)['error']
+        self.assertIn('/topics/all', error)
+        self.assertNotIn('binary,', error)
+        self.assertNotIn(', binary', error)
+
+    def test_binary_is_not_negotiated_for_all_models(self):
+        with topics_server.topics_app.test_request_context(
+                '/topics/all/freedom',
+                headers={'Accept': 'application/vnd.topics.float32'}):
+            self.assertEqual(topics_server.get_response_format(), 'binary')
+            self.assertEqual(topics_server.get_response_format(
+                ['json', 'columnar']), 'json')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+from app.config import settings
+from app.corpus.generator import TextGenerator
+
+# The cfg engine is trained without tokenizing, i.e. without NLTK data
+_GRAMMAR = '''
+S -> NP VP
+NP -> Det N | Det Adj N
+VP -> V NP | V
+Det -> 'the' | 'a'
+Adj -> 'quiet' | 'frozen' | 'wide'
+N -> 'river' | 'valley' | 'forest' | 'glacier'
+V -> 'crosses' | 'floods' | 'carves'
+'''
+
+
+class GeneratorSeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = (settings.GENERATOR_MODEL_CACHE_ENABLED,
+                         settings.GENERATOR_SEED)
+        settings.GENERATOR_MODEL_CACHE_ENABLED = False
+        settings.GENERATOR_SEED = 7
+        self.generator = TextGenerator()
+
+    def tearDown(self):
+        (settings.GENERATOR_MODEL_CACHE_ENABLED,
+         settings.GENERATOR_SEED) = self.settings
+        shutil.rmtree(self.directory)
+
+    def generate_records(self, generate_uuids=False, seed=None):
+        return self.generator.generate_array_of_records(
+            'cfg', generate_uuids, _GRAMMAR, 8, 2, 25, seed)
+
+    def generate_sharded_csv(self, number_of_shards, seed):
+        output_file_name = os.path.join(self.directory, 'records.csv')
+        self.generator.generate_sharded_csv(
+            'cfg', True, _GRAMMAR, 8, 2, 25, output_file_name, '\t',
+            number_of_shards, 2, seed)
+        with open(output_file_name) as output_file:
+            return output_file.read()
+
+    def test_records_are_reproducible(self):
+        records = self.generate_records()
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records, self.generate_records())
+        self.assertEqual(records, self.generate_records(seed=7))
+        self.assertNotEqual(records, self.generate_records(seed=8))
+        self.assertEqual([record_id for record_id, _ in records], range(25))
+
+    def test_uuids_are_reproducible(self):
+        records = self.generate_records(True)
+        self.assertEqual(records, self.generate_records(True))
+        self.assertEqual(len(set(record_id for record_id, _ in records)), 25)
+
+    def test_records_match_a_single_shard(self):
+        output_file_name = os.path.join(self.directory, 'records.csv')
+        self.generator.generate_csv(
+            self.generator.generate_records('cfg', True, _GRAMMAR, 8, 2, 25),
+            output_file_name, '\t')
+        with open(output_file_name) as output_file:
+            self.assertEqual(output_file.read(),
+                             self.generate_sharded_csv(1, 7))
+
+    def test_sharded_runs_are_reproducible(self):
+        for number_of_shards in (1, 3):
+            data = self.generate_sharded_csv(number_of_shards, 7)
+            self.assertEqual(len(data.splitlines()), 25)
+            self.assertEqual(data, self.generate_sharded_csv(
+                number_of_shards, 7))
+            self.assertNotEqual(data, self.generate_sharded_csv(
+                number_of_shards, 8))
+
+    def test_direct_records_are_single_sentences(self):
+        # The trained 'direct' engine is the list of the corpus sentences
+        sentences = ['The river floods.', 'A valley.', 'The forest.']
+        records = list(self.generator.generate_shard_records(
+            'direct', sentences, 1, 4, 3, 7, False, 8, 2))
+        self.assertEqual([record_id for record_id, _ in records],
+                         range(8, 14))
+        self.assertTrue(all(text in sentences for _, text in records))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import random
+import unittest
+from nltk.grammar import CFG
+from nltk.grammar import PCFG
+from app.corpus.grammar import GrammarSampler
+
+
+class _BoundaryRandom(random.Random):
+    '''
+    This class draws the upper bound of random(), which a product of
+    floating point numbers may round up to.
+    '''
+
+    def random(self):
+        return 1.0
+
+
+class GrammarSamplerTest(unittest.TestCase):
+
+    def test_weighted_draw_at_the_total_weight(self):
+        grammar = PCFG.fromstring('''
+            S -> 'river' [0.3] | 'valley' [0.3] | 'forest' [0.4]
+        ''')
+        sampler = GrammarSampler(grammar)
+        self.assertEqual(sampler.sample(3, _BoundaryRandom()), ['forest'])
+
+    def test_derivations_terminate_within_the_depth(self):
+        grammar = CFG.fromstring('''
+            S -> NP VP
+            NP -> 'the' N | 'the' N PP
+            PP -> 'near' NP
+            VP -> 'floods'
+            N -> 'river' | 'valley'
+        ''')
+        sampler = GrammarSampler(grammar)
+        rng = random.Random(0)
+        for _ in xrange(50):
+            words = sampler.sample(6, rng)
+            self.assertEqual(words[0], 'the')
+            self.assertEqual(words[-1], 'floods')
+        self.assertRaises(ValueError, sampler.sample, 1, rng)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import json
+import time
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+import multiprocessing
+from app.config import settings
+from app.topic import jobs
+from app.topic.jobs import CANCELLED
+from app.topic.jobs import DONE
+from app.topic.jobs import FAILED
+from app.topic.jobs import QUEUED
+from app.topic.jobs import RUNNING
+from app.topic.jobs import JobStore
+from app.topic.jobs import QueueFullError
+from app.topic.jobs import check_running_jobs
+from app.topic.jobs import start_queued_jobs
+from app.topic.analyzer import get_lda_workers
+from benchmarks.synthetic import get_synthetic_documents
+
+
+class FakeProcess(object):
+    '''
+    This class stands in for the job processes of the worker pool.
+    '''
+
+    def __init__(self, target=None, args=(), alive=True, exitcode=None):
+        self.args = args
+        self.pid = None
+        self.alive = alive
+        self.exitcode = exitcode
+        self.started = False
+        self.terminated = False
+
+    def start(self):
+        self.started = True
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.terminated = True
+        self.alive = False
+        self.exitcode = -15
+
+    def join(self):
+        pass
+
+
+class JobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'jobs.db')
+        self.store = JobStore(self.file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def submit(self, term='freedom', priority=0, **kwargs):
+        return self.store.submit(term, 'lda', {'num_topics': 5}, priority,
+                                 **kwargs)
+
+    def test_submit_queues_the_job(self):
+        job = self.store.get(self.submit())
+        self.assertEqual(job['status'], QUEUED)
+        self.assertEqual(job['term'], 'freedom')
+        self.assertEqual(job['params'], {'num_topics': 5})
+        self.assertFalse(job['cancel_requested'])
+        self.assertIsNone(self.store.get('unknown'))
+
+    def test_claim_order_is_priority_then_fifo(self):
+        low = self.submit('low', priority=0)
+        first = self.submit('first', priority=5)
+        second = self.submit('second', priority=5)
+        third = self.submit('third', priority=5)
+        claimed = [self.store.claim()['id'] for _ in xrange(4)]
+        self.assertEqual(claimed, [first, second, third, low])
+        self.assertIsNone(self.store.claim())
+        self.assertEqual(self.store.get(first)['status'], RUNNING)
+        self.assertIsNotNone(self.store.get(first)['started_at'])
+
+    def test_queue_size_bound(self):
+        self.submit(max_queued=2)
+        self.submit(max_queued=2)
+        self.assertRaises(QueueFullError, self.submit, max_queued=2)
+        self.store.claim()
+        self.submit(max_queued=2)
+        self.assertEqual(self.store.stats(), {QUEUED: 2, RUNNING: 1})
+
+    def test_cancel_queued_job(self):
+        job_id = self.submit()
+        job = self.store.cancel(job_id)
+        self.assertEqual(job['status'], CANCELLED)
+        self.assertIsNotNone(job['finished_at'])
+        self.assertIsNone(self.store.claim())
+        self.assertIsNone(self.store.cancel('unknown'))
+
+    def test_cancel_running_job(self):
+        job_id = self.submit()
+        self.store.claim()
+        job = self.store.cancel(job_id)
+        self.assertEqual(job['status'], RUNNING)
+        self.assertTrue(job['cancel_requested'])
+        self.assertEqual(self.store.get_cancel_requests(), [job_id])
+        self.store.finish(job_id, status=CANCELLED)
+        self.assertEqual(self.store.get(job_id)['status'], CANCELLED)
+        self.assertEqual(self.store.get_cancel_requests(), [])
+
+    def test_finish(self):
+        done = self.submit()
+        failed = self.submit()
+        self.store.claim()
+        self.store.claim()
+        self.store.finish(done, result='[]')
+        self.store.finish(failed, error='boom')
+        self.assertEqual(self.store.get(done)['status'], DONE)
+        self.assertEqual(self.store.get(done)['result'], '[]')
+        self.assertEqual(self.store.get(failed)['status'], FAILED)
+        self.assertEqual(self.store.get(failed)['error'], 'boom')
+
+    def test_finish_does_not_overwrite_cancelled_job(self):
+        job_id = self.submit()
+        self.store.cancel(job_id)
+        self.store.finish(job_id, result='[]')
+        job = self.store.get(job_id)
+        self.assertEqual(job['status'], CANCELLED)
+        self.assertIsNone(job['result'])
+
+    def test_finish_after_cancel_request_cancels(self):
+        job_id = self.submit()
+        self.store.claim()
+        self.store.cancel(job_id)
+        self.store.finish(job_id, result='[]')
+        self.assertEqual(self.store.get(job_id)['status'], CANCELLED)
+
+    def test_requeue_running_after_crash(self):
+        interrupted = self.submit()
+        cancelled = self.submit()
+        self.store.claim()
+        self.store.claim()
+        self.store.cancel(cancelled)
+        # A new store on the same file, as a restarted worker pool opens
+        store = JobStore(self.file_path)
+        self.assertEqual(store.requeue_running(), 1)
+        job = store.get(interrupted)
+        self.assertEqual(job['status'], QUEUED)
+        self.assertIsNone(job['started_at'])
+        self.assertEqual(store.get(cancelled)['status'], CANCELLED)
+        self.assertEqual(store.claim()['id'], interrupted)
+
+    def test_prune_finished_jobs_past_ttl(self):
+        old = self.submit()
+        recent = self.submit()
+        queued = self.submit()
+        self.store.claim()
+        self.store.claim()
+        self.store.finish(old, result='[]')
+        self.store.finish(recent, result='[]')
+        connection = sqlite3.connect(self.file_path)
+        with connection:
+            connection.execute('UPDATE jobs SET finished_at = ? WHERE id = ?',
+                               (time.time() - 7200, old))
+        connection.close()
+        self.assertEqual(self.store.prune(3600), 1)
+        self.assertIsNone(self.store.get(old))
+        self.assertEqual(self.store.get(recent)['status'], DONE)
+        self.assertEqual(self.store.get(queued)['status'], QUEUED)
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.directory, 'jobs.db'))
+        self.timeout = settings.JOBS_TIMEOUT
+        settings.JOBS_TIMEOUT = 60
+
+    def tearDown(self):
+        settings.JOBS_TIMEOUT = self.timeout
+        shutil.rmtree(self.directory)
+
+    def start(self, number_of_jobs, number_of_workers=2):
+        for _ in xrange(number_of_jobs):
+            self.store.submit('freedom', 'tfidf', {})
+        running = {}
+        start_queued_jobs(self.store, running, number_of_workers,
+                          FakeProcess)
+        return running
+
+    def test_start_up_to_the_number_of_workers(self):
+        running = self.start(3)
+        self.assertEqual(len(running), 2)
+        self.assertTrue(all(process.started for process, _ in
+                            running.itervalues()))
+        self.assertEqual(self.store.stats(), {QUEUED: 1, RUNNING: 2})
+
+    def test_exited_processes_are_reaped(self):
+        running = self.start(2)
+        (succeeded, crashed) = sorted(running)
+        running[succeeded][0].alive = False
+        running[succeeded][0].exitcode = 0
+        self.store.finish(succeeded, result='[]')
+        running[crashed][0].alive = False
+        running[crashed][0].exitcode = 1
+        check_running_jobs(self.store, running)
+        self.assertEqual(running, {})
+        self.assertEqual(self.store.get(succeeded)['status'], DONE)
+        self.assertEqual(self.store.get(crashed)['status'], FAILED)
+        self.assertIn('code 1', self.store.get(crashed)['error'])
+
+    def test_timed_out_job_is_terminated(self):
+        running = self.start(2)
+        (timed_out, on_time) = sorted(running)
+        process = running[timed_out][0]
+        running[timed_out] = (process, time.time() - 120)
+        check_running_jobs(self.store, running)
+        self.assertTrue(process.terminated)
+        self.assertEqual(list(running), [on_time])
+        self.assertEqual(self.store.get(timed_out)['status'], FAILED)
+        self.assertIn('Timed out', self.store.get(timed_out)['error'])
+        self.assertEqual(self.store.get(on_time)['status'], RUNNING)
+
+    def test_cancelled_job_is_terminated(self):
+        running = self.start(2)
+        (cancelled, kept) = sorted(running)
+        process = running[cancelled][0]
+        self.store.cancel(cancelled)
+        check_running_jobs(self.store, running)
+        self.assertTrue(process.terminated)
+        self.assertEqual(list(running), [kept])
+        self.assertEqual(self.store.get(cancelled)['status'], CANCELLED)
+        self.assertFalse(running[kept][0].terminated)
+
+
+class MulticoreJobTest(unittest.TestCase):
+    '''
+    A job process large enough for LdaMulticore must be allowed to start
+    the training processes.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = (settings.JOBS_DATABASE_PATH,
+                         settings.LDA_MULTICORE_MIN_DOCUMENTS,
+                         settings.LDA_CHUNK_SIZE,
+                         settings.LDA_WORKERS,
+                         settings.TOPIC_MODEL_CACHE_ENABLED)
+        settings.JOBS_DATABASE_PATH = os.path.join(self.directory, 'jobs.db')
+        settings.LDA_MULTICORE_MIN_DOCUMENTS = 20
+        settings.LDA_CHUNK_SIZE = 10
+        settings.LDA_WORKERS = 2
+        settings.TOPIC_MODEL_CACHE_ENABLED = False
+        self.functions = (multiprocessing.cpu_count, jobs.get_documents,
+                          jobs.get_global_model)
+        multiprocessing.cpu_count = lambda: 2
+        documents = get_synthetic_documents(40, 20, 60, num_topics=3)
+        jobs.get_documents = lambda search, term: documents
+        jobs.get_global_model = lambda: None
+        jobs._store = None
+
+    def tearDown(self):
+        (settings.JOBS_DATABASE_PATH,
+         settings.LDA_MULTICORE_MIN_DOCUMENTS,
+         settings.LDA_CHUNK_SIZE,
+         settings.LDA_WORKERS,
+         settings.TOPIC_MODEL_CACHE_ENABLED) = self.settings
+        (multiprocessing.cpu_count, jobs.get_documents,
+         jobs.get_global_model) = self.functions
+        jobs._store = None
+        shutil.rmtree(self.directory)
+
+    def test_lda_job_above_the_multicore_threshold(self):
+        self.assertGreater(get_lda_workers(40), 1)
+        store = jobs.get_job_store()
+        job_id = store.submit('freedom', 'lda', {'num_topics': 3})
+        running = {}
+        start_queued_jobs(store, running, 1)
+        running[job_id][0].join(120)
+        check_running_jobs(store, running)
+        self.assertEqual(running, {})
+        job = store.get(job_id)
+        self.assertEqual(job['status'], DONE)
+        result = json.loads(job['result'])
+        self.assertTrue(result)
+        self.assertTrue(set(entry['id'] for entry in result) <=
+                        set(xrange(3)))
+
+
+class JobEndpointTest(unittest.TestCase):
+
+    def setUp(self):
+        import app as topics_server
+        self.directory = tempfile.mkdtemp()
+        self.settings = (settings.JOBS_DATABASE_PATH,
+                         settings.JOBS_POLL_INTERVAL)
+        settings.JOBS_DATABASE_PATH = os.path.join(self.directory, 'jobs.db')
+        settings.JOBS_POLL_INTERVAL = 0.01
+        jobs._store = None
+        self.client = topics_server.topics_app.test_client()
+
+    def tearDown(self):
+        (settings.JOBS_DATABASE_PATH,
+         settings.JOBS_POLL_INTERVAL) = self.settings
+        jobs._store = None
+        shutil.rmtree(self.directory)
+
+    def test_submit_wait_and_cancel(self):
+        response = self.client.post('/topics/jobs', data=json.dumps({
+            'term': 'freedom', 'model': 'lsi', 'params': {'num_topics': 3}}))
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.data)
+        self.assertEqual(job['status'], QUEUED)
+        self.assertEqual(job['params'], {'num_topics': 3})
+
+        store = jobs.get_job_store()
+        store.claim()
+        timer = threading.Timer(0.1, store.finish, (job['id'],),
+                                {'result': '[{"id": 0, "value": 1.0}]'})
+        timer.start()
+        response = self.client.get('/topics/jobs/{0}?wait=5'.format(
+                                   job['id']))
+        timer.join()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['status'], DONE)
+        self.assertEqual(json.loads(response.data)['result'],
+                         [{'id': 0, 'value': 1.0}])
+
+        response = self.client.post('/topics/jobs', data=json.dumps({
+            'term': 'freedom'}))
+        job_id = json.loads(response.data)['id']
+        response = self.client.delete('/topics/jobs/{0}'.format(job_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['status'], CANCELLED)
+
+    def test_errors(self):
+        self.assertEqual(self.client.post(
+            '/topics/jobs', data=json.dumps({})).status_code, 400)
+        self.assertEqual(self.client.post(
+            '/topics/jobs', data=json.dumps({
+                'term': 'freedom', 'model': 'unknown'})).status_code, 400)
+        self.assertEqual(self.client.get(
+            '/topics/jobs/unknown').status_code, 404)
+        self.assertEqual(self.client.delete(
+            '/topics/jobs/unknown').status_code, 404)
+
+    def test_queue_full(self):
+        queue_size = settings.JOBS_QUEUE_SIZE
+        settings.JOBS_QUEUE_SIZE = 1
+        try:
+            data = json.dumps({'term': 'freedom'})
+            self.assertEqual(self.client.post(
+                '/topics/jobs', data=data).status_code, 202)
+            self.assertEqual(self.client.post(
+                '/topics/jobs', data=data).status_code, 503)
+        finally:
+            settings.JOBS_QUEUE_SIZE = queue_size
+
+
+if __name__ == '__main__':
+    unittest.main()
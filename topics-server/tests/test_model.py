@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import shutil
+import random
+import tempfile
+import unittest
+from app.config import settings
+from app.topic import model
+from app.topic.stream import StreamedCorpus
+
+_WORDS = ['river', 'mountain', 'valley', 'forest', 'desert', 'ocean',
+          'island', 'glacier', 'canyon', 'meadow', 'harbor', 'volcano']
+
+_NEW_WORDS = ['lagoon', 'prairie', 'tundra', 'savanna']
+
+
+def _get_documents(number_of_documents, words, seed):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(words) for _ in xrange(20))
+            for _ in xrange(number_of_documents)]
+
+
+class _StubIndex(object):
+    '''
+    This class stands in for the index the global models are trained on: it
+    holds (timestamp, document) pairs, along with the version of the index
+    and the version it was built upon.
+    '''
+
+    def __init__(self):
+        self.documents = []
+        self.version = None
+        self.parent_version = None
+
+    def add(self, documents, timestamp):
+        self.documents.extend((timestamp, document) for document in
+                              documents)
+
+    def stream(self, search_term, since=None):
+        return StreamedCorpus(lambda: (
+            document for timestamp, document in self.documents
+            if since is None or timestamp >= since))
+
+
+class GlobalModelUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = _StubIndex()
+        self.patched = (model.Search, model.get_index_version,
+                        model.get_parent_version)
+        self.settings = (settings.GLOBAL_TOPIC_MODELS_DIRECTORY,
+                         settings.GLOBAL_TOPIC_MODELS_INCREMENTAL,
+                         settings.GLOBAL_TOPIC_MODELS_MAX_UPDATES)
+        model.Search = lambda: self.index
+        model.get_index_version = lambda: self.index.version
+        model.get_parent_version = lambda: self.index.parent_version
+        settings.GLOBAL_TOPIC_MODELS_DIRECTORY = self.directory
+        settings.GLOBAL_TOPIC_MODELS_INCREMENTAL = True
+        settings.GLOBAL_TOPIC_MODELS_MAX_UPDATES = 20
+
+    def tearDown(self):
+        (model.Search, model.get_index_version,
+         model.get_parent_version) = self.patched
+        (settings.GLOBAL_TOPIC_MODELS_DIRECTORY,
+         settings.GLOBAL_TOPIC_MODELS_INCREMENTAL,
+         settings.GLOBAL_TOPIC_MODELS_MAX_UPDATES) = self.settings
+        shutil.rmtree(self.directory)
+
+    def train(self):
+        self.index.version = 'topics_v1-1'
+        self.index.add(_get_documents(40, _WORDS, 0), 1)
+        self.assertEqual(model.update_global_models(1), 'topics_v1-1')
+        return model._load_current_model()
+
+    def test_update_grows_the_dictionary(self):
+        trained = self.train()
+        self.index.version = 'topics_v2-2'
+        self.index.parent_version = 'topics_v1-1'
+        self.index.add(_get_documents(20, _WORDS + _NEW_WORDS, 1), 2)
+        self.assertEqual(model.update_global_models(2), 'topics_v2-2+u1')
+        updated = model._load_current_model()
+        self.assertGreater(len(updated.dictionary), len(trained.dictionary))
+        for token, token_id in trained.dictionary.token2id.iteritems():
+            self.assertEqual(updated.dictionary.token2id[token], token_id)
+        self.assertEqual(updated.manifest['updates'], 1)
+        self.assertEqual(updated.manifest['documents'], 60)
+        self.assertEqual(updated.manifest['update']['documents'], 20)
+        self.assertEqual(updated.manifest['lineage'],
+                         ['topics_v1-1', 'topics_v2-2'])
+        self.assertEqual(updated.lda.num_terms, len(updated.dictionary))
+        self.assertEqual(updated.lsi.num_terms, len(updated.dictionary))
+
+    def test_appended_index_is_updated(self):
+        self.train()
+        self.index.add(_get_documents(20, _WORDS + _NEW_WORDS, 1), 2)
+        self.assertEqual(model.update_global_models(2), 'topics_v1-1+u1')
+        self.assertEqual(model._load_current_model().manifest['lineage'],
+                         ['topics_v1-1'])
+
+    def test_rebuilt_index_is_retrained(self):
+        self.train()
+        self.index.version = 'topics_v2-2'
+        self.index.documents = []
+        self.index.add(_get_documents(30, _WORDS + _NEW_WORDS, 1), 2)
+        self.assertEqual(model.update_global_models(2), 'topics_v2-2')
+        retrained = model._load_current_model()
+        self.assertEqual(retrained.manifest['updates'], 0)
+        self.assertEqual(retrained.manifest['documents'], 30)
+
+    def test_retrained_after_max_updates(self):
+        settings.GLOBAL_TOPIC_MODELS_MAX_UPDATES = 1
+        self.train()
+        self.index.add(_get_documents(20, _WORDS, 1), 2)
+        self.assertEqual(model.update_global_models(2), 'topics_v1-1+u1')
+        self.index.add(_get_documents(20, _WORDS, 2), 3)
+        self.assertEqual(model.update_global_models(3), 'topics_v1-1')
+
+
+if __name__ == '__main__':
+    unittest.main()
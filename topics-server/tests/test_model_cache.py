@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from gensim import corpora
+from gensim import models
+from app.config import settings
+from app.topic.cache import TopicModelCache
+from app.topic.cache import get_corpus_fingerprint
+
+_DOCUMENTS = [['river', 'valley'], ['forest', 'river'], ['glacier']]
+
+
+class TopicModelCachePruneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        dictionary = corpora.Dictionary(_DOCUMENTS)
+        self.model = models.TfidfModel([dictionary.doc2bow(document) for
+                                        document in _DOCUMENTS])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def put(self, cache, key, age_days=0):
+        cache.put(key, 'tfidf', self.model, '[]')
+        created = time.time() - age_days * 86400
+        os.utime(os.path.join(self.directory, key + '.json'),
+                 (created, created))
+
+    def test_saved_models_are_bounded_in_number(self):
+        cache = TopicModelCache(1024 * 1024, self.directory, keep=2)
+        for key in ('a', 'b', 'c'):
+            self.put(cache, key, age_days=ord('z') - ord(key))
+        self.assertEqual([entry['key'] for entry in cache.list()],
+                         ['c', 'b'])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['b.json', 'b.model', 'c.json', 'c.model'])
+        self.assertIsNotNone(TopicModelCache(
+            1024 * 1024, self.directory).get('b'))
+        self.assertIsNone(TopicModelCache(
+            1024 * 1024, self.directory).get('a'))
+
+    def test_saved_models_are_bounded_in_age(self):
+        cache = TopicModelCache(1024 * 1024, self.directory)
+        self.put(cache, 'old', age_days=10)
+        self.put(cache, 'new')
+        removed = cache.prune(max_age_days=7)
+        self.assertEqual([entry['key'] for entry in removed], ['old'])
+        self.assertEqual([entry['key'] for entry in cache.list()], ['new'])
+        self.assertGreater(cache.list()[0]['size'], 0)
+
+    def test_unbounded_cache_keeps_every_model(self):
+        cache = TopicModelCache(1024 * 1024, self.directory)
+        for key in ('a', 'b', 'c'):
+            self.put(cache, key, age_days=30)
+        self.assertEqual(len(cache.list()), 3)
+
+
+class CorpusFingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = (settings.TOKENIZER_STOPWORDS,
+                         settings.TOKENIZER_STEMMER,
+                         settings.TFIDF_BACKEND)
+
+    def tearDown(self):
+        (settings.TOKENIZER_STOPWORDS,
+         settings.TOKENIZER_STEMMER,
+         settings.TFIDF_BACKEND) = self.settings
+
+    def get_fingerprint(self, tfidf_backend=None):
+        return get_corpus_fingerprint(['a river', 'a valley'], 'lda',
+                                      {'num_topics': 5}, tfidf_backend)
+
+    def test_tokenizer_settings_are_hashed(self):
+        fingerprint = self.get_fingerprint()
+        self.assertEqual(fingerprint, self.get_fingerprint())
+        settings.TOKENIZER_STOPWORDS = 'english'
+        self.assertNotEqual(fingerprint, self.get_fingerprint())
+        settings.TOKENIZER_STOPWORDS = self.settings[0]
+        settings.TOKENIZER_STEMMER = 'porter'
+        self.assertNotEqual(fingerprint, self.get_fingerprint())
+
+    def test_tfidf_backend_is_hashed(self):
+        settings.TFIDF_BACKEND = 'gensim'
+        fingerprint = self.get_fingerprint()
+        self.assertEqual(fingerprint, self.get_fingerprint('gensim'))
+        self.assertNotEqual(fingerprint, self.get_fingerprint('sparse'))
+        settings.TFIDF_BACKEND = 'sparse'
+        self.assertNotEqual(fingerprint, self.get_fingerprint())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from app.utils.cache import MemoryCacheBackend
+from app.utils.cache import SearchResultCache
+from app.utils.cache import SharedCacheBackend
+
+
+def _look_up(file_path, directory, search_terms):
+    cache = SearchResultCache(SharedCacheBackend(8, file_path), 60,
+                              directory)
+    for search_term in search_terms:
+        cache.get('index', search_term)
+
+
+class SearchResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'search-cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_cache(self, backend):
+        return SearchResultCache(backend, 60, self.directory)
+
+    def test_memory_backend_returns_copies(self):
+        cache = self.get_cache(MemoryCacheBackend(8))
+        documents = ['a river', 'a valley']
+        cache.set('index', 'term', documents)
+        documents.append('a forest')
+        cached_documents = cache.get('index', 'term')
+        self.assertEqual(cached_documents, ['a river', 'a valley'])
+        cached_documents.pop()
+        self.assertEqual(cache.get('index', 'term'),
+                         ['a river', 'a valley'])
+
+    def test_memory_backend_counts(self):
+        cache = self.get_cache(MemoryCacheBackend(8))
+        cache.get('index', 'term')
+        cache.set('index', 'term', ['a river'])
+        cache.get('index', 'term')
+        cache.get('index', 'term')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']),
+                         (2, 1, 1))
+
+    def test_shared_backend_counts_every_worker(self):
+        cache = self.get_cache(SharedCacheBackend(8, self.file_path))
+        cache.set('index', 'term', ['a river'])
+        cache.get('index', 'term')
+        workers = [multiprocessing.Process(
+            target=_look_up, args=(self.file_path, self.directory,
+                                   ['term', 'other']))
+            for _ in xrange(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 2))
+        self.assertAlmostEqual(stats['hit_ratio'], 0.6)
+        stats = self.get_cache(SharedCacheBackend(
+            8, self.file_path)).stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
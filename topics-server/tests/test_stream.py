@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import unittest
+from app.config import settings
+from app.topic.stream import StreamedCorpus
+from app.utils import es
+
+
+class _Documents(object):
+    '''
+    This class is a document iterator that records whether it was closed.
+    '''
+
+    def __init__(self, documents):
+        self._documents = iter(documents)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return next(self._documents)
+
+    def close(self):
+        self.closed = True
+
+
+class _StubClient(object):
+    '''
+    This class stands in for the Elasticsearch client of Search: it serves
+    the hits page by page through a single scroll.
+    '''
+
+    def __init__(self, documents, page_size):
+        self.pages = [documents[start:start + page_size] for start in
+                      xrange(0, len(documents), page_size)]
+        self.scrolls = 0
+        self.cleared = []
+        self.counts = 0
+
+    def search(self, **kwargs):
+        return {'_scroll_id': 'scroll-1', 'hits': {'hits': []}}
+
+    def scroll(self, scroll_id, scroll=None):
+        page = self.pages[self.scrolls] if self.scrolls < len(self.pages) \
+            else []
+        self.scrolls += 1
+        return {'_scroll_id': scroll_id,
+                '_shards': {'total': 1, 'failed': 0},
+                'hits': {'hits': [{'_source': {'text': text}}
+                                  for text in page]}}
+
+    def clear_scroll(self, scroll_id=None):
+        self.cleared.append(scroll_id)
+
+    def count(self, index=None, body=None):
+        self.counts += 1
+        return {'count': sum(len(page) for page in self.pages)}
+
+
+class StreamedCorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.iterators = []
+
+    def get_corpus(self, documents, count_factory=None):
+        def document_factory():
+            self.iterators.append(_Documents(documents))
+            return self.iterators[-1]
+        return StreamedCorpus(document_factory, count_factory)
+
+    def test_iteration_counts_the_documents(self):
+        corpus = self.get_corpus(['a', 'b', 'c'])
+        self.assertEqual(list(corpus), ['a', 'b', 'c'])
+        self.assertEqual(corpus.num_docs, 3)
+        self.assertEqual(list(corpus), ['a', 'b', 'c'])
+        self.assertTrue(all(documents.closed for documents in
+                            self.iterators))
+
+    def test_truth_value(self):
+        self.assertFalse(self.get_corpus([]))
+        self.assertTrue(self.get_corpus(['a', 'b']))
+        self.assertTrue(all(documents.closed for documents in
+                            self.iterators))
+        self.assertFalse(self.get_corpus(['a'], lambda: 0))
+        self.assertTrue(self.get_corpus([], lambda: 2))
+
+    def test_length(self):
+        self.assertEqual(len(self.get_corpus(['a', 'b'])), 2)
+        counts = []
+        corpus = self.get_corpus(['a', 'b'], lambda: counts.append(1) or 2)
+        self.assertEqual(len(corpus), 2)
+        self.assertEqual(len(corpus), 2)
+        self.assertEqual(counts, [1])
+        self.assertEqual(len(self.iterators), 1)
+
+    def test_early_stop_closes_the_documents(self):
+        corpus = self.get_corpus(['a', 'b', 'c'])
+        # The peek of gensim.utils.is_corpus at the first document
+        self.assertEqual(next(iter(corpus)), 'a')
+        for document in corpus:
+            break
+        self.assertTrue(all(documents.closed for documents in
+                            self.iterators))
+        self.assertIsNone(corpus.num_docs)
+
+
+class SearchScrollTest(unittest.TestCase):
+
+    def setUp(self):
+        self.get_client = es.get_client
+        self.page_size = settings.SEARCH_SCROLL_PAGE_SIZE
+        settings.SEARCH_SCROLL_PAGE_SIZE = 2
+        self.client = _StubClient(['a', 'b', 'c', 'd', 'e'], 2)
+        es.get_client = lambda: self.client
+
+    def tearDown(self):
+        es.get_client = self.get_client
+        settings.SEARCH_SCROLL_PAGE_SIZE = self.page_size
+
+    def test_exhausted_scroll_is_cleared(self):
+        corpus = es.Search().stream('term')
+        self.assertEqual(list(corpus), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(self.client.cleared, ['scroll-1'])
+
+    def test_abandoned_scroll_is_cleared(self):
+        corpus = es.Search().stream('term')
+        for document in corpus:
+            break
+        self.assertEqual(self.client.scrolls, 1)
+        self.assertEqual(self.client.cleared, ['scroll-1'])
+
+    def test_emptiness_is_counted(self):
+        corpus = es.Search().stream('term')
+        self.assertTrue(corpus)
+        self.assertEqual(len(corpus), 5)
+        self.assertEqual(self.client.counts, 1)
+        self.assertEqual(self.client.scrolls, 0)
+        self.client.pages = []
+        self.assertFalse(es.Search().stream('term'))
+
+
+if __name__ == '__main__':
+    unittest.main()
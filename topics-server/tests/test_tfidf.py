@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import random
+import unittest
+from app.config import settings
+from app.topic.analyzer import TopicAnalyzer
+from app.topic.encoding import encode_columnar
+
+_WORDS = ['river', 'mountain', 'valley', 'forest', 'desert', 'ocean',
+          'island', 'glacier', 'canyon', 'meadow', 'harbor', 'volcano',
+          'lagoon', 'prairie', 'tundra', 'savanna']
+
+_FREQUENCY_FLOORS = (0, 1, 3, 1000)
+
+
+def _get_documents(number_of_documents, seed):
+    rng = random.Random(seed)
+    documents = [' '.join(rng.choice(_WORDS) for _ in
+                          xrange(rng.randint(1, 30)))
+                 for _ in xrange(number_of_documents)]
+    # Empty documents, and documents left empty by tokenization
+    documents[3] = ''
+    documents[7] = 'the of and'
+    documents[11] = '... !!'
+    return documents
+
+
+class TfidfBackendTest(unittest.TestCase):
+    '''
+    The 'sparse' backend weights the document-term matrix at once where
+    'gensim' weights the documents one by one; their outputs must be
+    byte-identical.
+    '''
+
+    def setUp(self):
+        self.cache_enabled = settings.TOPIC_MODEL_CACHE_ENABLED
+        settings.TOPIC_MODEL_CACHE_ENABLED = False
+        self.documents = _get_documents(60, 0)
+
+    def tearDown(self):
+        settings.TOPIC_MODEL_CACHE_ENABLED = self.cache_enabled
+
+    def get_outputs(self, get_output):
+        return [get_output(TopicAnalyzer(self.documents,
+                                         tfidf_backend=tfidf_backend))
+                for tfidf_backend in ('gensim', 'sparse')]
+
+    def test_json(self):
+        for frequency_floor in _FREQUENCY_FLOORS:
+            gensim_json, sparse_json = self.get_outputs(
+                lambda topics: topics.get_tfidf_as_json(frequency_floor))
+            self.assertEqual(gensim_json, sparse_json, frequency_floor)
+
+    def test_columns(self):
+        for frequency_floor in _FREQUENCY_FLOORS:
+            gensim_columns, sparse_columns = self.get_outputs(
+                lambda topics: encode_columnar(topics.get_columns(
+                    'tfidf', frequency_floor)))
+            self.assertEqual(gensim_columns, sparse_columns, frequency_floor)
+
+    def test_pruned_output(self):
+        for frequency_floor in _FREQUENCY_FLOORS:
+            for top_k, min_weight in ((3, None), (None, 0.2), (2, 0.1)):
+                gensim_json, sparse_json = self.get_outputs(
+                    lambda topics: topics.get_tfidf_as_json(
+                        frequency_floor, top_k=top_k,
+                        min_weight=min_weight))
+                self.assertEqual(gensim_json, sparse_json, frequency_floor)
+                gensim_columns, sparse_columns = self.get_outputs(
+                    lambda topics: encode_columnar(topics.get_columns(
+                        'tfidf', frequency_floor, top_k=top_k,
+                        min_weight=min_weight)))
+                self.assertEqual(gensim_columns, sparse_columns,
+                                 frequency_floor)
+
+    def test_empty_corpus(self):
+        self.documents = ['', 'the of and']
+        for frequency_floor in _FREQUENCY_FLOORS:
+            gensim_json, sparse_json = self.get_outputs(
+                lambda topics: topics.get_tfidf_as_json(frequency_floor))
+            self.assertEqual(gensim_json, sparse_json, frequency_floor)
+
+    def test_empty_documents_have_no_entries(self):
+        columns = TopicAnalyzer(self.documents, tfidf_backend='sparse') \
+            .get_columns('tfidf')
+        offsets = columns['offsets']
+        self.assertEqual(len(offsets), len(self.documents) + 1)
+        for index in (3, 7, 11):
+            self.assertEqual(offsets[index], offsets[index + 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import unittest
+from collections import Counter
+from gensim import corpora
+from nltk.stem.porter import PorterStemmer
+from app.topic.tokenizer import STOPWORD_SETS
+from app.topic.tokenizer import Tokenizer
+from app.topic.tokenizer import get_bow_from_matrix
+
+_DOCUMENTS = [
+    'The river runs to the ocean and the ocean runs to the river',
+    'A valley of forests, a forest of valleys',
+    '',
+    'Running rivers, running valleys and running forests',
+    'the of and',
+    'The glacier carved the valley; the river filled it'
+]
+
+
+def _get_reference(tokenizer, documents, frequency_floor):
+    '''
+    This is a utility function that builds the dictionary and bag-of-words
+    corpus of the documents word by word, with gensim, keeping the words
+    that occur more than 'frequency_floor' times.
+
+    Returns: tuple (corpora.Dictionary, list of bag-of-words)
+    '''
+    tokenized = [tokenizer.tokenize(document) for document in documents]
+    frequencies = Counter(word for words in tokenized for word in words)
+    tokenized = [[word for word in words if frequencies[word] >
+                  frequency_floor] for words in tokenized]
+    dictionary = corpora.Dictionary(tokenized)
+    return dictionary, [dictionary.doc2bow(words) for words in tokenized]
+
+
+def _get_words(dictionary, entries):
+    return dict((dictionary[word_id], value) for word_id, value in entries)
+
+
+class TokenizerMatrixTest(unittest.TestCase):
+
+    def assertMatchesReference(self, tokenizer, documents, frequency_floor):
+        dictionary, matrix = tokenizer.get_matrix(
+            [tokenizer.encode(document) for document in documents],
+            frequency_floor)
+        reference, reference_bow = _get_reference(tokenizer, documents,
+                                                  frequency_floor)
+        # gensim assigns ids in hash order, so entries are compared by word
+        self.assertEqual(matrix.shape, (len(documents), len(reference)))
+        self.assertEqual(sorted(dictionary.token2id),
+                         sorted(reference.token2id))
+        self.assertEqual(_get_words(dictionary, dictionary.dfs.iteritems()),
+                         _get_words(reference, reference.dfs.iteritems()))
+        self.assertEqual(dictionary.num_docs, reference.num_docs)
+        self.assertEqual(dictionary.num_pos, reference.num_pos)
+        self.assertEqual(dictionary.num_nnz, reference.num_nnz)
+        self.assertEqual([_get_words(dictionary, bow) for bow in
+                          get_bow_from_matrix(matrix)],
+                         [_get_words(reference, bow) for bow in
+                          reference_bow])
+        return dictionary
+
+    def test_matches_gensim(self):
+        for frequency_floor in (0, 1, 2, 3):
+            self.assertMatchesReference(Tokenizer(STOPWORD_SETS['default']),
+                                        _DOCUMENTS, frequency_floor)
+
+    def test_matches_gensim_with_stemmer(self):
+        for frequency_floor in (0, 1, 2):
+            self.assertMatchesReference(Tokenizer(STOPWORD_SETS['english'],
+                                                  PorterStemmer()),
+                                        _DOCUMENTS, frequency_floor)
+
+    def test_empty_corpus(self):
+        tokenizer = Tokenizer(STOPWORD_SETS['default'])
+        dictionary, matrix = tokenizer.get_matrix([], 1)
+        self.assertEqual(len(dictionary), 0)
+        self.assertEqual(dictionary.num_docs, 0)
+        self.assertEqual(matrix.shape, (0, 0))
+        self.assertMatchesReference(tokenizer, ['', 'the of'], 0)
+
+    def test_all_words_under_the_floor(self):
+        tokenizer = Tokenizer(STOPWORD_SETS['default'])
+        dictionary = self.assertMatchesReference(tokenizer, _DOCUMENTS, 1000)
+        self.assertEqual(len(dictionary), 0)
+        dictionary, matrix = tokenizer.get_matrix(
+            [tokenizer.encode(document) for document in _DOCUMENTS], 1000)
+        self.assertEqual(get_bow_from_matrix(matrix),
+                         [[] for _ in _DOCUMENTS])
+
+    def test_stopwords_after_stemming(self):
+        # 'runs' and 'running' are not stopwords, but their stem is
+        tokenizer = Tokenizer(frozenset(['run']), PorterStemmer())
+        self.assertEqual(tokenizer.tokenize('runs running runner'),
+                         ['runner'])
+        dictionary = self.assertMatchesReference(tokenizer, _DOCUMENTS, 0)
+        self.assertNotIn('run', dictionary.token2id)
+
+    def test_apostrophes_and_unicode(self):
+        tokenizer = Tokenizer(STOPWORD_SETS['default'])
+        documents = [u"Don't stop: the caf\xe9's na\xefve 'quotes'",
+                     u"CAF\xc9'S don't дом"]
+        self.assertEqual(tokenizer.tokenize(documents[0]),
+                         [u"don't", u'stop', u"caf\xe9's", u'na\xefve',
+                          u'quotes'])
+        self.assertEqual(tokenizer.tokenize(documents[1]),
+                         [u"caf\xe9's", u"don't", u'дом'])
+        dictionary = self.assertMatchesReference(tokenizer, documents, 1)
+        self.assertEqual(sorted(dictionary.token2id),
+                         [u"caf\xe9's", u"don't"])
+
+
+if __name__ == '__main__':
+    unittest.main()